@@ -1,21 +1,40 @@
 # app_flask.py - Simple Flask interface for RAG System
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, render_template, request, jsonify, session, Response, stream_with_context
 import os
+import json
+import tempfile
+import threading
 from werkzeug.utils import secure_filename
 from config.config import Config
 from src.rag_system import RAGSystem
+from src.simple_vector_store import validate_filters
+from src.ingestion_jobs import create_ingestion_queue, JobQueueFull, JobAlreadyActive
+from src.conversation_store import create_conversation_store
+from src.metrics import registry
 import secrets
 
 app = Flask(__name__)
-app.secret_key = secrets.token_hex(16)
+# Every worker process must sign sessions with the same key, so set FLASK_SECRET_KEY when running several
+app.secret_key = Config.SECRET_KEY or secrets.token_hex(16)
 app.config['UPLOAD_FOLDER'] = './data/pdfs'
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max
 
-# Initialize RAG system
+# Initialize RAG system; its components are built on first use, or by the warm-up thread.
+# PDF extraction processes re-import this module as __mp_main__ when it is the main script, and must not warm up
 rag_system = RAGSystem(Config())
+if Config.WARM_UP_ON_START and __name__ != '__mp_main__':
+    threading.Thread(target=rag_system.warm_up, name='warm-up', daemon=True).start()
 
-# Store conversation history per session
-conversations = {}
+# Uploads are ingested in the background; /jobs/<id> reports progress. With INDEX_ROLE "shared"
+# the queue is shared by all worker processes and only the one writing the index runs the jobs
+ingestion_jobs = create_ingestion_queue(rag_system, Config())
+
+# Conversation history per session, bounded in turns, sessions and memory
+conversations = create_conversation_store(Config())
+
+registry.gauge('rag_ingest_jobs_queued', 'Uploads waiting for an ingestion worker', ingestion_jobs.queued)
+registry.gauge('rag_conversation_sessions', 'Conversation sessions held',
+               lambda: conversations.get_stats()['sessions'])
 
 @app.route('/')
 def index():
@@ -34,28 +53,42 @@ def upload_pdf():
         return jsonify({'success': False, 'message': 'Only PDF files are allowed'})
     
     try:
-        # Save file
         filename = secure_filename(file.filename)
-        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
         
-        # Process document
-        result = rag_system.add_document(filepath)
+        # Cheap early rejection; submit() makes the authoritative check
+        if ingestion_jobs.is_full():
+            return jsonify({'success': False, 'message': 'Server is busy processing uploads, please retry later'}), 503
         
-        if result['success']:
-            stats = result['statistics']
-            return jsonify({
-                'success': True,
-                'message': f"Successfully added {result['document_name']}",
-                'statistics': stats
-            })
-        else:
-            return jsonify({'success': False, 'message': result['message']})
-            
+        # Save under a unique name; submit() moves it into place only once the job is accepted,
+        # so a file that is still queued or being ingested is never overwritten
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+        fd, upload_path = tempfile.mkstemp(suffix='.upload', dir=app.config['UPLOAD_FOLDER'])
+        os.close(fd)
+        try:
+            file.save(upload_path)
+            job_id = ingestion_jobs.submit(filepath, upload_path)
+        finally:
+            if os.path.exists(upload_path):
+                os.remove(upload_path)
+        return jsonify({'success': True, 'job_id': job_id, 'message': f"Processing {filename}"}), 202
+        
+    except JobAlreadyActive as e:
+        # The upload was not taken; the client can follow the running job and retry once it finishes
+        return jsonify({'success': False, 'job_id': e.job_id,
+                        'message': f"{filename} is already being processed, retry once job {e.job_id} finishes"}), 409
+    except JobQueueFull:
+        return jsonify({'success': False, 'message': 'Server is busy processing uploads, please retry later'}), 503
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = ingestion_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Unknown job'}), 404
+    return jsonify({'success': True, 'job': job})
+
 @app.route('/ask', methods=['POST'])
 def ask_question():
     data = request.json
@@ -64,6 +97,11 @@ def ask_question():
     if not question:
         return jsonify({'success': False, 'message': 'Please enter a question'})
     
+    try:
+        filters = validate_filters(data.get('filters'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f"Invalid filters: {e}"}), 400
+    
     try:
         # Get or create conversation history for this session
         session_id = session.get('session_id')
@@ -71,15 +109,11 @@ def ask_question():
             session_id = secrets.token_hex(8)
             session['session_id'] = session_id
         
-        if session_id not in conversations:
-            conversations[session_id] = []
-        
         # Get response
-        response = rag_system.query(question, conversations[session_id])
+        response = rag_system.query(question, conversations.get(session_id), filters)
         
         # Update conversation history
-        conversations[session_id].append(question)
-        conversations[session_id].append(response['answer'])
+        conversations.append(session_id, question, response['answer'])
         
         return jsonify({
             'success': True,
@@ -87,18 +121,52 @@ def ask_question():
             'metadata': {
                 'sources_used': response.get('sources_used', 0),
                 'confidence': response.get('confidence', 0),
-                'query_type': response.get('query_type', 'unknown')
+                'query_type': response.get('query_type', 'unknown'),
+                'context_tokens': response.get('context_stats', {}).get('context_tokens'),
+                'tokens_saved': response.get('context_stats', {}).get('tokens_saved')
             }
         })
         
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
+@app.route('/ask/stream', methods=['POST'])
+def ask_question_stream():
+    """Answer a question as Server-Sent Events: metadata first, then tokens, then done"""
+    data = request.json
+    question = data.get('question', '').strip()
+    
+    if not question:
+        return jsonify({'success': False, 'message': 'Please enter a question'})
+    
+    try:
+        filters = validate_filters(data.get('filters'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f"Invalid filters: {e}"}), 400
+    
+    # Get or create conversation history for this session
+    session_id = session.get('session_id')
+    if not session_id:
+        session_id = secrets.token_hex(8)
+        session['session_id'] = session_id
+    
+    history = conversations.get(session_id)
+    
+    def generate():
+        for event in rag_system.query_stream(question, history, filters):
+            if event['type'] == 'done':
+                # Update conversation history once the full answer is known
+                conversations.append(session_id, question, event['answer'])
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/clear', methods=['POST'])
 def clear_conversation():
     session_id = session.get('session_id')
-    if session_id and session_id in conversations:
-        conversations[session_id] = []
+    if session_id:
+        conversations.clear(session_id)
     rag_system.clear_conversation_history()
     return jsonify({'success': True})
 
@@ -106,10 +174,16 @@ def clear_conversation():
 def get_stats():
     try:
         stats = rag_system.get_system_stats()
+        stats['conversations'] = conversations.get_stats()
         return jsonify({'success': True, 'stats': stats})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Per-stage latency histograms, counters and sizes in the Prometheus text format"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     print("🚀 Starting RAG System with Flask...")
     print("📝 Note: Using simple vector store (no ChromaDB issues)")
@@ -0,0 +1,76 @@
+# benchmarks/bench_ann_recall.py - Recall@k and latency of IVF search against the exact scan
+import argparse
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.config import Config
+from src.simple_vector_store import SimpleVectorStore
+
+
+def synthetic_texts(n: int, vocab_size: int = 20_000, words: int = 120, seed: int = 0):
+    """Chunks drawn from a Zipf-distributed vocabulary, each with a few topic words"""
+    rng = np.random.default_rng(seed)
+    vocab = np.array([f"w{i}" for i in range(vocab_size)])
+    ranks = np.minimum(rng.zipf(1.2, size=(n, words)), vocab_size) - 1
+    return [' '.join(vocab[row]) for row in ranks]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k vs latency of IVF search")
+    parser.add_argument('--chunks', type=int, default=100_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nlist', type=int, default=Config.IVF_NLIST)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64])
+    args = parser.parse_args()
+
+    config = Config()
+    config.PERSIST_VECTOR_STORE = False
+    config.SEARCH_MODE = 'ivf'
+    config.IVF_NLIST = args.nlist
+    store = SimpleVectorStore(config)
+
+    texts = synthetic_texts(args.chunks)
+    start = time.perf_counter()
+    for i in range(0, len(texts), 5_000):
+        store.add_documents([SimpleNamespace(content=t) for t in texts[i:i + 5_000]], f"doc{i}")
+    print(f"Indexed {store.count} chunks in {time.perf_counter() - start:.1f}s (nlist={store.ann_index.nlist})")
+
+    # Queries are short word samples taken from random stored chunks
+    rng = np.random.default_rng(1)
+    queries = [' '.join(rng.choice(texts[i].split(), 8)) for i in rng.integers(0, len(texts), args.queries)]
+    query_embeddings = store.embedder.embed_batch(queries)
+    # Nothing is added while measuring, so every search reads the same snapshot
+    snapshot = store.segment_store.snapshot
+
+    def timed(search):
+        results, timings = [], []
+        for q in query_embeddings:
+            start = time.perf_counter()
+            results.append(set(search(q).tolist()))
+            timings.append(time.perf_counter() - start)
+        return results, np.array(timings) * 1000
+
+    def exact(q):
+        return store._top_k(store._score(q, snapshot), args.k)
+
+    truth, exact_ms = timed(exact)
+    print(f"{'mode':>12} {'recall@' + str(args.k):>10} {'p50 ms':>10} {'p99 ms':>10}")
+    print(f"{'exact':>12} {1.0:>10.3f} {np.percentile(exact_ms, 50):>10.3f} {np.percentile(exact_ms, 99):>10.3f}")
+
+    for nprobe in args.nprobe:
+        store.ann_index.nprobe = nprobe
+        found, ivf_ms = timed(lambda q: store._search_indices(q, args.k, snapshot)[0])
+        recall = np.mean([len(f & t) / len(t) for f, t in zip(found, truth)])
+        print(f"{'ivf/' + str(nprobe):>12} {recall:>10.3f} {np.percentile(ivf_ms, 50):>10.3f} "
+              f"{np.percentile(ivf_ms, 99):>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
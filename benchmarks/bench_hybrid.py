@@ -0,0 +1,94 @@
+# benchmarks/bench_hybrid.py - Hit rate and latency of vector, BM25 and fused retrieval
+import argparse
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.config import Config
+from src.simple_vector_store import SimpleVectorStore
+from src.retriever import SmartRetriever
+from benchmarks.bench_ann_recall import synthetic_texts
+
+
+def part_number(i: int) -> str:
+    return f"PN-{i:06d}-{'ABCDEFGH'[i % 8]}"
+
+
+def build_corpus(n: int, seed: int = 0):
+    """Synthetic chunks; every chunk mentions its own part number after the first 100 words"""
+    rng = np.random.default_rng(seed)
+    texts = synthetic_texts(n, words=160, seed=seed)
+    corpus = []
+    for i, text in enumerate(texts):
+        words = text.split()
+        words.insert(int(rng.integers(100, len(words))), part_number(i))
+        corpus.append(' '.join(words))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hit rate and latency of vector vs BM25 vs hybrid retrieval")
+    parser.add_argument('--chunks', type=int, default=50_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=Config.TOP_K_RESULTS)
+    args = parser.parse_args()
+
+    config = Config()
+    config.PERSIST_VECTOR_STORE = False
+    config.RETRIEVAL_MODE = 'hybrid'
+    config.TOP_K_RESULTS = args.k
+    config.QUERY_CACHE_SIZE = 0  # measure the search itself, not the cache
+    store = SimpleVectorStore(config)
+    retriever = SmartRetriever(store, config)
+
+    corpus = build_corpus(args.chunks)
+    start = time.perf_counter()
+    for i in range(0, len(corpus), 5_000):
+        store.add_documents([SimpleNamespace(content=t, chunk_type='text', page_number=1)
+                             for t in corpus[i:i + 5_000]], 'synthetic')
+    store.keyword_search('warm up', 1)  # merge the postings built during ingestion
+    print(f"Indexed {store.count} chunks in {time.perf_counter() - start:.1f}s "
+          f"({len(store.bm25_index.vocabulary)} terms, {len(store.bm25_index._ids)} postings)")
+
+    rng = np.random.default_rng(1)
+    targets = rng.integers(0, len(corpus), args.queries)
+    query_sets = {
+        # Exact identifiers beyond the 100 words the hash embedder looks at
+        'part number': [f"what is the torque spec for {part_number(i)}" for i in targets],
+        # Word samples from the beginning of the target chunk
+        'topic words': [' '.join(rng.choice(corpus[i].split()[:100], 8)) for i in targets],
+    }
+
+    vector_only = SimpleNamespace(**{**vars(Config), 'RETRIEVAL_MODE': 'vector', 'TOP_K_RESULTS': args.k})
+    methods = {
+        'vector': lambda q: [r['id'] for r in SmartRetriever(store, vector_only).retrieve(q)['results']],
+        'bm25': lambda q: store.keyword_search(q, args.k)['ids'],
+        'hybrid': lambda q: [r['id'] for r in retriever.retrieve(q)['results']],
+    }
+
+    print(f"{'queries':>12} {'method':>8} {'hit@' + str(args.k):>8} {'p50 ms':>9} {'p99 ms':>9}")
+    for name, queries in query_sets.items():
+        for method, search in methods.items():
+            hits, timings = [], []
+            for query, target in zip(queries, targets):
+                start = time.perf_counter()
+                ids = search(query)
+                timings.append(time.perf_counter() - start)
+                hits.append(int(target) in ids)
+            timings = np.array(timings) * 1000
+            print(f"{name:>12} {method:>8} {np.mean(hits):>8.3f} {np.percentile(timings, 50):>9.2f} "
+                  f"{np.percentile(timings, 99):>9.2f}")
+
+    index = store.bm25_index
+    total = index.postings_scanned + index.postings_skipped
+    print(f"BM25 early termination: scanned {index.postings_scanned} of {total} postings "
+          f"({index.postings_scanned / max(total, 1):.1%})")
+
+
+if __name__ == '__main__':
+    main()
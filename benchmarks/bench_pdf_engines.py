@@ -0,0 +1,111 @@
+# benchmarks/bench_pdf_engines.py - Pages/sec and output parity of the dual-parser and PyMuPDF extraction engines
+import argparse
+import csv
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.config import Config
+from src.pdf_processor import PDFProcessor
+from benchmarks.synthetic_corpus import make_pdf
+
+
+def extract(pdf_path: str, engine: str, workers: int, repeat: int):
+    """Chunks from the fastest of `repeat` runs, and that run's seconds"""
+    config = Config()
+    config.PDF_ENGINE = engine
+    config.PDF_WORKERS = workers
+    config.OCR_CACHE_PATH = None
+    best, chunks = None, None
+    for _ in range(repeat):
+        processor = PDFProcessor(config)
+        start = time.perf_counter()
+        chunks = processor.extract_content(pdf_path)
+        seconds = time.perf_counter() - start
+        processor.close()
+        best = seconds if best is None else min(best, seconds)
+    return chunks, best
+
+
+def by_page(chunks):
+    pages = defaultdict(lambda: defaultdict(list))
+    for chunk in chunks:
+        pages[chunk.page_number][chunk.chunk_type].append(chunk.content)
+    return pages
+
+
+def table_cells(contents):
+    """Non-empty cells of a page's tables, read back from their CSV part"""
+    cells = Counter()
+    for content in contents:
+        for row in csv.reader(io.StringIO(content.split('CSV FORMAT:\n', 1)[1])):
+            cells.update(' '.join(cell.split()) for cell in row if cell.strip())
+    return cells
+
+
+def overlap(a: Counter, b: Counter) -> float:
+    """Multiset Jaccard similarity; 1.0 when both are empty"""
+    union = sum((a | b).values())
+    return sum((a & b).values()) / union if union else 1.0
+
+
+def parity(reference, candidate) -> dict:
+    """Per-page agreement of the candidate engine's chunks with the reference engine's"""
+    ref_pages, cand_pages = by_page(reference), by_page(candidate)
+    text, tables, table_counts, images = [], [], [], []
+    for page in sorted(set(ref_pages) | set(cand_pages)):
+        ref, cand = ref_pages[page], cand_pages[page]
+        text.append(overlap(Counter(' '.join(ref['text']).split()), Counter(' '.join(cand['text']).split())))
+        tables.append(overlap(table_cells(ref['table']), table_cells(cand['table'])))
+        table_counts.append(len(ref['table']) == len(cand['table']))
+        images.append(len(ref['image']) == len(cand['image']))
+    return {
+        'text_word_overlap': float(np.mean(text)) if text else 1.0,
+        'text_word_overlap_min': float(np.min(text)) if text else 1.0,
+        'table_cell_overlap': float(np.mean(tables)) if tables else 1.0,
+        'pages_same_table_count': float(np.mean(table_counts)) if table_counts else 1.0,
+        'pages_same_image_count': float(np.mean(images)) if images else 1.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the dual-parser and PyMuPDF extraction engines")
+    parser.add_argument('pdfs', nargs='*', help="PDFs to measure; synthetic ones are generated when none are given")
+    parser.add_argument('--pages', type=int, default=50, help="pages of the synthetic PDF")
+    parser.add_argument('--tables-per-page', type=int, default=1)
+    parser.add_argument('--images-per-page', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=1, help="PDF_WORKERS; 1 measures the parsers alone")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory(prefix='pdf_engines_') as workdir:
+        pdfs = args.pdfs or [make_pdf(os.path.join(workdir, 'synthetic.pdf'), args.pages,
+                                      args.tables_per_page, args.images_per_page, seed=args.pages)]
+        for pdf_path in pdfs:
+            import fitz
+            with fitz.open(pdf_path) as doc:
+                pages = len(doc)
+
+            results = {engine: extract(pdf_path, engine, args.workers, args.repeat) for engine in PDFProcessor.ENGINES}
+            print(f"{os.path.basename(pdf_path)} ({pages} pages, {args.workers} worker(s))")
+            for engine, (chunks, seconds) in results.items():
+                counts = Counter(chunk.chunk_type for chunk in chunks)
+                print(f"  {engine:>8}: {pages / seconds:8.1f} pages/s  {seconds:7.2f}s  "
+                      f"chunks text={counts['text']} table={counts['table']} image={counts['image']}")
+            speedup = results['dual'][1] / results['pymupdf'][1]
+            print(f"  pymupdf speedup: {speedup:.2f}x")
+            for name, value in parity(results['dual'][0], results['pymupdf'][0]).items():
+                print(f"  {name:<24} {value:.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# benchmarks/bench_quantization.py - Memory, latency and recall of float32, float16 and int8 embedding storage
+import argparse
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.config import Config
+from src.simple_vector_store import SimpleVectorStore
+from src.quantized_index import QuantizedIndex
+from benchmarks.bench_ann_recall import synthetic_texts
+
+
+def build_store(storage: str, corpus, rescore_factor: int) -> SimpleVectorStore:
+    config = Config()
+    config.PERSIST_VECTOR_STORE = False
+    config.RETRIEVAL_MODE = 'vector'
+    config.QUERY_CACHE_SIZE = 0  # measure the search itself, not the cache
+    config.EMBEDDING_STORAGE = storage
+    config.RESCORE_FACTOR = rescore_factor
+    store = SimpleVectorStore(config)
+    for i in range(0, len(corpus), 5_000):
+        store.add_documents([SimpleNamespace(content=t, chunk_type='text', page_number=1)
+                             for t in corpus[i:i + 5_000]], 'synthetic')
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare float32, float16 and int8 embedding storage")
+    parser.add_argument('--chunks', type=int, default=100_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--rescore-factor', type=int, default=Config.RESCORE_FACTOR)
+    args = parser.parse_args()
+
+    corpus = synthetic_texts(args.chunks, seed=0)
+    rng = np.random.default_rng(1)
+    queries = [' '.join(rng.choice(corpus[i].split(), 8)) for i in rng.integers(0, len(corpus), args.queries)]
+
+    reference = None
+    print(f"{'storage':>8} {'MB per 1M chunks':>17} {'p50 ms':>9} {'p99 ms':>9} {'recall@' + str(args.k):>10}")
+    for storage in ('float32', 'float16', 'int8'):
+        store = build_store(storage, corpus, args.rescore_factor)
+        store.search('warm up', args.k)
+
+        results, timings = [], []
+        for query in queries:
+            start = time.perf_counter()
+            results.append(store.search(query, args.k)['ids'])
+            timings.append(time.perf_counter() - start)
+        if reference is None:
+            reference = results
+        recall = np.mean([len(set(found) & set(exact)) / max(len(exact), 1)
+                          for found, exact in zip(results, reference)])
+
+        bytes_per_vector = store.codes.bytes_per_vector if store.codes is not None else 4 * store.dim
+        timings = np.array(timings) * 1000
+        print(f"{storage:>8} {bytes_per_vector * 1e6 / 2 ** 20:>17.0f} {np.percentile(timings, 50):>9.2f} "
+              f"{np.percentile(timings, 99):>9.2f} {recall:>10.3f}")
+
+    # Recall of the compact scan alone, without the exact rescoring
+    store = build_store('float32', corpus, args.rescore_factor)
+    matrix = store._rows(0, store.count)
+    for mode in QuantizedIndex.MODES:
+        codes = QuantizedIndex(store.dim, mode)
+        codes.add(matrix)
+        recall = []
+        for query, exact in zip(queries, reference):
+            top = store._top_k(codes.score(store._generate_embedding(query)), args.k)
+            recall.append(len(set(top.tolist()) & set(exact)) / max(len(exact), 1))
+        print(f"{mode} scan without rescoring: recall@{args.k} {np.mean(recall):.3f}")
+
+
+if __name__ == '__main__':
+    main()
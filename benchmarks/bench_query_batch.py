@@ -0,0 +1,72 @@
+# benchmarks/bench_query_batch.py - Throughput of RAGSystem.query_batch vs one query at a time
+import argparse
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.config import Config
+from benchmarks.bench_ann_recall import synthetic_texts
+from benchmarks.groq_stub import StubSettings, start_stub
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Queries per second of query_batch at several batch sizes")
+    parser.add_argument('--chunks', type=int, default=50_000)
+    parser.add_argument('--questions', type=int, default=256)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32, 128])
+    parser.add_argument('--first-token-delay', type=float, default=0.05)
+    parser.add_argument('--token-delay', type=float, default=0.0)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    args = parser.parse_args()
+
+    server = start_stub(StubSettings(first_token_delay=args.first_token_delay, token_delay=args.token_delay))
+    config = Config()
+    config.GROQ_API_KEY = 'stub'
+    config.GROQ_BASE_URL = f"http://127.0.0.1:{server.server_port}"
+    config.PERSIST_VECTOR_STORE = False
+    config.QUERY_CACHE_SIZE = 0
+    config.ANSWER_CACHE_MAX_ENTRIES = 0
+
+    from src.rag_system import RAGSystem
+    rag = RAGSystem(config)
+    texts = synthetic_texts(args.chunks)
+    for i in range(0, len(texts), 5_000):
+        rag.vector_store.add_documents([SimpleNamespace(content=t, chunk_type='text', page_number=1)
+                                        for t in texts[i:i + 5_000]], 'synthetic')
+    questions = [f"what does w{i} say about w{i + 1} and w{i + 2}" for i in range(args.questions)]
+    rag.retriever.retrieve_batch(questions[:1])  # build the keyword index outside the timings
+
+    print(f"Retrieval only, {rag.vector_store.count} chunks, mode={config.RETRIEVAL_MODE}")
+    print(f"{'batch':>8} {'qps':>10}")
+    start = time.perf_counter()
+    for q in questions:
+        rag.retriever.retrieve(q)
+    print(f"{'loop':>8} {len(questions) / (time.perf_counter() - start):>10.1f}")
+    for size in args.batch_sizes:
+        start = time.perf_counter()
+        for i in range(0, len(questions), size):
+            rag.retriever.retrieve_batch(questions[i:i + size])
+        print(f"{size:>8} {len(questions) / (time.perf_counter() - start):>10.1f}")
+
+    # End to end against the stub, whose latency stands in for Groq's
+    n = min(len(questions), 64)
+    print(f"\nEnd to end, {n} questions, stub first token after {args.first_token_delay * 1000:.0f} ms")
+    print(f"{'mode':>16} {'qps':>10}")
+    start = time.perf_counter()
+    for q in questions[:n]:
+        rag.query(q)
+    print(f"{'query() loop':>16} {n / (time.perf_counter() - start):>10.1f}")
+    for workers in args.concurrency:
+        start = time.perf_counter()
+        responses = rag.query_batch(questions[:n], max_workers=workers)
+        elapsed = time.perf_counter() - start
+        assert all(not r.get('error', True) for r in responses)
+        print(f"{'batch/' + str(workers) + ' workers':>16} {n / elapsed:>10.1f}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+# benchmarks/bench_shared_index.py - Memory per serving process and snapshot pick-up latency of a shared index
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config.config import Config
+from src.simple_vector_store import SimpleVectorStore
+from src.pdf_processor import DocumentChunk
+from benchmarks.synthetic_corpus import synthetic_chunks, sample_queries
+
+
+def store_config(store_path: str, segment_chunks: int, refresh_seconds: float = None) -> Config:
+    config = Config()
+    config.PERSIST_VECTOR_STORE = True
+    config.VECTOR_STORE_PATH = store_path
+    config.SEGMENT_MAX_CHUNKS = segment_chunks
+    config.QUERY_CACHE_SIZE = 0
+    if refresh_seconds is not None:
+        config.INDEX_REFRESH_SECONDS = refresh_seconds
+    return config
+
+
+def memory() -> dict:
+    """kB figures of /proc/self/smaps_rollup (Linux)"""
+    with open('/proc/self/smaps_rollup') as f:
+        lines = f.readlines()[1:]  # the first line is the address range
+    return {name: int(value.split()[0]) for name, value in (line.split(':', 1) for line in lines)}
+
+
+def probe(role: str, store_path: str, segment_chunks: int, queries: int):
+    """One serving process: open the store, answer queries, then report its memory when told to"""
+    logging.disable(logging.WARNING)
+    config = store_config(store_path, segment_chunks)
+    before = memory()
+    store = SimpleVectorStore(config, read_only=True) if role == 'reader' else SimpleVectorStore(config)
+    store.warm_up()
+    for query in sample_queries(queries):
+        store.search(query, 5)
+        store.keyword_search(query, 5)
+    print('ready', flush=True)
+    sys.stdin.readline()  # measured while every probe is alive, so shared pages are split between them
+    after = memory()
+    print(json.dumps({'private_mb': (after['Anonymous'] - before['Anonymous']) / 1024, 'pss_mb': after['Pss'] / 1024}),
+          flush=True)
+    sys.stdin.read()  # stay alive until every probe has been measured
+
+
+def measure(role: str, store_path: str, workers: int, args) -> dict:
+    command = [sys.executable, os.path.abspath(__file__), '--probe', role, store_path,
+               str(args.segment_chunks), str(args.queries)]
+    probes = [subprocess.Popen(command, cwd=ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+              for _ in range(workers)]
+    for process in probes:
+        if process.stdout.readline().strip() != 'ready':
+            raise RuntimeError(f"{role} probe failed")
+    for process in probes:
+        process.stdin.write('\n')
+        process.stdin.flush()
+    reports = [json.loads(process.stdout.readline()) for process in probes]
+    for process in probes:
+        process.stdin.close()
+        process.wait()
+    return {'private_mb_per_worker': float(np.median([r['private_mb'] for r in reports])),
+            'total_pss_mb': sum(r['pss_mb'] for r in reports)}
+
+
+def build_store(store_path: str, chunks: int, segment_chunks: int):
+    store = SimpleVectorStore(store_config(store_path, segment_chunks))
+    for document, batch in synthetic_chunks(chunks, batch_size=2_000):
+        store.add_documents(batch, document)
+
+
+def pickup_latency(store_path: str, args) -> list:
+    """Seconds from a writer's add_documents() call until a read-only store finds the new chunks"""
+    writer = SimpleVectorStore(store_config(store_path, args.segment_chunks))
+    reader = SimpleVectorStore(store_config(store_path, args.segment_chunks, args.refresh_seconds), read_only=True)
+    reader.warm_up()
+    timings = []
+    for i in range(args.pickups):
+        token = f"pickupmarker{i}"
+        chunks = [DocumentChunk(content=f"{token} chunk {j}", chunk_type='text', page_number=1, metadata={})
+                  for j in range(256)]
+        start = time.perf_counter()
+        writer.add_documents(chunks, token)
+        while not reader.keyword_search(token, 1)['ids']:
+            time.sleep(0.005)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory per worker process with private vs shared indexes")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20_000, 80_000], help="chunks in the store")
+    parser.add_argument('--segment-chunks', type=int, default=10_000, help="SEGMENT_MAX_CHUNKS")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--roles', nargs='+', default=['standalone', 'reader'], choices=['standalone', 'reader'])
+    parser.add_argument('--queries', type=int, default=200, help="searches each worker runs before it is measured")
+    parser.add_argument('--pickups', type=int, default=5, help="documents added to measure pick-up latency")
+    parser.add_argument('--refresh-seconds', type=float, default=Config.INDEX_REFRESH_SECONDS)
+    parser.add_argument('--output', help="write the results as JSON, comparable with run_suite.py --compare")
+    parser.add_argument('--probe', nargs=4, metavar=('ROLE', 'STORE', 'SEGMENT_CHUNKS', 'QUERIES'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        role, store_path, segment_chunks, queries = args.probe
+        probe(role, store_path, int(segment_chunks), int(queries))
+        return
+
+    logging.disable(logging.WARNING)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='shared_index_') as workdir:
+        for size in args.sizes:
+            store_path = os.path.join(workdir, f"store_{size}")
+            build_store(store_path, size, args.segment_chunks)
+            for role in args.roles:
+                runs = {workers: measure(role, store_path, workers, args) for workers in args.workers}
+                most = max(args.workers)
+                # What one more process costs, shared pages counted once
+                added = ((runs[most]['total_pss_mb'] - runs[1]['total_pss_mb']) / (most - 1)
+                         if most > 1 and 1 in runs else None)
+                results[f"{role}.{size}"] = {
+                    'private_mb_per_worker': runs[most]['private_mb_per_worker'],
+                    'added_worker_pss_mb': added,
+                    'total_pss_mb': {str(workers): run['total_pss_mb'] for workers, run in runs.items()}
+                }
+                pss = '  '.join(f"{workers}w {run['total_pss_mb']:7.1f}" for workers, run in runs.items())
+                print(f"{size:>9} chunks {role:>10}: private {runs[most]['private_mb_per_worker']:7.1f} MB/worker, "
+                      f"PSS total {pss} MB" + (f", +{added:.1f} MB per added worker" if added is not None else ''))
+
+        if 'reader' in args.roles:
+            timings = np.array(pickup_latency(os.path.join(workdir, f"store_{args.sizes[-1]}"), args)) * 1000
+            results['pickup'] = {'p50_ms': float(np.percentile(timings, 50)), 'max_ms': float(timings.max())}
+            print(f"new chunks visible to a reader after p50 {results['pickup']['p50_ms']:.0f} ms, "
+                  f"max {results['pickup']['max_ms']:.0f} ms (INDEX_REFRESH_SECONDS={args.refresh_seconds})")
+
+    if args.output:
+        from benchmarks.run_suite import environment
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'parameters': vars(args), 'results': {'shared_index': results}},
+                      f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
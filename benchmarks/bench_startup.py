@@ -0,0 +1,114 @@
+# benchmarks/bench_startup.py - Import time and time to first request of a fresh process
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Libraries a query-only process should never load
+PDF_STACK = ('fitz', 'pdfplumber', 'pytesseract', 'PIL', 'pandas')
+HEAVY_MODULES = PDF_STACK + ('groq', 'flask')
+
+
+def probe(scenario: str, store_path: str):
+    """Runs in the measured child process; prints one JSON line of timings"""
+    result = {}
+    if scenario == 'import':
+        start = time.perf_counter()
+        import src.rag_system  # noqa: F401
+        result['import_ms'] = (time.perf_counter() - start) * 1000
+    else:
+        from benchmarks.groq_stub import start_stub, StubSettings
+        from config.config import Config
+        server = start_stub(StubSettings(first_token_delay=0.0, token_delay=0.0))
+        Config.GROQ_API_KEY = 'stub'
+        Config.GROQ_BASE_URL = f"http://127.0.0.1:{server.server_port}"
+        Config.VECTOR_STORE_PATH = store_path
+        Config.OCR_CACHE_PATH = None
+        Config.ANSWER_CACHE_MAX_ENTRIES = 0
+
+        import logging
+        logging.disable(logging.WARNING)
+        start = time.perf_counter()
+        import app_flask
+        result['import_ms'] = (time.perf_counter() - start) * 1000
+
+        client = app_flask.app.test_client()
+        start = time.perf_counter()
+        response = client.post('/ask', json={'question': 'What does the warranty cover?'})
+        result['first_request_ms'] = (time.perf_counter() - start) * 1000
+        result['first_response_at'] = time.time()
+        if response.status_code != 200 or response.get_json().get('error'):
+            raise RuntimeError(f"/ask failed: {response.get_data(as_text=True)[:200]}")
+        start = time.perf_counter()
+        client.post('/ask', json={'question': 'Who can file a claim?'})
+        result['second_request_ms'] = (time.perf_counter() - start) * 1000
+    result['loaded'] = [name for name in HEAVY_MODULES if name in sys.modules]
+    print(json.dumps(result))
+
+
+def build_store(path: str, chunks: int):
+    from config.config import Config
+    from src.simple_vector_store import SimpleVectorStore
+    from benchmarks.synthetic_corpus import synthetic_chunks
+
+    config = Config()
+    config.PERSIST_VECTOR_STORE = True
+    config.VECTOR_STORE_PATH = path
+    store = SimpleVectorStore(config)
+    for document, batch in synthetic_chunks(chunks):
+        store.add_documents(batch, document)
+
+
+def run(scenario: str, store_path: str) -> dict:
+    started = time.time()
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--probe', scenario, store_path],
+                            cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    if 'first_response_at' in result:
+        # Interpreter start-up included
+        result['process_to_first_response_ms'] = (result.pop('first_response_at') - started) * 1000
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time and time to first request of a fresh process")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--chunks', type=int, default=10_000, help="chunks in the persisted store the app opens")
+    parser.add_argument('--output', help="write the results as JSON, comparable with run_suite.py --compare")
+    parser.add_argument('--probe', nargs=2, metavar=('SCENARIO', 'STORE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        probe(*args.probe)
+        return
+    import numpy as np
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='startup_store_') as store_path:
+        build_store(store_path, args.chunks)
+        for scenario, label in (('import', 'import src.rag_system'), ('app', 'import app_flask + first /ask')):
+            runs = [run(scenario, store_path) for _ in range(args.runs)]
+            timings = {key: [r[key] for r in runs] for key in runs[0] if key.endswith('_ms')}
+            results[scenario] = {f"{key[:-3]}.median_ms": float(np.median(values)) for key, values in timings.items()}
+            results[scenario]['pdf_stack_loaded'] = any(name in runs[0]['loaded'] for name in PDF_STACK)
+            print(f"{label}:")
+            for key, values in timings.items():
+                print(f"  {key[:-3]:<28} median {np.median(values):8.1f} ms  min {min(values):8.1f} ms")
+            print(f"  heavy modules loaded: {', '.join(runs[0]['loaded']) or 'none'}")
+
+    if args.output:
+        from benchmarks.run_suite import environment
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'parameters': vars(args), 'results': {'startup': results}},
+                      f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# benchmarks/bench_streaming.py - Time to first token of streamed vs blocking answers
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.config import Config
+from benchmarks.groq_stub import StubSettings, start_stub
+
+
+def percentiles(samples):
+    return np.percentile(np.array(samples) * 1000, 50), np.percentile(np.array(samples) * 1000, 99)
+
+
+def read_events(body):
+    """Parse a Server-Sent Events body, given as an iterable of byte chunks, into (event, data) pairs"""
+    buffer = ''
+    for piece in body:
+        buffer += piece.decode('utf-8') if isinstance(piece, bytes) else piece
+        while '\n\n' in buffer:
+            block, buffer = buffer.split('\n\n', 1)
+            event, data = 'message', ''
+            for line in block.split('\n'):
+                if line.startswith('event: '):
+                    event = line[7:]
+                elif line.startswith('data: '):
+                    data += line[6:]
+            yield event, json.loads(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time to first token through the /ask/stream endpoint vs /ask")
+    parser.add_argument('--requests', type=int, default=10)
+    parser.add_argument('--first-token-delay', type=float, default=0.3)
+    parser.add_argument('--token-delay', type=float, default=0.02)
+    args = parser.parse_args()
+
+    server = start_stub(StubSettings(first_token_delay=args.first_token_delay, token_delay=args.token_delay))
+    os.environ['GROQ_API_KEY'] = 'stub'
+    Config.GROQ_API_KEY = 'stub'
+    Config.GROQ_BASE_URL = f"http://127.0.0.1:{server.server_port}"
+    Config.PERSIST_VECTOR_STORE = False
+    Config.QUERY_CACHE_SIZE = 0
+    Config.ANSWER_CACHE_MAX_ENTRIES = 0
+
+    import app_flask
+    from benchmarks.bench_ann_recall import synthetic_texts
+    from src.pdf_processor import DocumentChunk
+
+    # A small in-memory corpus so retrieval returns context for every question
+    chunks = [DocumentChunk(content=text, chunk_type='text', page_number=i % 20 + 1, metadata={})
+              for i, text in enumerate(synthetic_texts(500))]
+    app_flask.rag_system.vector_store.add_documents(chunks, 'synthetic.pdf')
+    client = app_flask.app.test_client()
+    question = {'question': 'What does the warranty cover?'}
+
+    blocking, first_token, complete, server_ttft = [], [], [], []
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        response = client.post('/ask', json=question)
+        assert response.get_json()['success']
+        blocking.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        response = client.post('/ask/stream', json=question, buffered=False)
+        first = None
+        for event, data in read_events(response.response):
+            if event == 'token' and first is None:
+                first = time.perf_counter() - start
+            elif event == 'done':
+                server_ttft.append(data['time_to_first_token'])
+        complete.append(time.perf_counter() - start)
+        first_token.append(first)
+        response.close()
+
+    print(f"stub: first token after {args.first_token_delay * 1000:.0f} ms, "
+          f"{args.token_delay * 1000:.0f} ms per token, {len(StubSettings().tokens())} tokens")
+    print(f"{'path':>28} {'p50 ms':>9} {'p99 ms':>9}")
+    rows = [
+        ('/ask (blocking) answer', blocking),
+        ('/ask/stream first token', first_token),
+        ('/ask/stream LLM TTFT', server_ttft),
+        ('/ask/stream complete', complete),
+    ]
+    for name, samples in rows:
+        p50, p99 = percentiles(samples)
+        print(f"{name:>28} {p50:9.1f} {p99:9.1f}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
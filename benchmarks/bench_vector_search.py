@@ -0,0 +1,59 @@
+# benchmarks/bench_vector_search.py - Query latency of SimpleVectorStore vs corpus size
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.config import Config
+from src.simple_vector_store import SimpleVectorStore
+
+
+def build_store(n_chunks: int, seed: int = 0) -> SimpleVectorStore:
+    """Fill a store with random unit vectors (embedding cost is not measured here)"""
+    config = Config()
+    config.PERSIST_VECTOR_STORE = False
+    store = SimpleVectorStore(config)
+    rng = np.random.default_rng(seed)
+    batch = 50_000
+    for start in range(0, n_chunks, batch):
+        rows = rng.standard_normal((min(batch, n_chunks - start), store.dim)).astype(np.float32)
+        rows /= np.linalg.norm(rows, axis=1, keepdims=True)
+        records = [{'id': f"synthetic_{i}", 'document': f"synthetic chunk {i}",
+                    'metadata': {'document_name': 'synthetic', 'chunk_type': 'text', 'page_number': 1}}
+                   for i in range(start, start + len(rows))]
+        columns = {'document': np.zeros(len(rows)), 'page': np.ones(len(rows)), 'type': np.zeros(len(rows))}
+        store.segment_store.append(rows, records, columns)
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SimpleVectorStore query latency vs corpus size")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000, 300_000])
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    queries = [f"what does section {i} say about the warranty terms" for i in range(args.queries)]
+
+    print(f"{'chunks':>10} {'p50 ms':>10} {'p99 ms':>10} {'qps':>10}")
+    for size in args.sizes:
+        store = build_store(size)
+        store.search(queries[0], n_results=args.k)  # warm up
+
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            store.search(query, n_results=args.k)
+            timings.append(time.perf_counter() - start)
+
+        timings = np.array(timings) * 1000
+        print(f"{size:>10} {np.percentile(timings, 50):>10.3f} {np.percentile(timings, 99):>10.3f} "
+              f"{1000 / timings.mean():>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
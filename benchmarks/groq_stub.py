@@ -0,0 +1,170 @@
+# benchmarks/groq_stub.py - Local stand-in for the Groq chat-completions API
+import argparse
+import json
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_ANSWER = (
+    "Based on the documents, here's what I found:\n\n"
+    "## Main Finding\n\n"
+    "The warranty covers **manufacturing defects** for two years from the date of purchase (Page 3). "
+    "Damage caused by misuse, accidents or unauthorised repairs is excluded.\n\n"
+    "## Key Details\n\n"
+    "• **Claims**: must include the original receipt\n"
+    "• **Repairs**: are carried out within 14 days\n"
+    "• **Replacements**: are offered when a repair is not possible\n\n"
+    "> Note: This information is from page 3 of the document."
+)
+
+
+class StubSettings:
+    """Latency model of the stub: time before the first token, then a fixed gap per token"""
+
+    def __init__(self, answer: str = DEFAULT_ANSWER, first_token_delay: float = 0.3, token_delay: float = 0.02):
+        self.answer = answer
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+
+    def tokens(self):
+        """The answer split into word-sized pieces, whitespace kept with the preceding word"""
+        pieces, current = [], ''
+        for char in self.answer:
+            current += char
+            if char.isspace():
+                pieces.append(current)
+                current = ''
+        if current:
+            pieces.append(current)
+        return pieces
+
+
+class StubClient:
+    """In-process stand-in for groq.Groq: same answer and latency model, no sockets
+
+    Assign it to LLMHandler.client. Only chat.completions.create is provided, returning
+    objects shaped like the SDK's completions and stream chunks.
+    """
+
+    def __init__(self, settings: StubSettings = None):
+        self.settings = settings or StubSettings()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.requests = 0
+
+    def _create(self, messages, stream: bool = False, **kwargs):
+        self.requests += 1
+        tokens = self.settings.tokens()
+        # Whitespace-separated words stand in for prompt tokens so the count is deterministic
+        usage = SimpleNamespace(prompt_tokens=sum(len(m['content'].split()) for m in messages),
+                                completion_tokens=len(tokens), total_tokens=None)
+        usage.total_tokens = usage.prompt_tokens + usage.completion_tokens
+        if stream:
+            return self._stream(tokens, usage)
+        time.sleep(self.settings.first_token_delay + self.settings.token_delay * (len(tokens) - 1))
+        message = SimpleNamespace(role='assistant', content=self.settings.answer)
+        return SimpleNamespace(choices=[SimpleNamespace(index=0, message=message, finish_reason='stop')], usage=usage)
+
+    def _stream(self, tokens, usage):
+        time.sleep(self.settings.first_token_delay)
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(self.settings.token_delay)
+            yield SimpleNamespace(choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=token),
+                                                           finish_reason=None)], usage=None)
+        yield SimpleNamespace(choices=[], usage=usage)
+
+
+def _make_handler(settings: StubSettings):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            if not self.path.endswith('/chat/completions'):
+                self.send_error(404)
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+            created = int(time.time())
+            model = request.get('model', 'stub')
+            tokens = settings.tokens()
+
+            if request.get('stream'):
+                self._stream(completion_id, created, model, tokens)
+            else:
+                # A non-streaming call only answers once the whole completion is generated
+                time.sleep(settings.first_token_delay + settings.token_delay * (len(tokens) - 1))
+                self._send_json({
+                    'id': completion_id, 'object': 'chat.completion', 'created': created, 'model': model,
+                    'choices': [{'index': 0, 'finish_reason': 'stop',
+                                 'message': {'role': 'assistant', 'content': settings.answer}}],
+                    'usage': {'prompt_tokens': 0, 'completion_tokens': len(tokens), 'total_tokens': len(tokens)}
+                })
+
+        def _send_json(self, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _stream(self, completion_id, created, model, tokens):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+
+            def event(payload):
+                data = f"data: {payload}\n\n".encode('utf-8')
+                self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+                self.wfile.flush()
+
+            def chunk(delta, finish_reason=None):
+                return json.dumps({
+                    'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                    'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+                })
+
+            event(chunk({'role': 'assistant', 'content': ''}))
+            time.sleep(settings.first_token_delay)
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(settings.token_delay)
+                event(chunk({'content': token}))
+            event(chunk({}, finish_reason='stop'))
+            event('[DONE]')
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def start_stub(settings: StubSettings = None, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+    """Serve the stub from a background thread; point GROQ_BASE_URL at f"http://{host}:{server.server_port}" """
+    server = ThreadingHTTPServer((host, port), _make_handler(settings or StubSettings()))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local stub of the Groq chat-completions API")
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--first-token-delay', type=float, default=0.3)
+    parser.add_argument('--token-delay', type=float, default=0.02)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port),
+                                 _make_handler(StubSettings(first_token_delay=args.first_token_delay,
+                                                            token_delay=args.token_delay)))
+    print(f"Groq stub listening on http://127.0.0.1:{args.port} (set GROQ_BASE_URL to this address)")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
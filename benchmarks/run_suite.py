@@ -0,0 +1,220 @@
+# benchmarks/run_suite.py - Ingestion, search and end-to-end query benchmarks with JSON results
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.config import Config
+from benchmarks.groq_stub import StubClient, StubSettings
+from benchmarks.synthetic_corpus import make_pdf, synthetic_chunks, sample_queries
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def bench_config(workdir: str, **overrides) -> Config:
+    """An in-memory configuration that measures the code itself: caches off, nothing read from ./data"""
+    config = Config()
+    config.GROQ_API_KEY = 'stub'
+    config.PERSIST_VECTOR_STORE = False
+    config.VECTOR_STORE_PATH = os.path.join(workdir, 'vector_store')
+    config.OCR_CACHE_PATH = None
+    config.QUERY_CACHE_SIZE = 0
+    config.ANSWER_CACHE_MAX_ENTRIES = 0
+    for name, value in overrides.items():
+        setattr(config, name, value)
+    return config
+
+
+def rag_system(config):
+    from src.rag_system import RAGSystem
+    system = RAGSystem(config)
+    system.llm_handler.client = StubClient(StubSettings(first_token_delay=0.0, token_delay=0.0))
+    return system
+
+
+def latency(timings) -> dict:
+    timings = np.array(timings) * 1000
+    return {'p50_ms': float(np.percentile(timings, 50)), 'p99_ms': float(np.percentile(timings, 99)),
+            'mean_ms': float(timings.mean())}
+
+
+def fill(store, n_chunks: int):
+    for document, chunks in synthetic_chunks(n_chunks):
+        store.add_documents(chunks, document)
+
+
+def bench_ingestion(args, workdir: str) -> dict:
+    results = {}
+    for pages in args.pages:
+        path = make_pdf(os.path.join(workdir, f"synthetic_{pages}p.pdf"), pages,
+                        args.tables_per_page, args.images_per_page, seed=pages)
+        timings = []
+        for _ in range(args.repeat):
+            # A fresh system each time so the document registry does not skip the unchanged file
+            system = rag_system(bench_config(workdir, PDF_WORKERS=args.pdf_workers))
+            start = time.perf_counter()
+            outcome = system.add_document(path)
+            timings.append(time.perf_counter() - start)
+            if not outcome['success']:
+                raise RuntimeError(f"Ingesting {path} failed: {outcome['message']}")
+        seconds = min(timings)
+        results[f"{pages}_pages"] = {'seconds': seconds, 'pages_per_sec': pages / seconds,
+                                     'chunks': outcome['statistics']['total_chunks']}
+        print(f"ingest {pages:>5} pages: {pages / seconds:8.1f} pages/s ({seconds:.2f}s, "
+              f"{outcome['statistics']['total_chunks']} chunks)")
+    return results
+
+
+def bench_search(args, workdir: str) -> dict:
+    from src.retriever import SmartRetriever
+    from src.simple_vector_store import SimpleVectorStore
+
+    queries = sample_queries(args.queries)
+    results = {}
+    for size in args.sizes:
+        config = bench_config(workdir, SEARCH_MODE=args.search_mode, EMBEDDING_STORAGE=args.storage)
+        store = SimpleVectorStore(config)
+        start = time.perf_counter()
+        fill(store, size)
+        build_seconds = time.perf_counter() - start
+        retriever = SmartRetriever(store, config)
+
+        searches = {
+            'vector': lambda q: store.search(q, args.k),
+            'keyword': lambda q: store.keyword_search(q, args.k),
+            'retrieve': lambda q: retriever.retrieve(q),
+        }
+        entry = {'build_seconds': build_seconds, 'chunks_per_sec': size / build_seconds}
+        for name, search in searches.items():
+            search(queries[0])  # warm up lazily built indexes
+            timings = []
+            for query in queries:
+                start = time.perf_counter()
+                search(query)
+                timings.append(time.perf_counter() - start)
+            entry[name] = latency(timings)
+        results[str(size)] = entry
+        print(f"search {size:>9} chunks: " + '  '.join(
+            f"{name} p50 {entry[name]['p50_ms']:.2f} p99 {entry[name]['p99_ms']:.2f} ms" for name in searches))
+    return results
+
+
+def bench_query(args, workdir: str) -> dict:
+    system = rag_system(bench_config(workdir, SEARCH_MODE=args.search_mode, EMBEDDING_STORAGE=args.storage))
+    fill(system.vector_store, args.query_chunks)
+    queries = sample_queries(args.queries, seed=2)
+
+    system.query(queries[0])
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        response = system.query(query)
+        timings.append(time.perf_counter() - start)
+        if response.get('error'):
+            raise RuntimeError(f"Query failed: {response['answer']}")
+    result = dict(latency(timings), chunks=args.query_chunks)
+    print(f"query  {args.query_chunks:>9} chunks: p50 {result['p50_ms']:.2f} p99 {result['p99_ms']:.2f} ms "
+          f"(LLM stubbed, no latency)")
+    return result
+
+
+def environment() -> dict:
+    def git(*command):
+        try:
+            return subprocess.run(['git', *command], cwd=ROOT, capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        'commit': git('rev-parse', 'HEAD'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def flatten(results: dict, prefix: str = '') -> dict:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(baseline_path: str, current_path: str, threshold: float) -> int:
+    """Print each metric's change between two result files; 1 if any got worse by more than threshold"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+    old, new = flatten(baseline['results']), flatten(current['results'])
+
+    regressions = 0
+    print(f"{baseline['environment']['commit'] or baseline_path} -> {current['environment']['commit'] or current_path}")
+    for name in sorted(old.keys() & new.keys()):
+        if not name.endswith(('_ms', '_per_sec', 'seconds')) or not old[name]:
+            continue
+        change = new[name] / old[name] - 1
+        worse = -change if name.endswith('_per_sec') else change
+        flag = '  REGRESSION' if worse > threshold else ''
+        regressions += bool(flag)
+        print(f"{name:<45} {old[name]:>12.3f} {new[name]:>12.3f} {change:>+8.1%}{flag}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, search and end-to-end queries")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--suites', nargs='+', default=['ingestion', 'search', 'query'],
+                        choices=['ingestion', 'search', 'query'])
+    parser.add_argument('--pages', type=int, nargs='+', default=[10, 50])
+    parser.add_argument('--tables-per-page', type=int, default=1)
+    parser.add_argument('--images-per-page', type=int, default=1)
+    parser.add_argument('--pdf-workers', type=int, default=Config.PDF_WORKERS)
+    parser.add_argument('--repeat', type=int, default=3, help="ingestion runs per PDF; the fastest counts")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000],
+                        help="corpus sizes for the search suite, e.g. add 1000000")
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=Config.TOP_K_RESULTS)
+    parser.add_argument('--query-chunks', type=int, default=10_000, help="corpus size for the query suite")
+    parser.add_argument('--search-mode', default=Config.SEARCH_MODE, choices=['exact', 'ivf'])
+    parser.add_argument('--storage', default=Config.EMBEDDING_STORAGE, choices=['float32', 'float16', 'int8'])
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help="compare two result files instead of running")
+    parser.add_argument('--threshold', type=float, default=0.10, help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.threshold))
+
+    logging.disable(logging.WARNING)  # per-page and per-query logging would dominate the timings
+    suites = {'ingestion': bench_ingestion, 'search': bench_search, 'query': bench_query}
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='rag_bench_') as workdir:
+        for name in args.suites:
+            results[name] = suites[name](args, workdir)
+
+    parameters = {key: value for key, value in vars(args).items() if key not in ('output', 'compare', 'threshold')}
+    with open(args.output, 'w') as f:
+        json.dump({'environment': environment(), 'parameters': parameters, 'results': results}, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
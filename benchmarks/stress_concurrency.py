@@ -0,0 +1,153 @@
+# benchmarks/stress_concurrency.py - Parallel searches while documents are added and deleted
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.config import Config
+from src.simple_vector_store import SimpleVectorStore
+from benchmarks.bench_ann_recall import synthetic_texts
+
+
+class ErrorCounter(logging.Handler):
+    """Searches log and swallow their exceptions; count them instead"""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def make_chunks(document: str, texts):
+    # The text names its document and page so every result can be checked against its metadata
+    return [SimpleNamespace(content=f"{document} page{page} {text}", chunk_type='table' if page % 5 == 0 else 'text',
+                            page_number=page) for page, text in enumerate(texts, 1)]
+
+
+def check(result, n_results, filters, expect_full):
+    """Problems with one result set, or an empty list"""
+    problems = []
+    lengths = {len(result[key]) for key in ('ids', 'documents', 'metadatas', 'distances')}
+    if len(lengths) != 1:
+        return [f"columns of different lengths {lengths}"]
+    if expect_full and len(result['ids']) != n_results:
+        problems.append(f"{len(result['ids'])} results, expected {n_results}")
+    for content, metadata in zip(result['documents'], result['metadatas']):
+        if not content.startswith(f"{metadata['document_name']} page{metadata['page_number']} "):
+            problems.append(f"record/metadata mismatch: {content[:30]!r} vs {metadata}")
+        if filters and 'document_name' in filters and metadata['document_name'] != filters['document_name']:
+            problems.append(f"filtered on {filters['document_name']}, got {metadata['document_name']}")
+        if filters and 'page_range' in filters and not (
+                filters['page_range'][0] <= metadata['page_number'] <= filters['page_range'][1]):
+            problems.append(f"page {metadata['page_number']} outside {filters['page_range']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress the vector store with concurrent searches and writes")
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--chunks-per-document', type=int, default=200)
+    parser.add_argument('--seed-documents', type=int, default=20)
+    parser.add_argument('--search-mode', default='exact', choices=['exact', 'ivf'])
+    parser.add_argument('--storage', default='float32', choices=['float32', 'float16', 'int8'])
+    parser.add_argument('--persist', action='store_true', help="use memory-mapped segments in a temporary directory")
+    args = parser.parse_args()
+
+    config = Config()
+    config.PERSIST_VECTOR_STORE = args.persist
+    config.VECTOR_STORE_PATH = tempfile.mkdtemp(prefix='stress_store_')
+    config.SEGMENT_MAX_CHUNKS = 2_000  # roll segments over during the run
+    config.SEARCH_MODE = args.search_mode
+    config.IVF_NLIST = 32
+    config.EMBEDDING_STORAGE = args.storage
+    config.QUERY_CACHE_SIZE = 0  # every search goes to the store
+    store = SimpleVectorStore(config)
+
+    errors = ErrorCounter()
+    logging.getLogger('src.simple_vector_store').addHandler(errors)
+
+    texts = synthetic_texts(args.chunks_per_document * 4, seed=0)
+    seeded = [f"seed{d}" for d in range(args.seed_documents)]
+    for document in seeded:
+        store.add_documents(make_chunks(document, random.sample(texts, args.chunks_per_document)), document)
+
+    stop = threading.Event()
+    writing = threading.Event()
+    problems, lock = [], threading.Lock()
+    stats = {'reads': [], 'reads_during_writes': [], 'documents_added': 0, 'documents_deleted': 0}
+
+    def reader(seed):
+        rng = random.Random(seed)
+        n_results = 5
+        while not stop.is_set():
+            kind = rng.choice(['search', 'search', 'batch', 'keyword'])
+            filters = rng.choice([None, {'document_name': rng.choice(seeded)}, {'page_range': [10, 40]}])
+            query = ' '.join(rng.choice(texts).split()[:8])
+            start = time.perf_counter()
+            if kind == 'search':
+                results = [store.search(query, n_results, filters)]
+            elif kind == 'batch':
+                results = store.search_batch([query, query + ' w1', query + ' w2'], n_results, filters)
+            else:
+                results = [store.keyword_search(query, n_results, filters)]
+            elapsed = time.perf_counter() - start
+            found = [p for result in results
+                     for p in check(result, n_results, filters, expect_full=kind != 'keyword')]
+            with lock:
+                stats['reads_during_writes' if writing.is_set() else 'reads'].append(elapsed)
+                problems.extend(f"{kind}: {p}" for p in found)
+
+    def writer():
+        rng = random.Random(1)
+        added = []
+        while not stop.is_set():
+            document = f"upload{stats['documents_added']}"
+            store.add_documents(make_chunks(document, rng.sample(texts, args.chunks_per_document)), document)
+            added.append(document)
+            stats['documents_added'] += 1
+            if len(added) > 3:
+                store.delete_document(added.pop(0))
+                stats['documents_deleted'] += 1
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+    for thread in threads:
+        thread.start()
+
+    # Half the run reads only, the other half reads while a writer adds and deletes documents
+    time.sleep(args.seconds / 2)
+    writing.set()
+    write_thread = threading.Thread(target=writer)
+    write_thread.start()
+    time.sleep(args.seconds / 2)
+    stop.set()
+    for thread in threads + [write_thread]:
+        thread.join()
+
+    print(f"mode={args.search_mode} storage={args.storage} persist={args.persist} readers={args.readers}")
+    for name in ('reads', 'reads_during_writes'):
+        timings = np.array(stats[name]) * 1000
+        if len(timings):
+            print(f"{name:>20}: {len(timings) / (args.seconds / 2):8.0f}/s  p50 {np.percentile(timings, 50):6.2f} ms  "
+                  f"p99 {np.percentile(timings, 99):6.2f} ms")
+    print(f"documents added {stats['documents_added']}, deleted {stats['documents_deleted']}, "
+          f"store version {store.version}, {store.count} rows")
+    print(f"inconsistent results: {len(problems)}, logged errors: {len(errors.messages)}")
+    for message in (problems + errors.messages)[:10]:
+        print(f"  {message}")
+    sys.exit(1 if problems or errors.messages else 0)
+
+
+if __name__ == '__main__':
+    main()
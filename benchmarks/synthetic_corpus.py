@@ -0,0 +1,107 @@
+# benchmarks/synthetic_corpus.py - Deterministic synthetic PDFs and chunks for the benchmarks
+import argparse
+import io
+import os
+import sys
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.pdf_processor import DocumentChunk
+from benchmarks.bench_ann_recall import synthetic_texts
+
+CHUNK_TYPES = ('text', 'table', 'image')
+CHUNK_TYPE_WEIGHTS = (0.8, 0.15, 0.05)
+
+
+def make_pdf(path: str, pages: int, tables_per_page: int = 1, images_per_page: int = 1,
+             words_per_page: int = 400, seed: int = 0) -> str:
+    """Write a PDF whose pages each hold paragraphs of text, ruled tables and images of rendered text
+
+    Tables are drawn with cell borders so pdfplumber detects them; images contain
+    printed words so OCR has something to read. The same arguments give the same bytes.
+    """
+    import fitz
+    from PIL import Image, ImageDraw
+
+    rng = np.random.default_rng(seed)
+    paragraphs = synthetic_texts(pages * 4, vocab_size=5_000, words=words_per_page // 4, seed=seed)
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page(width=595, height=842)  # A4 in points
+        y = 50
+        text = '\n\n'.join(paragraphs[page_num * 4:page_num * 4 + 4])
+        page.insert_textbox(fitz.Rect(50, y, 545, 420), text, fontsize=8)
+        y = 430
+
+        for table in range(tables_per_page):
+            rows, columns, cell_w, cell_h = 5, 4, 110, 16
+            for r in range(rows):
+                for c in range(columns):
+                    cell = fitz.Rect(50 + c * cell_w, y + r * cell_h, 50 + (c + 1) * cell_w, y + (r + 1) * cell_h)
+                    page.draw_rect(cell, color=(0, 0, 0), width=0.5)
+                    label = f"col{c}" if r == 0 else f"{rng.integers(0, 10_000)}"
+                    page.insert_text((cell.x0 + 3, cell.y1 - 4), f"p{page_num}t{table}{label}", fontsize=7)
+            y += rows * cell_h + 15
+            if y > 700:
+                break
+
+        for image in range(images_per_page):
+            picture = Image.new('RGB', (400, 120), 'white')
+            draw = ImageDraw.Draw(picture)
+            words = synthetic_texts(1, vocab_size=5_000, words=18, seed=seed + page_num * 31 + image)[0].split()
+            for line in range(3):
+                draw.text((10, 10 + line * 35), ' '.join(words[line * 6:line * 6 + 6]), fill='black')
+            buffer = io.BytesIO()
+            picture.save(buffer, format='PNG')
+            x = 50 + (image % 2) * 250
+            page.insert_image(fitz.Rect(x, 720, x + 240, 790), stream=buffer.getvalue())
+
+    doc.save(path, deflate=True)
+    doc.close()
+    return path
+
+
+def synthetic_chunks(n: int, batch_size: int = 5_000, documents: int = 100,
+                     seed: int = 0) -> Iterator[Tuple[str, List[DocumentChunk]]]:
+    """(document name, chunks) batches totalling n chunks, generated a batch at a time
+
+    Memory stays at one batch however large n is, so the store can be filled with millions of chunks.
+    """
+    rng = np.random.default_rng(seed)
+    for batch, start in enumerate(range(0, n, batch_size)):
+        count = min(batch_size, n - start)
+        texts = synthetic_texts(count, seed=seed + batch + 1)
+        types = rng.choice(len(CHUNK_TYPES), size=count, p=CHUNK_TYPE_WEIGHTS)
+        pages = rng.integers(1, 200, size=count)
+        chunks = [DocumentChunk(content=text, chunk_type=CHUNK_TYPES[t], page_number=int(page), metadata={})
+                  for text, t, page in zip(texts, types, pages)]
+        yield f"synthetic{batch % documents}", chunks
+
+
+def sample_queries(n: int, words: int = 8, seed: int = 1) -> List[str]:
+    """Short word samples from chunks generated like synthetic_chunks' first batch"""
+    rng = np.random.default_rng(seed)
+    texts = synthetic_texts(max(n, 1_000), seed=seed)
+    return [' '.join(rng.choice(texts[i].split(), words)) for i in rng.integers(0, len(texts), n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic PDFs with text, tables and images")
+    parser.add_argument('output_dir')
+    parser.add_argument('--pages', type=int, nargs='+', default=[10, 50])
+    parser.add_argument('--tables-per-page', type=int, default=1)
+    parser.add_argument('--images-per-page', type=int, default=1)
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for pages in args.pages:
+        path = make_pdf(os.path.join(args.output_dir, f"synthetic_{pages}p.pdf"), pages,
+                        args.tables_per_page, args.images_per_page, seed=pages)
+        print(f"{path}: {os.path.getsize(path) / 1024:.0f} KiB")
+
+
+if __name__ == '__main__':
+    main()
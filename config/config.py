@@ -7,7 +7,10 @@ load_dotenv()
 
 class Config:
     # API Keys
+    SECRET_KEY = os.getenv("FLASK_SECRET_KEY")  # signs session cookies; set it when several processes serve the app
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+    GROQ_BASE_URL = os.getenv("GROQ_BASE_URL")  # None uses the Groq API
+    LLM_CONCURRENCY = 4  # parallel LLM calls made by RAGSystem.query_batch
 
     # Model Configuration
     EMBEDDING_MODEL = "all-MiniLM-L6-v2"
@@ -17,14 +20,63 @@ class Config:
     VECTOR_DB_PATH = "./data/chroma_db"
     COLLECTION_NAME = "pdf_documents"
 
+    # Vector Store (memory-mapped segments on disk; set False to keep the index in memory only)
+    PERSIST_VECTOR_STORE = True
+    VECTOR_STORE_PATH = "./data/vector_store"
+    SEGMENT_MAX_CHUNKS = 100_000
+    # "standalone" gives each process its own read-write index; with "shared", the processes serving one
+    # VECTOR_STORE_PATH (e.g. gunicorn workers) elect a single writer and the others map its snapshots read-only
+    INDEX_ROLE = os.getenv("INDEX_ROLE", "standalone")
+    INDEX_REFRESH_SECONDS = 1.0  # how often a read-only process looks for changes on disk
+
     # PDF Processing
     CHUNK_SIZE = 1000
     CHUNK_OVERLAP = 200
+    # Prompt tokens given to retrieved context (estimated at ~4 characters per token). A full CHUNK_SIZE
+    # chunk of 1000 words takes ~1500 for prose and up to ~2000 for technical text, so this fits all
+    # TOP_K_RESULTS chunks plus their source headers; lower it to stay under a provider's token rate
+    # limit, at the cost of dropping the lowest-ranked chunks
+    CONTEXT_TOKEN_BUDGET = 10000
     MAX_IMAGE_SIZE = (800, 600)
+    PDF_WORKERS = os.cpu_count() or 1  # processes for page extraction; 1 disables the pool
+    PDF_PARALLEL_MIN_PAGES = 8  # smaller PDFs are not worth the pool start-up cost
+    PDF_ENGINE = "dual"  # "pymupdf" reads text, tables and images in one PyMuPDF pass per page, without pdfplumber
+    OCR_CACHE_PATH = "./data/processed/ocr_cache.sqlite3"  # None disables the persistent OCR cache
+    OCR_CACHE_MAX_ENTRIES = 50_000
+    INGEST_BATCH_SIZE = 256  # chunks embedded and stored together while a PDF streams in
+    INGEST_WORKERS = 1  # background threads running upload jobs
+    INGEST_QUEUE_SIZE = 16  # queued uploads beyond this are rejected with 503
+    INGEST_JOBS_DB_PATH = "./data/ingest_jobs.sqlite3"  # upload queue shared by the processes with INDEX_ROLE "shared"
+    INGEST_PROFILE_DIR = None  # directory for per-document ingestion profiles (JSON); None only returns them
 
     # Retrieval
     TOP_K_RESULTS = 5
     SIMILARITY_THRESHOLD = 0.7
+    SEARCH_MODE = "exact"  # "exact" scans every chunk, "ivf" probes an approximate index
+    IVF_NLIST = 256
+    IVF_NPROBE = 16
+    QUERY_CACHE_SIZE = 4096  # cached query embeddings and result sets; 0 disables
+    RETRIEVAL_MODE = "hybrid"  # "hybrid" fuses BM25 keyword and vector results, "vector" uses vectors only
+    BM25_K1 = 1.2
+    BM25_B = 0.75
+    RRF_K = 60  # reciprocal rank fusion damping constant
+    EMBEDDING_STORAGE = "float32"  # "float16" or "int8" scan a compact copy and rescore the best candidates exactly
+    RESCORE_FACTOR = 4  # candidates rescored per requested result with compact storage
+
+    WARM_UP_ON_START = True  # app_flask loads the store, indexes and LLM client in the background at start-up
+
+    # Answer cache (set ANSWER_CACHE_MAX_ENTRIES = 0 to disable)
+    ANSWER_CACHE_MAX_ENTRIES = 1024
+    ANSWER_CACHE_MAX_BYTES = 16 * 1024 * 1024
+    ANSWER_CACHE_TTL_SECONDS = 3600
+
+    # Conversation history per browser session
+    CONVERSATION_BACKEND = "memory"  # "sqlite" keeps history across restarts and worker processes
+    CONVERSATION_DB_PATH = "./data/conversations.sqlite3"
+    CONVERSATION_MAX_TURNS = 20  # question/answer pairs kept per session
+    CONVERSATION_MAX_SESSIONS = 10_000
+    CONVERSATION_TTL_SECONDS = 24 * 3600  # idle sessions are dropped after this
+    CONVERSATION_MAX_BYTES = 64 * 1024 * 1024  # least recently used sessions are evicted beyond this
 
     # Paths
     PDF_UPLOAD_DIR = "./data/pdfs"
@@ -9,6 +9,7 @@ def create_directories():
         "data/pdfs",
         "data/processed",
         "data/chroma_db",
+        "data/vector_store",
         "src",
         "config"
     ]
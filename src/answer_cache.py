@@ -0,0 +1,131 @@
+# src/answer_cache.py
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Iterable, Optional
+
+
+class AnswerCache:
+    """LRU cache of generated answers with a TTL and a memory budget
+
+    Entries are keyed on the normalized question, the ids of the chunks used as context,
+    the conversation context and the generation settings, and remember which documents
+    supplied those chunks so re-ingesting a document drops every answer built from it.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 16 * 1024 * 1024, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.logger = logging.getLogger(__name__)
+
+        # key -> (expires_at, size, documents, response)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._keys_by_document: Dict[str, set] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        """Case- and whitespace-insensitive form of a question, ignoring trailing punctuation"""
+        return re.sub(r'\s+', ' ', question.casefold()).strip(' ?!.')
+
+    def make_key(self, question: str, chunk_ids: Iterable[int], conversation_context: str,
+                 settings: Dict[str, Any]) -> str:
+        # Chunk ids in rank order: the packer keeps that order (and drops from the tail), so a
+        # different order is a different prompt
+        payload = json.dumps([self.normalize_question(question), [int(i) for i in chunk_ids],
+                              conversation_context, settings], sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """A copy of the cached response, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[3])
+
+    def put(self, key: str, response: Dict[str, Any], documents: List[str]):
+        """Cache a response built from chunks of the given documents"""
+        if not self.enabled:
+            return
+        size = len(key) + len(json.dumps(response, default=str).encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            documents = set(documents)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, size, documents, dict(response))
+            self._bytes += size
+            for document in documents:
+                self._keys_by_document.setdefault(document, set()).add(key)
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_document(self, document_name: str) -> int:
+        """Drop every answer that used a chunk of the document; returns how many were dropped"""
+        with self._lock:
+            keys = self._keys_by_document.pop(document_name, set())
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+        if keys:
+            self.logger.info(f"Invalidated {len(keys)} cached answers for {document_name}")
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_document.clear()
+            self._bytes = 0
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry[1]
+        for document in entry[2]:
+            keys = self._keys_by_document.get(document)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_document[document]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
@@ -0,0 +1,368 @@
+# src/bm25_index.py
+import os
+import re
+import json
+import bisect
+import shutil
+import logging
+import threading
+from collections import Counter
+from typing import List, Dict, Tuple, Optional
+
+import numpy as np
+
+# Keeps part numbers, clause ids and versions ("PN-4821-X", "4.2.1", "v2.0") as single terms
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-./_][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def _grow(array: np.ndarray, size: int) -> np.ndarray:
+    """Array with room for at least `size` entries, doubling capacity; new entries are zero"""
+    if size <= len(array):
+        return array
+    grown = np.zeros(max(size, 2 * len(array)), dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class SortedTerms:
+    """Read-only term -> id lookup over a sorted term list, e.g. memory-mapped from a saved index
+
+    The terms are concatenated in `blob` with term i at blob[offsets[i]:offsets[i + 1]];
+    a term's id is its position in the sorted order.
+    """
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def _term(self, i: int) -> bytes:
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]])
+
+    def get(self, term: str, default: Optional[int] = None) -> Optional[int]:
+        key = term.encode('utf-8')
+        i = bisect.bisect_left(range(len(self)), key, key=self._term)
+        return i if i < len(self) and self._term(i) == key else default
+
+    def __contains__(self, term: str) -> bool:
+        return self.get(term) is not None
+
+    def __getitem__(self, term: str) -> int:
+        i = self.get(term)
+        if i is None:
+            raise KeyError(term)
+        return i
+
+
+class BM25Index:
+    """Okapi BM25 over an inverted index with array-backed postings
+
+    Postings live in one CSR block (term t's rows are ids[offsets[t]:offsets[t + 1]],
+    ascending) plus a tail of postings added since the last query, which is merged
+    in on the next search. Search is MaxScore-style: terms are scored from the highest
+    upper bound down, and once the remaining terms cannot lift an unseen row into the
+    top k their postings are only probed for the current candidates.
+
+    add() and the merge at the start of a search hold a short lock; scoring works on the
+    arrays taken under it, which later merges replace instead of modifying.
+
+    An index can cover rows from first_row on only, e.g. one segment of a store; save()
+    writes it to a directory that load() memory-maps read-only, and search_all() scores
+    several such indexes over disjoint rows as one corpus.
+    """
+
+    # Arrays of a saved index, one .npy file each
+    SAVED_ARRAYS = ('offsets', 'ids', 'tfs', 'max_tf', 'min_length', 'lengths', 'terms', 'term_offsets')
+    META_FILE = 'meta.json'
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, first_row: int = 0):
+        self.k1 = k1
+        self.b = b
+        self.first_row = first_row
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+
+        self.vocabulary: Dict[str, int] = {}
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._tfs = np.empty(0, dtype=np.int32)
+
+        self._pending_terms = []
+        self._pending_ids = []
+        self._pending_tfs = []
+
+        # Per-term bounds for the MaxScore upper bounds, per-row lengths by row id - first_row
+        self._max_tf = np.zeros(0, dtype=np.int32)
+        self._min_length = np.zeros(0, dtype=np.int32)
+        self._lengths = np.zeros(0, dtype=np.int32)
+        self._length_sum = 0
+        self.doc_count = 0
+
+        # Work done by searches, to see how much the early termination saves
+        self.postings_scanned = 0
+        self.postings_skipped = 0
+
+    def __len__(self) -> int:
+        return self.doc_count
+
+    def add(self, texts: List[str], ids: np.ndarray):
+        """Index texts under row ids, which must be larger than every id added before"""
+        # Tokenize outside the lock; only the vocabulary and array updates below hold it
+        documents = [Counter(tokenize(text)) for text in texts]
+        if not len(ids):
+            return
+        with self._lock:
+            self._add(documents, ids)
+
+    def _add(self, documents: List[Counter], ids: np.ndarray):
+        terms, rows, tfs, lengths = [], [], [], []
+        for counts, row in zip(documents, ids):
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                terms.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                rows.append(row)
+                tfs.append(tf)
+
+        ids = np.asarray(ids, dtype=np.int64)
+        terms = np.array(terms, dtype=np.int64)
+        rows = np.array(rows, dtype=np.int64)
+        tfs = np.array(tfs, dtype=np.int32)
+        lengths = np.array(lengths, dtype=np.int32)
+
+        self._lengths = _grow(self._lengths, int(ids[-1]) - self.first_row + 1)
+        self._lengths[ids - self.first_row] = lengths
+        self._length_sum += int(lengths.sum())
+        self.doc_count += len(ids)
+
+        vocabulary_size = len(self.vocabulary)
+        new_terms = vocabulary_size - len(self._max_tf)
+        self._max_tf = _grow(self._max_tf, vocabulary_size)
+        self._min_length = _grow(self._min_length, vocabulary_size)
+        if new_terms > 0:
+            self._min_length[vocabulary_size - new_terms:] = np.iinfo(np.int32).max
+        np.maximum.at(self._max_tf, terms, tfs)
+        np.minimum.at(self._min_length, terms, self._lengths[rows - self.first_row])
+
+        self._pending_terms.append(terms)
+        self._pending_ids.append(rows)
+        self._pending_tfs.append(tfs)
+
+    def _merge(self):
+        """Fold the pending postings into the CSR block, keeping each list sorted by row id"""
+        if not self._pending_terms:
+            return
+        terms = np.concatenate(self._pending_terms)
+        order = np.argsort(terms, kind='stable')
+        terms = terms[order]
+        ids = np.concatenate(self._pending_ids)[order]
+        tfs = np.concatenate(self._pending_tfs)[order]
+        self._pending_terms, self._pending_ids, self._pending_tfs = [], [], []
+
+        vocabulary_size = len(self.vocabulary)
+        old_counts = np.zeros(vocabulary_size, dtype=np.int64)
+        old_counts[:len(self._offsets) - 1] = np.diff(self._offsets)
+        new_counts = np.bincount(terms, minlength=vocabulary_size)
+        offsets = np.zeros(vocabulary_size + 1, dtype=np.int64)
+        np.cumsum(old_counts + new_counts, out=offsets[1:])
+
+        merged_ids = np.empty(offsets[-1], dtype=np.int64)
+        merged_tfs = np.empty(offsets[-1], dtype=np.int32)
+
+        # Existing postings shift right by the postings of all earlier terms that grew
+        old_terms = np.repeat(np.arange(vocabulary_size), old_counts)
+        old_starts = np.zeros(vocabulary_size, dtype=np.int64)
+        old_starts[:len(self._offsets) - 1] = self._offsets[:-1]
+        positions = np.arange(len(old_terms)) + (offsets[:-1] - old_starts)[old_terms]
+        merged_ids[positions] = self._ids
+        merged_tfs[positions] = self._tfs
+
+        # New postings go after the existing ones of their term; their ids are all larger
+        new_starts = np.zeros(vocabulary_size, dtype=np.int64)
+        np.cumsum(new_counts[:-1], out=new_starts[1:])
+        positions = offsets[:-1][terms] + old_counts[terms] + (np.arange(len(terms)) - new_starts[terms])
+        merged_ids[positions] = ids
+        merged_tfs[positions] = tfs
+
+        self._offsets, self._ids, self._tfs = offsets, merged_ids, merged_tfs
+
+    def save(self, path: str):
+        """Write the index to a new directory for load(), terms in sorted order"""
+        with self._lock:
+            self._merge()
+            names = sorted(self.vocabulary)
+            order = np.array([self.vocabulary[term] for term in names], dtype=np.int64)
+            counts = np.diff(self._offsets)[order]
+            offsets = np.zeros(len(names) + 1, dtype=np.int64)
+            np.cumsum(counts, out=offsets[1:])
+            # Each term's postings move from its old start to its new one
+            positions = np.repeat(self._offsets[:-1][order] - offsets[:-1], counts) + np.arange(offsets[-1])
+            encoded = [term.encode('utf-8') for term in names]
+            term_offsets = np.zeros(len(names) + 1, dtype=np.int64)
+            np.cumsum(np.array([len(term) for term in encoded], dtype=np.int64), out=term_offsets[1:])
+            arrays = {
+                'offsets': offsets,
+                'ids': self._ids[positions],
+                'tfs': self._tfs[positions],
+                'max_tf': self._max_tf[order],
+                'min_length': self._min_length[order],
+                'lengths': self._lengths,
+                'terms': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+                'term_offsets': term_offsets
+            }
+            meta = {'first_row': self.first_row, 'doc_count': self.doc_count, 'length_sum': self._length_sum}
+
+        # Written aside and renamed, so a directory at path is always complete
+        tmp_path = path + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name, values in arrays.items():
+            with open(os.path.join(tmp_path, f"{name}.npy"), 'wb') as f:
+                np.save(f, values)
+                f.flush()
+                os.fsync(f.fileno())
+        with open(os.path.join(tmp_path, self.META_FILE), 'w') as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, k1: float = 1.2, b: float = 0.75) -> 'BM25Index':
+        """Memory-map an index written by save(); it can be searched but not added to"""
+        with open(os.path.join(path, cls.META_FILE)) as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in cls.SAVED_ARRAYS}
+        index = cls(k1, b, meta['first_row'])
+        index.vocabulary = SortedTerms(arrays['terms'], arrays['term_offsets'])
+        index._offsets, index._ids, index._tfs = arrays['offsets'], arrays['ids'], arrays['tfs']
+        index._max_tf, index._min_length, index._lengths = arrays['max_tf'], arrays['min_length'], arrays['lengths']
+        index.doc_count, index._length_sum = meta['doc_count'], meta['length_sum']
+        return index
+
+    def _term_scores(self, postings: Tuple[np.ndarray, ...], term: int, idf: float,
+                     avg_length: float, rows: int = None) -> Tuple[np.ndarray, np.ndarray]:
+        offsets, all_ids, all_tfs, lengths = postings
+        start, end = offsets[term], offsets[term + 1]
+        ids = all_ids[start:end]
+        if rows is not None:
+            end = start + np.searchsorted(ids, rows)
+            ids = all_ids[start:end]
+        tfs = all_tfs[start:end].astype(np.float32)
+        norm = self.k1 * (1 - self.b + self.b * lengths[ids - self.first_row] / avg_length)
+        return ids, idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+    def _term_ids(self, query_terms: List[str]) -> List[Tuple[int, str]]:
+        """(id, term) for the query terms in the vocabulary, by id"""
+        found = ((self.vocabulary.get(term), term) for term in set(query_terms))
+        return sorted((term_id, term) for term_id, term in found if term_id is not None)
+
+    def corpus_stats(self, query: str) -> Tuple[int, int, Counter]:
+        """Row count, summed row length and the document frequency of each query term"""
+        with self._lock:
+            self._merge()
+            offsets = self._offsets
+            frequencies = Counter({term: int(offsets[term_id + 1] - offsets[term_id])
+                                   for term_id, term in self._term_ids(tokenize(query))})
+            return self.doc_count, self._length_sum, frequencies
+
+    def search(self, query: str, k: int, deleted: np.ndarray = None, rows: int = None,
+               corpus: Tuple[int, int, Counter] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Row ids of the k best BM25 matches and their scores, best first
+
+        Rows set in `deleted` are skipped, and with `rows` only ids below it are considered,
+        so a reader can ignore rows added after the snapshot it is working from. corpus,
+        corpus_stats() summed over several indexes, scores the rows as part of all of them.
+        """
+        with self._lock:
+            self._merge()
+            found = self._term_ids(tokenize(query))
+            terms = [term_id for term_id, _ in found]
+            postings = (self._offsets, self._ids, self._tfs, self._lengths)
+            doc_count, length_sum = self.doc_count, self._length_sum
+            max_tf = self._max_tf[terms]
+            min_length = self._min_length[terms]
+        if not terms or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        terms = np.array(terms)
+        offsets = postings[0]
+        if corpus is None:
+            df = offsets[terms + 1] - offsets[terms]
+        else:
+            doc_count, length_sum, frequencies = corpus
+            df = np.array([frequencies[term] for _, term in found])
+        avg_length = length_sum / doc_count
+        idf = np.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+        # No posting of a term can score above its best tf at its shortest row
+        upper = idf * max_tf * (self.k1 + 1) / (
+            max_tf + self.k1 * (1 - self.b + self.b * min_length / avg_length))
+
+        order = np.argsort(-upper)
+        terms, idf, upper = terms[order], idf[order], upper[order]
+        remaining = np.concatenate([np.cumsum(upper[::-1])[::-1][1:], [0.0]])
+
+        candidates = np.empty(0, dtype=np.int64)
+        scores = np.empty(0, dtype=np.float32)
+        for i, term in enumerate(terms):
+            ids, term_scores = self._term_scores(postings, term, idf[i], avg_length, rows)
+            if deleted is not None:
+                live = ~deleted[ids]
+                ids, term_scores = ids[live], term_scores[live]
+            self.postings_scanned += len(ids)
+
+            candidates, inverse = np.unique(np.concatenate([candidates, ids]), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate([scores, term_scores])).astype(np.float32)
+
+            if len(scores) < k or i == len(terms) - 1:
+                continue
+            threshold = -np.partition(-scores, k - 1)[k - 1]
+            if remaining[i] >= threshold:
+                continue
+
+            # No row outside the candidates can reach the top k any more: drop hopeless
+            # candidates and look the rest up in the remaining postings by binary search
+            keep = scores + remaining[i] >= threshold
+            candidates, scores = candidates[keep], scores[keep]
+            for j in range(i + 1, len(terms)):
+                ids, term_scores = self._term_scores(postings, terms[j], idf[j], avg_length, rows)
+                self.postings_skipped += len(ids)
+                if not len(ids):
+                    continue
+                positions = np.minimum(np.searchsorted(ids, candidates), len(ids) - 1)
+                found = ids[positions] == candidates
+                scores[found] += term_scores[positions[found]]
+            break
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return candidates[top], scores[top]
+
+
+def search_all(indexes: List[BM25Index], query: str, k: int, deleted: np.ndarray = None,
+               rows: int = None) -> Tuple[np.ndarray, np.ndarray]:
+    """BM25Index.search() over indexes of disjoint rows as if they were one index
+
+    A row's score depends on its own postings and the corpus statistics only, so with
+    the statistics summed over all indexes the best k overall are among each index's best k.
+    """
+    if len(indexes) == 1:
+        return indexes[0].search(query, k, deleted, rows)
+    doc_count, length_sum, frequencies = 0, 0, Counter()
+    for index in indexes:
+        count, total, index_frequencies = index.corpus_stats(query)
+        doc_count += count
+        length_sum += total
+        frequencies.update(index_frequencies)
+
+    found = [index.search(query, k, deleted, rows, (doc_count, length_sum, frequencies)) for index in indexes]
+    ids = np.concatenate([ids for ids, _ in found])
+    scores = np.concatenate([scores for _, scores in found])
+    top = np.argsort(-scores, kind='stable')[:k]
+    return ids[top], scores[top]
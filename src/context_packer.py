@@ -0,0 +1,116 @@
+# src/context_packer.py
+import math
+from typing import List, Dict, Any, Tuple
+
+TABLE_HEADER = "TABLE DATA:\n"
+CSV_HEADER = "\n\nCSV FORMAT:\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English with BPE tokenizers)"""
+    return math.ceil(len(text) / 4)
+
+
+class ContextPacker:
+    """Fits retrieved chunks into a prompt token budget
+
+    Chunks are taken in rank order. Table chunks keep only their CSV copy, text that
+    repeats the chunking overlap of an already packed neighbour from the same page is cut,
+    and the last chunk that does not fit whole is truncated at a word boundary.
+    """
+
+    # Don't bother packing a truncated chunk into less room than this
+    MIN_TRUNCATED_TOKENS = 50
+
+    def __init__(self, token_budget: int = 10000, chunk_overlap: int = 200):
+        self.token_budget = token_budget
+        self.chunk_overlap = chunk_overlap
+
+    @staticmethod
+    def _source_header(index: int, metadata: Dict[str, Any]) -> str:
+        return f"SOURCE {index} (Page {metadata['page_number']}, Type: {metadata['chunk_type']}):\n"
+
+    @staticmethod
+    def _single_table_representation(content: str) -> str:
+        """The CSV copy of a table chunk, which carries the same data as the padded text table in fewer tokens"""
+        if content.startswith(TABLE_HEADER) and CSV_HEADER in content:
+            return "TABLE (CSV):\n" + content.split(CSV_HEADER, 1)[1].strip()
+        return content
+
+    def _strip_overlap(self, words: List[str], packed: List[Tuple[Dict[str, Any], List[str]]],
+                       metadata: Dict[str, Any]) -> List[str]:
+        """Remove the words this chunk shares with packed chunks that neighbour it on the same page"""
+        for other_metadata, other_words in packed:
+            if (other_metadata['chunk_type'] != 'text'
+                    or other_metadata['document_name'] != metadata['document_name']
+                    or other_metadata['page_number'] != metadata['page_number']):
+                continue
+            overlap = min(self.chunk_overlap, len(words), len(other_words))
+            if overlap == 0:
+                continue
+            if other_words[-overlap:] == words[:overlap]:
+                # This chunk continues the packed one
+                words = words[overlap:]
+            elif words[-overlap:] == other_words[:overlap]:
+                # This chunk precedes the packed one
+                words = words[:-overlap]
+            if not words:
+                break
+        return words
+
+    def pack(self, context_docs: List[Dict[str, Any]]) -> Tuple[str, Dict[str, Any], List[Dict[str, Any]]]:
+        """Context text for the prompt, statistics on what packing saved and the docs it holds"""
+        raw_tokens = sum(estimate_tokens(self._source_header(i, doc['metadata']) + doc['content'])
+                         for i, doc in enumerate(context_docs, 1))
+
+        parts = []
+        packed_docs = []
+        packed = []  # (metadata, words) of text chunks already in the context
+        seen = set()
+        used = 0
+        truncated = 0
+        over_budget = 0
+        for position, doc in enumerate(context_docs):
+            metadata = doc['metadata']
+            content = doc['content']
+            if content in seen:
+                continue
+            seen.add(content)
+
+            if metadata['chunk_type'] == 'table':
+                content = self._single_table_representation(content)
+            elif metadata['chunk_type'] == 'text':
+                words = self._strip_overlap(content.split(), packed, metadata)
+                if not words:
+                    continue
+                packed.append((metadata, content.split()))
+                content = ' '.join(words)
+
+            header = self._source_header(len(parts) + 1, metadata)
+            tokens = estimate_tokens(header + content)
+            if used + tokens > self.token_budget:
+                room = self.token_budget - used - estimate_tokens(header)
+                if room < self.MIN_TRUNCATED_TOKENS:
+                    over_budget = len(context_docs) - position
+                    break
+                # Cut at a word boundary so the chunk fits the remaining budget
+                content = content[:room * 4].rsplit(' ', 1)[0] + " ..."
+                tokens = estimate_tokens(header + content)
+                truncated += 1
+            parts.append(header + content)
+            packed_docs.append(doc)
+            used += tokens
+            if truncated:
+                over_budget = len(context_docs) - position - 1
+                break
+
+        context = "\n\n".join(parts)
+        context_tokens = estimate_tokens(context)
+        return context, {
+            'chunks_retrieved': len(context_docs),
+            'chunks_packed': len(parts),
+            'chunks_truncated': truncated,
+            'chunks_over_budget': over_budget,
+            'context_tokens': context_tokens,
+            'tokens_saved': max(raw_tokens - context_tokens, 0)
+        }, packed_docs
@@ -0,0 +1,231 @@
+# src/conversation_store.py
+import os
+import time
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import List, Dict, Any
+
+
+class ConversationStore(ABC):
+    """Per-session conversation history with bounded growth
+
+    History is the flat list the RAG system takes ([question, answer, question, answer, ...]).
+    Each session keeps its last max_turns question/answer pairs, sessions idle for longer
+    than ttl_seconds are dropped, and the least recently used sessions are evicted once
+    there are more than max_sessions or their turns take more than max_bytes.
+    """
+
+    def __init__(self, max_turns: int = 20, max_sessions: int = 10_000, ttl_seconds: float = 86_400,
+                 max_bytes: int = 64 * 1024 * 1024):
+        self.max_turns = max_turns
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _turn_size(question: str, answer: str) -> int:
+        return len(question.encode('utf-8')) + len(answer.encode('utf-8'))
+
+    @abstractmethod
+    def get(self, session_id: str) -> List[str]:
+        """A copy of the session's history, oldest first; empty for unknown or expired sessions"""
+
+    @abstractmethod
+    def append(self, session_id: str, question: str, answer: str):
+        """Add a question/answer pair to the session, then enforce the limits; a pair larger than max_bytes is not kept"""
+
+    @abstractmethod
+    def clear(self, session_id: str):
+        ...
+
+    @abstractmethod
+    def get_stats(self) -> Dict[str, Any]:
+        ...
+
+
+class MemoryConversationStore(ConversationStore):
+    """Conversations held in process memory; lost on restart"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # session_id -> [last_used, deque of (question, answer, size), bytes], least recently used first
+        self._sessions: "OrderedDict[str, list]" = OrderedDict()
+        self._bytes = 0
+
+    def get(self, session_id: str) -> List[str]:
+        with self._lock:
+            self._expire(time.monotonic())
+            session = self._sessions.get(session_id)
+            if session is None:
+                return []
+            return [text for question, answer, _ in session[1] for text in (question, answer)]
+
+    def append(self, session_id: str, question: str, answer: str):
+        size = self._turn_size(question, answer)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            now = time.monotonic()
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = [now, deque(), 0]
+            session[0] = now
+            self._sessions.move_to_end(session_id)
+
+            session[1].append((question, answer, size))
+            session[2] += size
+            self._bytes += size
+            while len(session[1]) > self.max_turns:
+                removed = session[1].popleft()[2]
+                session[2] -= removed
+                self._bytes -= removed
+
+            self._expire(now)
+            while self._sessions and (len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+                self._bytes -= self._sessions.popitem(last=False)[1][2]
+                self.evictions += 1
+
+    def clear(self, session_id: str):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                self._bytes -= session[2]
+
+    def _expire(self, now: float):
+        """Drop sessions idle for longer than the TTL; they sit at the front of the LRU order"""
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session[0] <= self.ttl_seconds:
+                break
+            del self._sessions[session_id]
+            self._bytes -= session[2]
+            self.expirations += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'sessions': len(self._sessions),
+                'bytes': self._bytes,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+
+class SQLiteConversationStore(ConversationStore):
+    """Conversations in a SQLite database, so they survive restarts and are shared by worker processes"""
+
+    def __init__(self, path: str, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.path = path
+
+        # Opened on first use so forked worker processes never share a connection
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, last_used REAL NOT NULL, bytes INTEGER NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_used ON sessions(last_used)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS turns ("
+                "session_id TEXT NOT NULL, seq INTEGER NOT NULL, question TEXT NOT NULL, "
+                "answer TEXT NOT NULL, size INTEGER NOT NULL, PRIMARY KEY (session_id, seq))"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, session_id: str) -> List[str]:
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT last_used FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None or time.time() - row[0] > self.ttl_seconds:
+                return []
+            turns = conn.execute("SELECT question, answer FROM turns WHERE session_id = ? ORDER BY seq",
+                                 (session_id,)).fetchall()
+            return [text for turn in turns for text in turn]
+
+    def append(self, session_id: str, question: str, answer: str):
+        size = self._turn_size(question, answer)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            conn = self._connect()
+            now = time.time()
+            with conn:
+                seq = conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM turns WHERE session_id = ?",
+                                   (session_id,)).fetchone()[0]
+                conn.execute("INSERT INTO turns (session_id, seq, question, answer, size) VALUES (?, ?, ?, ?, ?)",
+                             (session_id, seq, question, answer, size))
+                conn.execute("DELETE FROM turns WHERE session_id = ? AND seq <= ?", (session_id, seq - self.max_turns))
+                conn.execute("INSERT OR REPLACE INTO sessions (session_id, last_used, bytes) "
+                             "SELECT ?, ?, COALESCE(SUM(size), 0) FROM turns WHERE session_id = ?",
+                             (session_id, now, session_id))
+                self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        expired = [row[0] for row in conn.execute("SELECT session_id FROM sessions WHERE last_used < ?",
+                                                  (now - self.ttl_seconds,))]
+        self._delete_sessions(conn, expired)
+        self.expirations += len(expired)
+
+        sessions, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM sessions").fetchone()
+        victims = []
+        if sessions > self.max_sessions or total > self.max_bytes:
+            for session_id, size in conn.execute("SELECT session_id, bytes FROM sessions ORDER BY last_used"):
+                if sessions <= self.max_sessions and total <= self.max_bytes:
+                    break
+                victims.append(session_id)
+                sessions -= 1
+                total -= size
+        self._delete_sessions(conn, victims)
+        self.evictions += len(victims)
+
+    @staticmethod
+    def _delete_sessions(conn: sqlite3.Connection, session_ids: List[str]):
+        conn.executemany("DELETE FROM turns WHERE session_id = ?", [(s,) for s in session_ids])
+        conn.executemany("DELETE FROM sessions WHERE session_id = ?", [(s,) for s in session_ids])
+
+    def clear(self, session_id: str):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                self._delete_sessions(conn, [session_id])
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions, total = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM sessions").fetchone()
+            return {
+                'backend': 'sqlite',
+                'sessions': sessions,
+                'bytes': total,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+
+def create_conversation_store(config) -> ConversationStore:
+    """The conversation store selected by config.CONVERSATION_BACKEND"""
+    limits = dict(max_turns=config.CONVERSATION_MAX_TURNS, max_sessions=config.CONVERSATION_MAX_SESSIONS,
+                  ttl_seconds=config.CONVERSATION_TTL_SECONDS, max_bytes=config.CONVERSATION_MAX_BYTES)
+    if config.CONVERSATION_BACKEND == 'memory':
+        return MemoryConversationStore(**limits)
+    if config.CONVERSATION_BACKEND == 'sqlite':
+        return SQLiteConversationStore(config.CONVERSATION_DB_PATH, **limits)
+    raise ValueError(f"Unknown CONVERSATION_BACKEND: {config.CONVERSATION_BACKEND}")
@@ -0,0 +1,54 @@
+# src/document_registry.py
+import os
+import json
+import logging
+import threading
+from typing import List, Dict, Any, Optional
+
+
+class DocumentRegistry:
+    """Content hashes of indexed documents and their pages, used to skip work on re-upload"""
+
+    REGISTRY_FILE = 'documents.json'
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.logger = logging.getLogger(__name__)
+        self._documents: Dict[str, Dict[str, Any]] = {}
+        # Ingestion workers record documents concurrently; guards the maps and the file rewrite
+        self._lock = threading.Lock()
+
+        if path is not None and os.path.exists(self._file()):
+            with open(self._file()) as f:
+                self._documents = json.load(f)
+        self._by_file_hash = {entry['file_hash']: name for name, entry in self._documents.items()}
+
+    def _file(self) -> str:
+        return os.path.join(self.path, self.REGISTRY_FILE)
+
+    def find_by_file_hash(self, file_hash: str) -> Optional[str]:
+        """Name of the document already indexed from identical bytes, if any"""
+        return self._by_file_hash.get(file_hash)
+
+    def get(self, document_name: str) -> Optional[Dict[str, Any]]:
+        return self._documents.get(document_name)
+
+    def put(self, document_name: str, file_hash: str, page_hashes: List[str]):
+        """Record the indexed revision of a document"""
+        with self._lock:
+            previous = self._documents.get(document_name)
+            if previous is not None:
+                self._by_file_hash.pop(previous['file_hash'], None)
+            self._documents[document_name] = {'file_hash': file_hash, 'page_hashes': page_hashes}
+            self._by_file_hash[file_hash] = document_name
+            self._save()
+
+    def _save(self):
+        """Rewrite the registry file atomically; the caller holds the lock"""
+        if self.path is None:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = self._file() + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._documents, f)
+        os.replace(tmp_path, self._file())
@@ -0,0 +1,57 @@
+# src/hash_embedder.py
+import zlib
+from typing import List
+
+import numpy as np
+
+
+class HashEmbedder:
+    """Deterministic hashing-trick embedder that embeds whole batches of text with NumPy"""
+
+    def __init__(self, dim: int = 384, max_words: int = 100, cache_size: int = 500_000):
+        self.dim = dim
+        self.max_words = max_words
+        self.cache_size = cache_size
+        self._buckets = {}
+        # Position weights 1/(i+1) for the first max_words words
+        self._position_weights = 1.0 / np.arange(1, max_words + 1, dtype=np.float64)
+
+    def _bucket(self, word: str) -> int:
+        """Map a word to its embedding dimension with a hash that is stable across processes"""
+        bucket = self._buckets.get(word)
+        if bucket is None:
+            if len(self._buckets) >= self.cache_size:
+                self._buckets.clear()
+            bucket = zlib.crc32(word.encode('utf-8')) % self.dim
+            self._buckets[word] = bucket
+        return bucket
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Embed a list of texts into an (n, dim) float32 array of unit-length rows"""
+        n = len(texts)
+        counts = np.zeros(n, dtype=np.int64)
+        buckets = []
+        for row, text in enumerate(texts):
+            if isinstance(text, str):
+                words = text.lower().split()[:self.max_words]
+                buckets.extend([self._bucket(word) for word in words])
+                counts[row] = len(words)
+
+        # Scatter-add every word's 1/(position+1) weight into its (row, bucket) cell
+        total = int(counts.sum())
+        rows = np.repeat(np.arange(n), counts)
+        positions = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        flat = rows * self.dim + np.asarray(buckets, dtype=np.int64)
+        vectors = np.bincount(flat, weights=self._position_weights[positions], minlength=n * self.dim)
+        vectors = vectors.reshape(n, self.dim) + 0.01
+
+        # Normalize text rows; anything that is not a string keeps the flat baseline vector
+        is_text = np.array([isinstance(text, str) for text in texts], dtype=bool)
+        if is_text.any():
+            vectors[is_text] /= np.linalg.norm(vectors[is_text], axis=1, keepdims=True)
+
+        return vectors.astype(np.float32)
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed a single text"""
+        return self.embed_batch([text])[0]
@@ -0,0 +1,286 @@
+# src/ingestion_jobs.py
+import os
+import json
+import time
+import queue
+import sqlite3
+import secrets
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+
+class JobQueueFull(Exception):
+    """Raised when the ingestion queue cannot take another job"""
+
+
+class JobAlreadyActive(Exception):
+    """Raised when a file path already has a queued or running job"""
+
+    def __init__(self, job_id: str):
+        super().__init__(f"Job {job_id} is already processing this file")
+        self.job_id = job_id
+
+
+class IngestionJobQueue:
+    """Bounded queue of PDF ingestion jobs processed by a small pool of worker threads"""
+
+    def __init__(self, rag_system, workers: int = 1, max_queued: int = 16, max_history: int = 1000):
+        self.rag_system = rag_system
+        self.max_history = max_history
+        self.logger = logging.getLogger(__name__)
+
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._active_by_path: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._start_workers(workers)
+
+    def _start_workers(self, workers: int):
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f"ingest-worker-{i}", daemon=True).start()
+
+    def is_full(self) -> bool:
+        return self._queue.full()
+
+    def queued(self) -> int:
+        """Jobs waiting for a worker"""
+        return self._queue.qsize()
+
+    def active_job(self, pdf_path: str) -> Optional[str]:
+        """Id of the queued or running job for a file path, if any"""
+        with self._lock:
+            return self._active_by_path.get(os.path.abspath(pdf_path))
+
+    def submit(self, pdf_path: str, upload_path: Optional[str] = None) -> str:
+        """Queue a PDF for ingestion and return its job id
+
+        If upload_path is given, that file is moved to pdf_path once the job is accepted, so a
+        rejected upload never replaces a file that a job is reading. Raises JobAlreadyActive if
+        pdf_path has a queued or running job, and JobQueueFull under back-pressure.
+        """
+        path = os.path.abspath(pdf_path)
+        with self._lock:
+            # The same file is never ingested by two workers at once
+            if path in self._active_by_path:
+                raise JobAlreadyActive(self._active_by_path[path])
+            # Only workers take from the queue while the lock is held, so the put below cannot fail
+            if self._queue.full():
+                raise JobQueueFull("Ingestion queue is full")
+            if upload_path is not None:
+                os.replace(upload_path, path)
+
+            job_id = secrets.token_hex(8)
+            job = self._new_job(job_id, path)
+            self._queue.put_nowait((job_id, path))
+
+            self._jobs[job_id] = job
+            self._active_by_path[path] = job_id
+            self._trim_history()
+        return job_id
+
+    @staticmethod
+    def _new_job(job_id: str, path: str) -> Dict[str, Any]:
+        return {
+            'id': job_id,
+            'filename': os.path.basename(path),
+            'status': 'queued',
+            'pages_done': 0,
+            'total_pages': None,
+            'chunks_added': 0,
+            'errors': [],
+            'result': None,
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None
+        }
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Snapshot of a job's status"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job, errors=list(job['errors'])) if job is not None else None
+
+    def _trim_history(self):
+        """Forget the oldest finished jobs beyond max_history"""
+        excess = len(self._jobs) - self.max_history
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[job_id]['status'] in ('done', 'failed'):
+                del self._jobs[job_id]
+                excess -= 1
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+
+    def _next_job(self) -> Tuple[str, str]:
+        """Wait for the next queued job; returns its id and file path"""
+        return self._queue.get()
+
+    def _finish(self, job_id: str, path: str, outcome: Dict[str, Any]):
+        with self._lock:
+            self._active_by_path.pop(path, None)
+        self._update(job_id, finished_at=time.time(), **outcome)
+        self._queue.task_done()
+
+    def _worker(self):
+        while True:
+            job_id, path = self._next_job()
+            self._update(job_id, status='running', started_at=time.time())
+            self.logger.info(f"Starting ingestion job {job_id} for {path}")
+
+            def progress(pages_done: int, total_pages: int, chunks_added: int):
+                self._update(job_id, pages_done=pages_done, total_pages=total_pages, chunks_added=chunks_added)
+
+            try:
+                result = self.rag_system.add_document(path, progress=progress)
+                # Pages and images that failed to extract were skipped; a finished job still reports them
+                page_errors = result.get('page_errors', [])
+                if result['success']:
+                    outcome = {'status': 'done', 'result': result, 'errors': page_errors}
+                else:
+                    outcome = {'status': 'failed', 'result': result, 'errors': [result['message']] + page_errors}
+            except Exception as e:
+                self.logger.error(f"Ingestion job {job_id} failed: {e}")
+                outcome = {'status': 'failed', 'errors': [str(e)]}
+            self._finish(job_id, path, outcome)
+
+
+class SQLiteIngestionJobQueue(IngestionJobQueue):
+    """Ingestion jobs in a SQLite table shared by the processes serving one index
+
+    Any process can queue an upload or report on a job; only the process that writes
+    the index starts workers, which poll the table for queued jobs. Jobs that were
+    running when that process died are queued again when the next writer starts.
+    """
+
+    COLUMNS = ('id', 'path', 'filename', 'status', 'pages_done', 'total_pages', 'chunks_added', 'errors',
+               'result', 'created_at', 'started_at', 'finished_at')
+    JSON_COLUMNS = ('errors', 'result')
+
+    def __init__(self, rag_system, path: str, workers: int = 1, max_queued: int = 16, max_history: int = 1000,
+                 poll_seconds: float = 0.5):
+        self.rag_system = rag_system
+        self.path = path
+        self.max_queued = max_queued
+        self.max_history = max_history
+        self.poll_seconds = poll_seconds
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+
+        # Opened on first use so forked worker processes never share a connection
+        self._conn = None
+
+        if workers:
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    requeued = conn.execute("UPDATE jobs SET status = 'queued', started_at = NULL "
+                                            "WHERE status = 'running'").rowcount
+            if requeued:
+                self.logger.info(f"Requeued {requeued} ingestion jobs interrupted by a previous writer")
+        self._start_workers(workers)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, path TEXT NOT NULL, filename TEXT NOT NULL, status TEXT NOT NULL, "
+                "pages_done INTEGER NOT NULL, total_pages INTEGER, chunks_added INTEGER NOT NULL, "
+                "errors TEXT NOT NULL, result TEXT, created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, created_at)")
+            self._conn.commit()
+        return self._conn
+
+    def is_full(self) -> bool:
+        return self.queued() >= self.max_queued
+
+    def queued(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def active_job(self, pdf_path: str) -> Optional[str]:
+        with self._lock:
+            row = self._connect().execute("SELECT id FROM jobs WHERE path = ? AND status IN ('queued', 'running')",
+                                          (os.path.abspath(pdf_path),)).fetchone()
+            return row[0] if row else None
+
+    def submit(self, pdf_path: str, upload_path: Optional[str] = None) -> str:
+        path = os.path.abspath(pdf_path)
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                # Checked and claimed in one write transaction, so two processes cannot both pass the checks
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute("SELECT id FROM jobs WHERE path = ? AND status IN ('queued', 'running')",
+                                   (path,)).fetchone()
+                if row:
+                    raise JobAlreadyActive(row[0])
+                if conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0] >= self.max_queued:
+                    raise JobQueueFull("Ingestion queue is full")
+                if upload_path is not None:
+                    os.replace(upload_path, path)
+
+                job = dict(self._new_job(secrets.token_hex(8), path), path=path)
+                placeholders = ', '.join('?' * len(self.COLUMNS))
+                conn.execute(f"INSERT INTO jobs ({', '.join(self.COLUMNS)}) VALUES ({placeholders})",
+                             [json.dumps(job[c]) if c in self.JSON_COLUMNS else job[c] for c in self.COLUMNS])
+                # Forget the oldest finished jobs beyond max_history
+                conn.execute("DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE status IN ('done', 'failed') "
+                             "ORDER BY created_at DESC LIMIT -1 OFFSET ?)", (self.max_history,))
+        return job['id']
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connect().execute(f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?",
+                                          (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = {c: json.loads(value) if c in self.JSON_COLUMNS else value for c, value in zip(self.COLUMNS, row)}
+        del job['path']
+        return job
+
+    def _update(self, job_id: str, **fields):
+        values = [json.dumps(value) if name in self.JSON_COLUMNS else value for name, value in fields.items()]
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(f"UPDATE jobs SET {', '.join(f'{name} = ?' for name in fields)} WHERE id = ?",
+                             values + [job_id])
+
+    def _next_job(self) -> Tuple[str, str]:
+        while True:
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    row = conn.execute("SELECT id, path FROM jobs WHERE status = 'queued' "
+                                       "ORDER BY created_at LIMIT 1").fetchone()
+                    if row:
+                        # Claimed here so another worker thread does not pick it up too
+                        conn.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?",
+                                     (time.time(), row[0]))
+            if row:
+                return row
+            time.sleep(self.poll_seconds)
+
+    def _finish(self, job_id: str, path: str, outcome: Dict[str, Any]):
+        self._update(job_id, finished_at=time.time(), **outcome)
+
+
+def create_ingestion_queue(rag_system, config) -> IngestionJobQueue:
+    """The upload queue for INDEX_ROLE: in-process, or for "shared" one that every serving process sees"""
+    if config.INDEX_ROLE == 'shared':
+        workers = 0 if rag_system.read_only else config.INGEST_WORKERS
+        return SQLiteIngestionJobQueue(rag_system, config.INGEST_JOBS_DB_PATH, workers, config.INGEST_QUEUE_SIZE)
+    return IngestionJobQueue(rag_system, config.INGEST_WORKERS, config.INGEST_QUEUE_SIZE)
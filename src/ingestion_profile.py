@@ -0,0 +1,138 @@
+# src/ingestion_profile.py
+import os
+import re
+import json
+import time
+from typing import Dict, Any, List
+
+
+class IngestionProfile:
+    """Where the time went while ingesting one document
+
+    PDFProcessor reports each page's wall time, its text, table and image phases and
+    the OCR time of every image; RAGSystem adds the document-level stages and the
+    embedding and store time of each batch. A page's image phase includes its OCR.
+    Extraction failures that were skipped are kept under the page they happened on.
+    """
+
+    # Stages recorded by PDFProcessor -> page fields
+    PAGE_PHASES = {
+        'extract_page': 'seconds',
+        'extract_text': 'text_seconds',
+        'extract_tables': 'table_seconds',
+        'extract_images': 'image_seconds',
+        'ocr': 'ocr_seconds'
+    }
+
+    def __init__(self, document_name: str, pdf_path: str):
+        self.document_name = document_name
+        self.pdf_path = pdf_path
+        self.started_at = time.time()
+        self.stages: Dict[str, float] = {}
+        self.pages: Dict[int, Dict[str, Any]] = {}
+        self.embedding = {'seconds': 0.0, 'chunks': 0, 'batches': 0}
+        self.store = {'seconds': 0.0}
+
+    def _page(self, page_number: int) -> Dict[str, Any]:
+        page = self.pages.get(page_number)
+        if page is None:
+            page = self.pages[page_number] = {'page': page_number, 'chunks': {}, 'images': [], 'errors': []}
+            page.update((field, 0.0) for field in self.PAGE_PHASES.values())
+        return page
+
+    def add_stage(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add_extraction(self, timings: List[tuple]):
+        """Add PDFProcessor stage timings: (0-based page, stage, seconds, detail)"""
+        for page_num, stage, seconds, detail in timings:
+            page = self._page(page_num + 1)
+            field = self.PAGE_PHASES.get(stage)
+            if field is not None:
+                page[field] += seconds
+            if stage == 'ocr':
+                page['images'].append(dict(detail or {}, seconds=seconds))
+            if detail and 'error' in detail:
+                page['errors'].append(dict(detail, stage=stage))
+
+    def errors(self) -> List[str]:
+        """One message per page, phase or image that failed to extract, in page order"""
+        messages = []
+        for number in sorted(self.pages):
+            for error in self.pages[number]['errors']:
+                where = f"Page {number}" + (f" image {error['image_index']}" if 'image_index' in error else '')
+                messages.append(f"{where}: {error['stage']} failed: {error['error']}")
+        return messages
+
+    def add_chunk(self, chunk):
+        counts = self._page(chunk.page_number)['chunks']
+        counts[chunk.chunk_type] = counts.get(chunk.chunk_type, 0) + 1
+
+    def add_batch(self, chunks: int, embed_seconds: float, store_seconds: float):
+        self.embedding['seconds'] += embed_seconds
+        self.embedding['chunks'] += chunks
+        self.embedding['batches'] += 1
+        self.store['seconds'] += store_seconds
+
+    def summary(self, slowest: int = 5) -> Dict[str, Any]:
+        """The slowest pages with their dominant phase, the chunk-type breakdown and OCR totals"""
+        pages = list(self.pages.values())
+        slowest_pages = []
+        for page in sorted(pages, key=lambda p: p['seconds'], reverse=True)[:slowest]:
+            phases = {'text': page['text_seconds'], 'tables': page['table_seconds'],
+                      'images': page['image_seconds']}
+            slowest_pages.append({'page': page['page'], 'seconds': page['seconds'],
+                                  'dominant_phase': max(phases, key=phases.get), 'ocr_seconds': page['ocr_seconds'],
+                                  'images': len(page['images'])})
+
+        chunk_types: Dict[str, int] = {}
+        for page in pages:
+            for chunk_type, count in page['chunks'].items():
+                chunk_types[chunk_type] = chunk_types.get(chunk_type, 0) + count
+        total_chunks = sum(chunk_types.values())
+
+        images = [image for page in pages for image in page['images']]
+        return {
+            'pages': len(pages),
+            'extraction_seconds': sum(page['seconds'] for page in pages),
+            'phase_seconds': {phase: sum(page[field] for page in pages)
+                              for phase, field in (('text', 'text_seconds'), ('tables', 'table_seconds'),
+                                                   ('images', 'image_seconds'), ('ocr', 'ocr_seconds'))},
+            'slowest_pages': slowest_pages,
+            'errors': sum(len(page['errors']) for page in pages),
+            'chunk_types': {chunk_type: {'chunks': count, 'share': count / total_chunks}
+                            for chunk_type, count in sorted(chunk_types.items())},
+            'ocr': {'images': len(images), 'seconds': sum(image['seconds'] for image in images),
+                    'slowest_seconds': max((image['seconds'] for image in images), default=0.0)}
+        }
+
+    def to_dict(self, slowest: int = 5) -> Dict[str, Any]:
+        return {
+            'document_name': self.document_name,
+            'pdf_path': self.pdf_path,
+            'started_at': self.started_at,
+            'total_seconds': self.stages.get('total'),
+            'stages': dict(self.stages),
+            'embedding': dict(self.embedding),
+            'store': dict(self.store),
+            'summary': self.summary(slowest),
+            'pages': [self.pages[number] for number in sorted(self.pages)]
+        }
+
+    def describe(self, slowest: int = 3) -> str:
+        """One log line naming the slowest pages"""
+        pages = ', '.join(f"page {p['page']} {p['seconds']:.2f}s ({p['dominant_phase']})"
+                          for p in self.summary(slowest)['slowest_pages'])
+        return (f"{self.document_name}: {self.stages.get('total', 0.0):.2f}s total, "
+                f"embedding {self.embedding['seconds']:.2f}s, store {self.store['seconds']:.2f}s; "
+                f"slowest {pages or 'none'}")
+
+    def save(self, directory: str) -> str:
+        """Write the profile as JSON into directory and return the file path"""
+        os.makedirs(directory, exist_ok=True)
+        name = re.sub(r'[^\w.-]+', '_', self.document_name)
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started_at)) + f"{self.started_at % 1:.3f}"[1:]
+        path = os.path.join(directory, f"{name}-{stamp}.json")
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(slowest=10), f, indent=2)
+        return path
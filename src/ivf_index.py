@@ -0,0 +1,142 @@
+# src/ivf_index.py
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+class IVFIndex:
+    """Inverted-file ANN index: a k-means coarse quantizer with one posting list per centroid
+
+    Like faiss' IndexIVFFlat, each list keeps its own contiguous copy of its vectors,
+    so a probe scores a few dense blocks instead of gathering rows from the store.
+    """
+
+    def __init__(self, dim: int, nlist: int = 256, nprobe: int = 16,
+                 kmeans_iterations: int = 10, seed: int = 0):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.kmeans_iterations = kmeans_iterations
+        self.seed = seed
+        self.logger = logging.getLogger(__name__)
+
+        # faiss' rule of thumb: at least ~39 training points per centroid
+        self.min_train_size = 39 * nlist
+
+        self.centroids = None
+        self._lists = [np.empty(0, dtype=np.int64) for _ in range(nlist)]
+        self._list_vectors = [np.empty((0, dim), dtype=np.float32) for _ in range(nlist)]
+        self._list_sizes = np.zeros(nlist, dtype=np.int64)
+
+        # Rows seen before there is enough data to train the quantizer
+        self._pending_vectors = []
+        self._pending_ids = []
+        self._pending_count = 0
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def __len__(self) -> int:
+        return int(self._list_sizes.sum()) + self._pending_count
+
+    def _assign(self, vectors: np.ndarray, centroids: np.ndarray = None, batch_size: int = 65_536) -> np.ndarray:
+        """Nearest centroid (by inner product) for each vector"""
+        centroids = self.centroids if centroids is None else centroids
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), batch_size):
+            block = vectors[start:start + batch_size]
+            assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        return assignments
+
+    def train(self, vectors: np.ndarray):
+        """Fit the coarse quantizer with spherical k-means"""
+        rng = np.random.default_rng(self.seed)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        nlist = min(self.nlist, len(vectors))
+        centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+
+        for _ in range(self.kmeans_iterations):
+            assignments = self._assign(vectors, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, vectors)
+            counts = np.bincount(assignments, minlength=nlist)
+
+            # Re-seed empty clusters from random points so every list stays useful
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = (sums / np.maximum(norms, 1e-12)).astype(np.float32)
+
+        self.nlist = nlist
+        self._lists = self._lists[:nlist]
+        self._list_vectors = self._list_vectors[:nlist]
+        self._list_sizes = self._list_sizes[:nlist]
+        # Set last: probes only use the lists once there are centroids
+        self.centroids = centroids
+        self.logger.info(f"Trained IVF quantizer with {nlist} lists on {len(vectors)} vectors")
+
+    def _extend_list(self, list_id: int, ids: np.ndarray, vectors: np.ndarray):
+        """Append ids and vectors to one posting list, doubling its capacity when full"""
+        size = self._list_sizes[list_id]
+        needed = size + len(ids)
+        if needed > len(self._lists[list_id]):
+            capacity = max(needed, 2 * len(self._lists[list_id]), 16)
+            grown_ids = np.empty(capacity, dtype=np.int64)
+            grown_ids[:size] = self._lists[list_id][:size]
+            grown_vectors = np.empty((capacity, self.dim), dtype=np.float32)
+            grown_vectors[:size] = self._list_vectors[list_id][:size]
+            self._lists[list_id] = grown_ids
+            self._list_vectors[list_id] = grown_vectors
+        self._lists[list_id][size:needed] = ids
+        self._list_vectors[list_id][size:needed] = vectors
+        self._list_sizes[list_id] = needed
+
+    def add(self, vectors: np.ndarray, ids: np.ndarray):
+        """Insert vectors under the given row ids; trains the quantizer once enough rows have arrived"""
+        if not self.is_trained:
+            self._pending_vectors.append(np.asarray(vectors, dtype=np.float32))
+            self._pending_ids.append(np.asarray(ids, dtype=np.int64))
+            self._pending_count += len(ids)
+            if self._pending_count < self.min_train_size:
+                return
+
+            vectors = np.concatenate(self._pending_vectors)
+            ids = np.concatenate(self._pending_ids)
+            self._pending_vectors, self._pending_ids, self._pending_count = [], [], 0
+            self.train(vectors)
+
+        vectors = np.asarray(vectors, dtype=np.float32)
+        ids = np.asarray(ids, dtype=np.int64)
+        assignments = self._assign(vectors)
+        order = np.argsort(assignments, kind='stable')
+        list_ids, starts = np.unique(assignments[order], return_index=True)
+        bounds = list(starts[1:]) + [len(order)]
+        for list_id, lo, hi in zip(list_ids, starts, bounds):
+            rows = order[lo:hi]
+            self._extend_list(int(list_id), ids[rows], vectors[rows])
+
+    def probe(self, query: np.ndarray, nprobe: Optional[int] = None) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Candidate row ids and similarities from the nprobe closest lists, or None while untrained"""
+        if not self.is_trained:
+            return None
+
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        centroid_scores = self.centroids @ query
+        if nprobe < self.nlist:
+            probed = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            probed = np.arange(self.nlist)
+
+        ids, scores = [], []
+        for list_id in probed:
+            size = self._list_sizes[list_id]
+            if size:
+                ids.append(self._lists[list_id][:size])
+                scores.append(self._list_vectors[list_id][:size] @ query)
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return np.concatenate(ids), np.concatenate(scores)
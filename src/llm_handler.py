@@ -1,33 +1,51 @@
 # src/llm_handler.py
-from groq import Groq
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional
 import logging
+import time
+from collections import deque
+from .context_packer import ContextPacker, estimate_tokens
+from .metrics import query_span, QUERY_STAGE_SECONDS, LLM_REQUESTS, LLM_TOKENS
 
 class LLMHandler:
     def __init__(self, config):
         self.config = config
         self.logger = logging.getLogger(__name__)
-        self.conversation_history = []
+        # Recent exchanges across all callers; sessions keep their own history in a ConversationStore
+        self.conversation_history = deque(maxlen=2 * config.CONVERSATION_MAX_TURNS)
+        
+        # Everything besides the prompt that shapes a completion; part of the answer cache key
+        self.generation_settings = {
+            'model': config.LLM_MODEL,
+            'temperature': 0.7,
+            'max_tokens': 1000,
+            'top_p': 1
+        }
+        
+        self.context_packer = ContextPacker(config.CONTEXT_TOKEN_BUDGET, config.CHUNK_OVERLAP)
         
         # Check if API key is available
         if not config.GROQ_API_KEY:
             self.logger.error("GROQ_API_KEY is not set. Please add your API key to the .env file.")
             self.client = None
         else:
-            self.client = Groq(api_key=config.GROQ_API_KEY)
+            # Imported here: the SDK takes a good part of a second to import
+            from groq import Groq
+            # GROQ_BASE_URL points the client at another OpenAI-compatible endpoint, e.g. a local stub
+            self.client = Groq(api_key=config.GROQ_API_KEY, base_url=config.GROQ_BASE_URL)
         
     def generate_response(self, query: str, context_docs: List[Dict[str, Any]], 
                          conversation_history: List[str] = None) -> Dict[str, Any]:
         """Generate response using retrieved context"""
         
-        # Prepare context from retrieved documents
-        context_text = self._prepare_context(context_docs)
-        
-        # Build conversation context
-        conversation_context = self._build_conversation_context(conversation_history)
-        
-        # Create prompt
-        prompt = self._create_prompt(query, context_text, conversation_context)
+        with query_span('build_prompt'):
+            # Prepare context from retrieved documents
+            context = self.prepare_context(context_docs)
+            
+            # Build conversation context
+            conversation_context = self._build_conversation_context(conversation_history)
+            
+            # Create prompt
+            prompt = self._create_prompt(query, context['context_text'], conversation_context)
         
         try:
             # Check if client is initialized
@@ -36,26 +54,20 @@ class LLMHandler:
                 self.logger.error(error_message)
                 return {
                     'answer': error_message,
-                    'sources_used': len(context_docs),
-                    'context_types': list(set([doc['metadata']['chunk_type'] for doc in context_docs])),
+                    'sources_used': context['sources_used'],
+                    'context_types': context['context_types'],
                     'confidence': 0.0,
+                    'context_stats': context['context_stats'],
                     'error': True
                 }
                 
             # Generate response
-            response = self.client.chat.completions.create(
-                model=self.config.LLM_MODEL,
-                messages=[
-                    {"role": "system", "content": self._get_system_prompt()},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1000,
-                top_p=1,
-                stream=False
-            )
+            with query_span('llm_call'):
+                response = self._create_completion(prompt, stream=False)
             
             answer = response.choices[0].message.content
+            LLM_REQUESTS.inc(status='ok')
+            self._count_tokens(getattr(response, 'usage', None), prompt, answer)
             
             # Update conversation history
             self.conversation_history.append(f"User: {query}")
@@ -63,14 +75,16 @@ class LLMHandler:
             
             return {
                 'answer': answer,
-                'sources_used': len(context_docs),
-                'context_types': list(set([doc['metadata']['chunk_type'] for doc in context_docs])),
-                'confidence': self._calculate_confidence(context_docs),
+                'sources_used': context['sources_used'],
+                'context_types': context['context_types'],
+                'confidence': context['confidence'],
+                'context_stats': context['context_stats'],
                 'error': False
             }
             
         except Exception as e:
             self.logger.error(f"Error generating response: {e}")
+            LLM_REQUESTS.inc(status='error')
             return {
                 'answer': "I apologize, but I encountered an error while generating a response. Please try again.",
                 'sources_used': 0,
@@ -78,21 +92,119 @@ class LLMHandler:
                 'confidence': 0.0
             }
     
-    def _prepare_context(self, context_docs: List[Dict[str, Any]]) -> str:
-        """Prepare context from retrieved documents"""
-        context_parts = []
+    def stream_response(self, query: str, context_docs: List[Dict[str, Any]],
+                        conversation_history: List[str] = None,
+                        context: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """Generate a response token by token
         
-        for i, doc in enumerate(context_docs, 1):
-            content = doc['content']
-            metadata = doc['metadata']
-            
-            context_part = f"""
-            SOURCE {i} (Page {metadata['page_number']}, Type: {metadata['chunk_type']}):
-            {content}
-            """
-            context_parts.append(context_part)
+        Yields {'type': 'token', 'content': ...} events as the model produces text, then one
+        {'type': 'done', ...} event carrying the full answer and the generate_response fields,
+        plus time_to_first_token and generation_time in seconds. context, the prepare_context
+        result for context_docs, saves packing them again when the caller already has it.
+        """
+        with query_span('build_prompt'):
+            if context is None:
+                context = self.prepare_context(context_docs)
+            conversation_context = self._build_conversation_context(conversation_history)
+            prompt = self._create_prompt(query, context['context_text'], conversation_context)
+        
+        result = {
+            'type': 'done',
+            'sources_used': context['sources_used'],
+            'context_types': context['context_types'],
+            'confidence': context['confidence'],
+            'context_stats': context['context_stats'],
+            'error': False,
+            'time_to_first_token': None
+        }
+        
+        if self.client is None:
+            error_message = "ERROR: Groq API key is not set or is invalid. Please add a valid API key to the .env file."
+            self.logger.error(error_message)
+            yield {'type': 'token', 'content': error_message}
+            yield dict(result, answer=error_message, confidence=0.0, error=True, generation_time=0.0)
+            return
+        
+        start = time.perf_counter()
+        parts = []
+        usage = None
+        try:
+            for chunk in self._create_completion(prompt, stream=True):
+                # Groq reports usage on the last chunk, under x_groq; OpenAI-style servers under usage
+                usage = getattr(chunk, 'usage', None) or getattr(getattr(chunk, 'x_groq', None), 'usage', None) or usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if result['time_to_first_token'] is None:
+                    result['time_to_first_token'] = time.perf_counter() - start
+                parts.append(delta)
+                yield {'type': 'token', 'content': delta}
+        
+        except Exception as e:
+            self.logger.error(f"Error streaming response: {e}")
+            message = "I apologize, but I encountered an error while generating a response. Please try again."
+            # Keep whatever was already streamed so the client's text stays consistent
+            parts.append(("\n\n" if parts else "") + message)
+            yield {'type': 'token', 'content': parts[-1]}
+            result.update(confidence=0.0, error=True)
         
-        return "\n".join(context_parts)
+        answer = "".join(parts)
+        generation_time = time.perf_counter() - start
+        QUERY_STAGE_SECONDS.observe(generation_time, stage='llm_stream')
+        if result['time_to_first_token'] is not None:
+            QUERY_STAGE_SECONDS.observe(result['time_to_first_token'], stage='llm_first_token')
+        LLM_REQUESTS.inc(status='error' if result['error'] else 'ok')
+        if not result['error']:
+            self._count_tokens(usage, prompt, answer)
+            self.conversation_history.append(f"User: {query}")
+            self.conversation_history.append(f"Assistant: {answer}")
+        if result['time_to_first_token'] is not None:
+            self.logger.info(f"Streamed response: first token after {result['time_to_first_token'] * 1000:.0f} ms, "
+                             f"complete after {generation_time * 1000:.0f} ms")
+        yield dict(result, answer=answer, generation_time=generation_time)
+    
+    def _create_completion(self, prompt: str, stream: bool):
+        """Chat completion request for a prompt; returns an iterator of chunks when streaming"""
+        return self.client.chat.completions.create(
+            messages=[
+                {"role": "system", "content": self._get_system_prompt()},
+                {"role": "user", "content": prompt}
+            ],
+            stream=stream,
+            **self.generation_settings
+        )
+    
+    def _count_tokens(self, usage, prompt: str, answer: str):
+        """Add a completion's tokens to the metrics, estimating them when the API reports no usage"""
+        if usage is not None and getattr(usage, 'prompt_tokens', None) is not None:
+            LLM_TOKENS.inc(usage.prompt_tokens, kind='prompt', source='api')
+            LLM_TOKENS.inc(usage.completion_tokens, kind='completion', source='api')
+        else:
+            LLM_TOKENS.inc(estimate_tokens(self._get_system_prompt() + prompt), kind='prompt', source='estimate')
+            LLM_TOKENS.inc(estimate_tokens(answer), kind='completion', source='estimate')
+    
+    def prepare_context(self, context_docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Prepare context from retrieved documents, packed into the context token budget
+        
+        Returns the context_text and its context_stats with what the answer reports about its
+        sources, which are the packed docs: sources_used, context_types and confidence.
+        """
+        context_text, stats, packed_docs = self.context_packer.pack(context_docs)
+        self.logger.info(f"Packed {stats['chunks_packed']}/{stats['chunks_retrieved']} chunks into "
+                         f"~{stats['context_tokens']} tokens (saved ~{stats['tokens_saved']})")
+        if stats['chunks_over_budget'] or stats['chunks_truncated']:
+            self.logger.warning(f"CONTEXT_TOKEN_BUDGET ({self.context_packer.token_budget} tokens) left out "
+                                f"{stats['chunks_over_budget']} retrieved chunks and truncated "
+                                f"{stats['chunks_truncated']}; raise it or lower TOP_K_RESULTS / CHUNK_SIZE")
+        return {
+            'context_text': context_text,
+            'context_stats': stats,
+            'sources_used': len(packed_docs),
+            'context_types': list(set([doc['metadata']['chunk_type'] for doc in packed_docs])),
+            'confidence': self._calculate_confidence(packed_docs)
+        }
     
     def _build_conversation_context(self, conversation_history: List[str]) -> str:
         """Build conversation context"""
@@ -194,4 +306,4 @@ class LLMHandler:
     
     def clear_history(self):
         """Clear conversation history"""
-        self.conversation_history = []
+        self.conversation_history.clear()
@@ -0,0 +1,185 @@
+# src/metrics.py
+import time
+import bisect
+import logging
+import threading
+from typing import Callable, Dict, Iterator, List, Tuple
+
+# Seconds; spans from sub-millisecond searches up to slow LLM calls and OCR
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """Monotonic count per label combination"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label combination, like a Prometheus client histogram"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def time(self, **labels) -> '_Timer':
+        """Context manager observing the duration of its with-block"""
+        return _Timer(self, labels)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        for key, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound!r}"'
+                yield f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {repr(total)}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}"
+
+
+class _Timer:
+    """A plain class rather than @contextmanager: spans stay around a microsecond"""
+
+    __slots__ = ('histogram', 'labels', 'start', 'seconds')
+
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds = time.perf_counter() - self.start
+        self.histogram.observe(self.seconds, **self.labels)
+        return False
+
+
+class Gauge:
+    """Current value read from a callback when the metrics are rendered"""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, help_text: str, read: Callable[[], float]):
+        self.name = name
+        self.help = help_text
+        self.read = read
+
+    def samples(self) -> Iterator[str]:
+        # A failing callback drops this gauge's sample instead of failing the whole scrape
+        try:
+            value = self.read()
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Reading gauge {self.name} failed: {e}")
+            return
+        yield f"{self.name} {_format_value(value)}"
+
+
+class MetricsRegistry:
+    """Process-local metrics rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None and not isinstance(metric, Gauge):
+                return existing
+            # Gauges are re-bound, e.g. to the newest RAGSystem in a process that creates several
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], float]) -> Gauge:
+        return self._register(Gauge(name, help_text, read))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+QUERY_STAGE_SECONDS = registry.histogram(
+    'rag_query_stage_seconds', 'Time spent in each stage of answering a question', ('stage',))
+INGEST_STAGE_SECONDS = registry.histogram(
+    'rag_ingest_stage_seconds', 'Time spent in each stage of ingesting a document', ('stage',))
+QUERIES = registry.counter('rag_queries_total', 'Questions received', ('mode',))
+QUERY_ERRORS = registry.counter('rag_query_errors_total', 'Questions that failed with an error', ('mode',))
+ANSWER_CACHE_LOOKUPS = registry.counter('rag_answer_cache_lookups_total', 'Answer cache lookups', ('result',))
+LLM_REQUESTS = registry.counter('rag_llm_requests_total', 'Chat completion requests', ('status',))
+LLM_TOKENS = registry.counter(
+    'rag_llm_tokens_total', 'Prompt and completion tokens, as reported by the LLM API or estimated', ('kind', 'source'))
+DOCUMENTS_INGESTED = registry.counter('rag_documents_ingested_total', 'Documents processed', ('status',))
+CHUNKS_INGESTED = registry.counter('rag_chunks_ingested_total', 'Chunks stored by ingestion', ('chunk_type',))
+
+
+def query_span(stage: str):
+    """with query_span('retrieve'): ... records the block's duration under that stage"""
+    return QUERY_STAGE_SECONDS.time(stage=stage)
+
+
+def ingest_span(stage: str):
+    return INGEST_STAGE_SECONDS.time(stage=stage)
@@ -0,0 +1,64 @@
+# src/ocr_cache.py
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Optional, Tuple
+
+
+class OCRCache:
+    """Persistent OCR results keyed by image content hash, with least-recently-used eviction"""
+
+    def __init__(self, path: str, max_entries: int = 50_000):
+        self.path = path
+        self.max_entries = max_entries
+        self.logger = logging.getLogger(__name__)
+        self.hits = 0
+        self.misses = 0
+
+        # Opened on first use so forked worker processes never share a connection
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS ocr ("
+                "key TEXT PRIMARY KEY, text TEXT NOT NULL, confidence REAL NOT NULL, "
+                "width INTEGER NOT NULL, height INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ocr_last_used ON ocr(last_used)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> Optional[Tuple[str, float, Tuple[int, int]]]:
+        """Cached (text, confidence, OCR'd image size) for an image, or None"""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT text, confidence, width, height FROM ocr WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE ocr SET last_used = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            self.hits += 1
+            return row[0], row[1], (row[2], row[3])
+
+    def put(self, key: str, text: str, confidence: float, image_size: Tuple[int, int]):
+        """Store an OCR result, evicting the least recently used entries beyond max_entries"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO ocr (key, text, confidence, width, height, last_used) "
+                         "VALUES (?, ?, ?, ?, ?, ?)",
+                         (key, text, float(confidence), image_size[0], image_size[1], time.time()))
+            excess = conn.execute("SELECT COUNT(*) FROM ocr").fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute("DELETE FROM ocr WHERE key IN (SELECT key FROM ocr ORDER BY last_used LIMIT ?)",
+                             (excess,))
+            conn.commit()
@@ -1,15 +1,29 @@
 # src/pdf_processor.py
-import fitz  # PyMuPDF
-import pdfplumber
-import pytesseract
-from PIL import Image
-import pandas as pd
+# PyMuPDF (fitz), pdfplumber, pytesseract, Pillow and pandas are imported where they are
+# used, so importing this module (and RAGSystem) does not load the PDF and OCR stack
 import numpy as np
 import io
 import re
-from typing import List, Dict, Any, Tuple
+import csv
+import time
+import hashlib
+import threading
+import multiprocessing
+from types import SimpleNamespace
+from typing import List, Dict, Any, Tuple, Optional, Iterator, TYPE_CHECKING
 import logging
 from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import deque
+from functools import partial
+from .ocr_cache import OCRCache
+from .metrics import INGEST_STAGE_SECONDS
+from .ingestion_profile import IngestionProfile
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from PIL import Image
 
 @dataclass
 class DocumentChunk:
@@ -19,26 +33,169 @@ class DocumentChunk:
     metadata: Dict[str, Any]
     
 class PDFProcessor:
+    # Upper bound on the pages a worker extracts before handing its chunks back
+    MAX_PAGES_PER_TASK = 32
+    # "dual" parses each page with pdfplumber (text, tables) and PyMuPDF (images);
+    # "pymupdf" does all three from one PyMuPDF parse
+    ENGINES = ('dual', 'pymupdf')
+    
     def __init__(self, config):
+        if config.PDF_ENGINE not in self.ENGINES:
+            raise ValueError(f"Unknown PDF_ENGINE: {config.PDF_ENGINE}")
         self.config = config
         self.logger = logging.getLogger(__name__)
+        self.ocr_cache = None
+        if config.OCR_CACHE_PATH:
+            self.ocr_cache = OCRCache(config.OCR_CACHE_PATH, config.OCR_CACHE_MAX_ENTRIES)
+        # Page-extraction processes, started on first use and shared by every document
+        self._executor = None
+        self._executor_lock = threading.Lock()
         
-    def extract_content(self, pdf_path: str) -> List[DocumentChunk]:
-        """Extract all content types from PDF"""
-        chunks = []
-        doc = None
-        
+    def extract_content(self, pdf_path: str, pages: Optional[List[int]] = None,
+                        profile: Optional[IngestionProfile] = None) -> List[DocumentChunk]:
+        """Extract all content types from PDF, or only from the given 0-based pages"""
+        return list(self.iter_content(pdf_path, pages, profile))
+    
+    def iter_content(self, pdf_path: str, pages: Optional[List[int]] = None,
+                     profile: Optional[IngestionProfile] = None) -> Iterator[DocumentChunk]:
+        """Yield chunks page by page, in page order, without holding the whole document's chunks
+
+        If a profile is given, it receives the per-page phase and per-image OCR timings,
+        and the page, phase and OCR failures that were logged and skipped.
+        """
+        import fitz  # PyMuPDF
         try:
-            # Process with PyMuPDF for images and basic text
             self.logger.info(f"Opening PDF: {pdf_path}")
-            doc = fitz.open(pdf_path)
+            with fitz.open(pdf_path) as doc:
+                total_pages = len(doc)
+            page_nums = list(range(total_pages)) if pages is None else sorted(pages)
+            self.logger.info(f"Processing {len(page_nums)} of {total_pages} pages")
+            
+            # (0-based page, stage, seconds, detail) measured while extracting this document, reported to
+            # the metrics and the profile at the end; worker processes hand theirs back with their chunks.
+            # A stage that failed has its message under 'error' in detail
+            timings = []
+            workers = min(self.config.PDF_WORKERS, len(page_nums))
+            if workers > 1 and len(page_nums) >= self.config.PDF_PARALLEL_MIN_PAGES:
+                chunks = self._iter_parallel(pdf_path, page_nums, total_pages, workers, timings)
+            else:
+                chunks = self._iter_pages(pdf_path, page_nums, total_pages, timings)
+            
+            total_chunks = 0
+            try:
+                for chunk in chunks:
+                    total_chunks += 1
+                    yield chunk
+            finally:
+                self._report_stage_timings(timings, profile)
+            
+            self.logger.info(f"Total chunks extracted: {total_chunks}")
             
+        except Exception as e:
+            self.logger.error(f"Critical error processing PDF {pdf_path}: {e}")
+            raise
+    
+    def _iter_parallel(self, pdf_path: str, page_nums: List[int], total_pages: int,
+                       workers: int, timings: List[tuple]) -> Iterator[DocumentChunk]:
+        """Spread page ranges over a process pool and yield their chunks in page order"""
+        # Several ranges per worker so one slow range does not leave the other workers idle,
+        # but never so large that one range's chunks dominate memory
+        range_size = max(1, min(self.MAX_PAGES_PER_TASK, -(-len(page_nums) // (workers * 4))))
+        ranges = [page_nums[i:i + range_size] for i in range(0, len(page_nums), range_size)]
+        
+        self.logger.info(f"Extracting {len(ranges)} page ranges with {workers} worker processes")
+        executor = self._pool()
+        # Workers do not inherit this process's state, so they get the settings as values
+        settings = {name: getattr(self.config, name) for name in dir(self.config) if name.isupper()}
+        # At most two ranges per worker in flight; results are consumed in submission (page) order
+        in_flight = deque()
+        try:
+            for page_range in ranges:
+                in_flight.append(executor.submit(_extract_pages_worker, settings, pdf_path,
+                                                 page_range, total_pages))
+                if len(in_flight) >= 2 * workers:
+                    yield from self._collect(executor, in_flight.popleft(), timings)
+            while in_flight:
+                yield from self._collect(executor, in_flight.popleft(), timings)
+        finally:
+            for future in in_flight:
+                future.cancel()
+    
+    def _pool(self) -> ProcessPoolExecutor:
+        """The shared extraction pool
+
+        Its processes come from a forkserver (spawn where there is none): forking this
+        multi-threaded process could copy a lock held by another thread into the child.
+        """
+        with self._executor_lock:
+            if self._executor is None:
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._executor = ProcessPoolExecutor(max_workers=self.config.PDF_WORKERS,
+                                                     mp_context=multiprocessing.get_context(method))
+            return self._executor
+    
+    def close(self):
+        """Stop the extraction processes, if any were started"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    
+    def _collect(self, executor: ProcessPoolExecutor, future, timings: List[tuple]) -> List[DocumentChunk]:
+        try:
+            chunks, range_timings = future.result()
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); the next document starts a new pool
+            with self._executor_lock:
+                if self._executor is executor:
+                    self._executor = None
+            raise
+        timings.extend(range_timings)
+        return chunks
+    
+    def _report_stage_timings(self, timings: List[tuple], profile: Optional[IngestionProfile] = None):
+        for _, stage, seconds, _ in timings:
+            INGEST_STAGE_SECONDS.observe(seconds, stage=stage)
+        if profile is not None:
+            profile.add_extraction(timings)
+    
+    def _timed(self, timings: List[tuple], stage: str, page_num: int, func, *args,
+               detail: Optional[Dict[str, Any]] = None):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        except Exception as e:
+            # Callers log and skip the failure; recording it with the timing lets it reach the profile
+            detail = dict(detail or {}, error=str(e))
+            raise
+        finally:
+            timings.append((page_num, stage, time.perf_counter() - start, detail))
+    
+    def _extract_pages(self, pdf_path: str, page_nums: List[int], total_pages: int,
+                       timings: List[tuple]) -> List[DocumentChunk]:
+        """Extract the given pages into a list"""
+        return list(self._iter_pages(pdf_path, page_nums, total_pages, timings))
+    
+    def _iter_pages(self, pdf_path: str, page_nums: List[int], total_pages: int,
+                    timings: List[tuple]) -> Iterator[DocumentChunk]:
+        """Extract the given pages with this process's own PyMuPDF and pdfplumber handles"""
+        if self.config.PDF_ENGINE == 'pymupdf':
+            yield from self._iter_pages_pymupdf(pdf_path, page_nums, total_pages, timings)
+            return
+        import fitz
+        import pdfplumber
+        # OCR results per image xref, local to this call: several documents may be extracted at once
+        ocr_by_xref = {}
+        
+        # Process with PyMuPDF for images and basic text
+        with fitz.open(pdf_path) as doc:
             # Process with pdfplumber for tables and structured text
             with pdfplumber.open(pdf_path) as pdf:
-                total_pages = len(doc)
-                self.logger.info(f"Processing {total_pages} pages")
-                
-                for page_num in range(total_pages):
+                for page_num in page_nums:
+                    chunks = []
+                    page_plumber = None
+                    page_detail = None
+                    page_start = time.perf_counter()
                     try:
                         self.logger.info(f"Processing page {page_num + 1}/{total_pages}")
                         page_fitz = doc[page_num]
@@ -46,7 +203,8 @@ class PDFProcessor:
                         
                         # Extract text chunks
                         try:
-                            text_chunks = self._extract_text_chunks(page_plumber, page_num)
+                            text_chunks = self._timed(timings, 'extract_text', page_num, self._extract_text_chunks,
+                                                      page_plumber, page_num)
                             chunks.extend(text_chunks)
                             self.logger.info(f"Extracted {len(text_chunks)} text chunks from page {page_num + 1}")
                         except Exception as e:
@@ -54,7 +212,8 @@ class PDFProcessor:
                         
                         # Extract table chunks
                         try:
-                            table_chunks = self._extract_table_chunks(page_plumber, page_num)
+                            table_chunks = self._timed(timings, 'extract_tables', page_num, self._extract_table_chunks,
+                                                       page_plumber, page_num)
                             chunks.extend(table_chunks)
                             self.logger.info(f"Extracted {len(table_chunks)} table chunks from page {page_num + 1}")
                         except Exception as e:
@@ -62,7 +221,8 @@ class PDFProcessor:
                         
                         # Extract image chunks
                         try:
-                            image_chunks = self._extract_image_chunks(page_fitz, page_num)
+                            image_chunks = self._timed(timings, 'extract_images', page_num, self._extract_image_chunks,
+                                                       page_fitz, page_num, ocr_by_xref, timings)
                             chunks.extend(image_chunks)
                             self.logger.info(f"Extracted {len(image_chunks)} image chunks from page {page_num + 1}")
                         except Exception as e:
@@ -70,22 +230,74 @@ class PDFProcessor:
                             
                     except Exception as e:
                         self.logger.error(f"Error processing page {page_num + 1}: {e}")
-                        continue
-            
-            self.logger.info(f"Total chunks extracted: {len(chunks)}")
-            
-        except Exception as e:
-            self.logger.error(f"Critical error processing PDF {pdf_path}: {e}")
-            raise
-        finally:
-            if doc:
-                doc.close()
+                        page_detail = {'error': str(e)}
+                    finally:
+                        # Release pdfplumber's parsed objects and layout for this page
+                        if page_plumber is not None:
+                            page_plumber.flush_cache()
+                        page_fitz = page_plumber = None
+                        timings.append((page_num, 'extract_page', time.perf_counter() - page_start, page_detail))
+                    
+                    yield from chunks
+    
+    def _iter_pages_pymupdf(self, pdf_path: str, page_nums: List[int], total_pages: int,
+                            timings: List[tuple]) -> Iterator[DocumentChunk]:
+        """Extract the given pages with PyMuPDF alone: text, tables and images from one parse per page"""
+        import fitz
+        ocr_by_xref = {}
+        extractors = (('extract_text', 'text', self._extract_text_chunks_fitz),
+                      ('extract_tables', 'table', self._extract_table_chunks_fitz),
+                      ('extract_images', 'image', partial(self._extract_image_chunks, ocr_by_xref=ocr_by_xref,
+                                                        timings=timings)))
+        
+        with fitz.open(pdf_path) as doc:
+            for page_num in page_nums:
+                chunks = []
+                page_detail = None
+                page_start = time.perf_counter()
+                try:
+                    self.logger.info(f"Processing page {page_num + 1}/{total_pages}")
+                    page = doc[page_num]
+                    for stage, kind, extract in extractors:
+                        try:
+                            extracted = self._timed(timings, stage, page_num, extract, page, page_num)
+                            chunks.extend(extracted)
+                            self.logger.info(f"Extracted {len(extracted)} {kind} chunks from page {page_num + 1}")
+                        except Exception as e:
+                            self.logger.error(f"Error extracting {kind}s from page {page_num + 1}: {e}")
+                except Exception as e:
+                    self.logger.error(f"Error processing page {page_num + 1}: {e}")
+                    page_detail = {'error': str(e)}
+                finally:
+                    page = None
+                    timings.append((page_num, 'extract_page', time.perf_counter() - page_start, page_detail))
                 
-        return chunks
+                yield from chunks
+    
+    def page_hashes(self, pdf_path: str) -> List[str]:
+        """Fingerprint each page from its raw content stream and embedded image streams, without parsing"""
+        import fitz
+        hashes = []
+        with fitz.open(pdf_path) as doc:
+            for page in doc:
+                digest = hashlib.blake2b(page.read_contents(), digest_size=16)
+                digest.update(str(page.rect).encode())
+                for img in page.get_images():
+                    digest.update(doc.xref_stream_raw(img[0]) or b'')
+                hashes.append(digest.hexdigest())
+        return hashes
     
     def _extract_text_chunks(self, page, page_num: int) -> List[DocumentChunk]:
         """Extract and chunk text content"""
-        text = page.extract_text()
+        return self._chunk_text(page.extract_text(), page_num)
+    
+    def _extract_text_chunks_fitz(self, page, page_num: int) -> List[DocumentChunk]:
+        """Extract and chunk text content of a PyMuPDF page, in content-stream order"""
+        # sort=True would reorder blocks by position at about ten times the cost
+        return self._chunk_text(page.get_text(), page_num)
+    
+    def _chunk_text(self, text: str, page_num: int) -> List[DocumentChunk]:
+        """Split a page's text into overlapping word windows"""
         if not text:
             return []
             
@@ -116,6 +328,7 @@ class PDFProcessor:
     
     def _extract_table_chunks(self, page, page_num: int) -> List[DocumentChunk]:
         """Extract table content"""
+        import pandas as pd
         tables = page.extract_tables()
         chunks = []
         
@@ -146,41 +359,93 @@ class PDFProcessor:
         
         return chunks
     
-    def _extract_image_chunks(self, page, page_num: int) -> List[DocumentChunk]:
-        """Extract and OCR image content"""
+    def _extract_table_chunks_fitz(self, page, page_num: int) -> List[DocumentChunk]:
+        """Extract ruled tables found by PyMuPDF, formatted without pandas"""
+        import fitz
+        # Like pdfplumber's default, tables are detected from ruling lines, so only the area
+        # covered by vector drawings needs searching; most of the cost is reading that area's characters
+        drawings = page.get_cdrawings()
+        if not drawings:
+            return []
+        drawn = fitz.Rect()
+        for drawing in drawings:
+            drawn |= fitz.Rect(drawing['rect'])
+        
+        chunks = []
+        for table_idx, table in enumerate(page.find_tables(clip=drawn + (-5, -5, 5, 5)).tables):
+            rows = table.extract()
+            if not rows:
+                continue
+            
+            header, body = rows[0], rows[1:]
+            columns = max(len(row) for row in rows)
+            if not any(header):
+                # Like a DataFrame without column names: number the columns
+                header = [str(i) for i in range(columns)]
+            table_text = self._format_table(header, body, columns)
+            csv_repr = self._table_to_csv(header, body, columns)
+            
+            chunks.append(DocumentChunk(
+                content=f"TABLE DATA:\n{table_text}\n\nCSV FORMAT:\n{csv_repr}",
+                chunk_type='table',
+                page_number=page_num + 1,
+                metadata={
+                    'table_index': table_idx,
+                    'rows': len(body),
+                    'columns': columns,
+                    'table_shape': (len(body), columns)
+                }
+            ))
+        
+        return chunks
+    
+    @staticmethod
+    def _cells(row: List[Optional[str]], columns: int) -> List[str]:
+        """A table row as strings, padded to the table width; empty cells become ''"""
+        cells = ['' if cell is None else str(cell) for cell in row]
+        return cells + [''] * (columns - len(cells))
+    
+    def _format_table(self, header: List[Optional[str]], body: List[List[Optional[str]]], columns: int) -> str:
+        """Right-aligned columns like DataFrame.to_string(index=False)"""
+        rows = [[cell.replace('\n', ' ') for cell in self._cells(row, columns)] for row in [header] + body]
+        widths = [max(len(row[c]) for row in rows) for c in range(columns)]
+        return '\n'.join(' '.join(cell.rjust(width) for cell, width in zip(row, widths)) for row in rows)
+    
+    def _table_to_csv(self, header: List[Optional[str]], body: List[List[Optional[str]]], columns: int) -> str:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerows(self._cells(row, columns) for row in [header] + body)
+        return buffer.getvalue()
+    
+    def _extract_image_chunks(self, page, page_num: int, ocr_by_xref: Dict[int, Any],
+                              timings: List[tuple]) -> List[DocumentChunk]:
+        """Extract and OCR image content; ocr_by_xref memoizes OCR results within one document"""
         chunks = []
         image_list = page.get_images()
         
         for img_idx, img in enumerate(image_list):
             try:
-                # Extract image
+                # Images reused across pages (logos, headers) share an xref and are OCR'd once
                 xref = img[0]
-                pix = fitz.Pixmap(page.parent, xref)
+                if xref not in ocr_by_xref:
+                    ocr_by_xref[xref] = self._timed(timings, 'ocr', page_num, self._ocr_xref, page.parent, xref,
+                                                    detail={'xref': xref, 'image_index': img_idx})
+                result = ocr_by_xref[xref]
+                if result is None:
+                    continue
                 
-                if pix.n - pix.alpha < 4:  # GRAY or RGB
-                    img_data = pix.tobytes("png")
-                    image = Image.open(io.BytesIO(img_data))
-                    
-                    # Resize if too large
-                    if image.size[0] > self.config.MAX_IMAGE_SIZE[0] or image.size[1] > self.config.MAX_IMAGE_SIZE[1]:
-                        image.thumbnail(self.config.MAX_IMAGE_SIZE, Image.Resampling.LANCZOS)
-                    
-                    # OCR the image
-                    ocr_text = pytesseract.image_to_string(image)
-                    
-                    if len(ocr_text.strip()) > 20:  # Only if meaningful text found
-                        chunks.append(DocumentChunk(
-                            content=f"IMAGE CONTENT (OCR):\n{ocr_text}",
-                            chunk_type='image',
-                            page_number=page_num + 1,
-                            metadata={
-                                'image_index': img_idx,
-                                'image_size': image.size,
-                                'ocr_confidence': self._get_ocr_confidence(image)
-                            }
-                        ))
-                
-                pix = None
+                ocr_text, confidence, image_size = result
+                if len(ocr_text.strip()) > 20:  # Only if meaningful text found
+                    chunks.append(DocumentChunk(
+                        content=f"IMAGE CONTENT (OCR):\n{ocr_text}",
+                        chunk_type='image',
+                        page_number=page_num + 1,
+                        metadata={
+                            'image_index': img_idx,
+                            'image_size': image_size,
+                            'ocr_confidence': confidence
+                        }
+                    ))
                 
             except Exception as e:
                 self.logger.warning(f"Could not process image {img_idx} on page {page_num}: {e}")
@@ -188,6 +453,36 @@ class PDFProcessor:
         
         return chunks
     
+    def _ocr_xref(self, doc, xref: int) -> Optional[Tuple[str, float, Tuple[int, int]]]:
+        """OCR one embedded image, consulting the persistent cache by content hash first"""
+        import fitz
+        from PIL import Image
+        pix = fitz.Pixmap(doc, xref)
+        if pix.n - pix.alpha >= 4:  # Only GRAY or RGB images are OCR'd
+            return None
+        
+        digest = hashlib.blake2b(pix.samples, digest_size=20)
+        digest.update(f"{pix.width}x{pix.height}x{pix.n}:{self.config.MAX_IMAGE_SIZE}".encode())
+        key = digest.hexdigest()
+        
+        cached = self.ocr_cache.get(key) if self.ocr_cache is not None else None
+        if cached is not None:
+            return cached
+        
+        img_data = pix.tobytes("png")
+        image = Image.open(io.BytesIO(img_data))
+        
+        # Resize if too large
+        if image.size[0] > self.config.MAX_IMAGE_SIZE[0] or image.size[1] > self.config.MAX_IMAGE_SIZE[1]:
+            image.thumbnail(self.config.MAX_IMAGE_SIZE, Image.Resampling.LANCZOS)
+        
+        # OCR the image
+        ocr_text, confidence = self._ocr_image(image)
+        
+        if self.ocr_cache is not None:
+            self.ocr_cache.put(key, ocr_text, confidence, image.size)
+        return ocr_text, confidence, image.size
+    
     def _clean_text(self, text: str) -> str:
         """Clean and normalize text"""
         # Remove excessive whitespace
@@ -196,15 +491,40 @@ class PDFProcessor:
         text = re.sub(r'[^\w\s\.\,\!\?\;\:\-\(\)\"\']+', '', text)
         return text.strip()
     
-    def _table_to_text(self, df: pd.DataFrame) -> str:
+    def _table_to_text(self, df: 'pd.DataFrame') -> str:
         """Convert DataFrame to readable text"""
         return df.to_string(index=False, na_rep='')
     
-    def _get_ocr_confidence(self, image: Image.Image) -> float:
-        """Get OCR confidence score"""
-        try:
-            data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
-            confidences = [int(conf) for conf in data['conf'] if int(conf) > 0]
-            return np.mean(confidences) if confidences else 0.0
-        except:
-            return 0.0
+    def _ocr_image(self, image: 'Image.Image') -> Tuple[str, float]:
+        """Run Tesseract once and return both the recognised text and its mean confidence"""
+        import pytesseract
+        data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+        
+        # Rebuild the text layout: words joined by spaces, lines by newlines, paragraphs by blank lines
+        text = ''
+        previous_line = previous_paragraph = None
+        for i, word in enumerate(data['text']):
+            if not word.strip():
+                continue
+            paragraph = (data['block_num'][i], data['par_num'][i])
+            line = paragraph + (data['line_num'][i],)
+            if previous_line is not None:
+                if paragraph != previous_paragraph:
+                    text += '\n\n'
+                elif line != previous_line:
+                    text += '\n'
+                else:
+                    text += ' '
+            text += word
+            previous_line, previous_paragraph = line, paragraph
+        
+        confidences = [float(conf) for conf in data['conf'] if float(conf) > 0]
+        return text, float(np.mean(confidences)) if confidences else 0.0
+
+
+def _extract_pages_worker(settings: Dict[str, Any], pdf_path: str, page_nums: List[int],
+                          total_pages: int) -> Tuple[List[DocumentChunk], List[tuple]]:
+    """Process-pool entry point: extract one page range in a fresh PDFProcessor, with its stage timings"""
+    timings = []
+    chunks = PDFProcessor(SimpleNamespace(**settings))._extract_pages(pdf_path, page_nums, total_pages, timings)
+    return chunks, timings
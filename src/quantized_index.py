@@ -0,0 +1,85 @@
+# src/quantized_index.py
+import numpy as np
+
+
+class QuantizedIndex:
+    """Contiguous scalar-quantized copy of the embeddings for a compact first-pass scan
+
+    'float16' halves the storage; 'int8' stores each vector as int8 codes times one
+    float32 scale (its largest absolute component / 127), about a quarter of float32.
+    Scores are approximate, so callers rescore the best candidates at full precision.
+    """
+
+    MODES = ('float16', 'int8')
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self, dim: int, mode: str = 'int8', block_rows: int = 1024):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown quantization mode: {mode}")
+        self.dim = dim
+        self.mode = mode
+        self.block_rows = block_rows  # rows widened to float32 at a time while scoring
+        self.count = 0
+
+        dtype = np.int8 if mode == 'int8' else np.float16
+        self._codes = np.zeros((self.INITIAL_CAPACITY, dim), dtype=dtype)
+        self._scales = np.zeros(self.INITIAL_CAPACITY if mode == 'int8' else 0, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def bytes_per_vector(self) -> int:
+        return self._codes.itemsize * self.dim + (self._scales.itemsize if self.mode == 'int8' else 0)
+
+    @property
+    def nbytes(self) -> int:
+        return self.count * self.bytes_per_vector
+
+    def add(self, vectors: np.ndarray):
+        """Append vectors, growing the arrays geometrically"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        needed = self.count + len(vectors)
+        if needed > len(self._codes):
+            capacity = max(needed, 2 * len(self._codes))
+            grown = np.zeros((capacity, self.dim), dtype=self._codes.dtype)
+            grown[:self.count] = self._codes[:self.count]
+            self._codes = grown
+            if self.mode == 'int8':
+                grown = np.zeros(capacity, dtype=np.float32)
+                grown[:self.count] = self._scales[:self.count]
+                self._scales = grown
+
+        if self.mode == 'int8':
+            scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127
+            self._codes[self.count:needed] = np.rint(vectors / scales[:, None]).astype(np.int8)
+            self._scales[self.count:needed] = scales
+        else:
+            self._codes[self.count:needed] = vectors
+        self.count = needed
+
+    def dequantize(self, start: int, end: int) -> np.ndarray:
+        vectors = self._codes[start:end].astype(np.float32)
+        if self.mode == 'int8':
+            vectors *= self._scales[start:end, None]
+        return vectors
+
+    def score(self, query: np.ndarray, rows: int = None) -> np.ndarray:
+        """Approximate similarity of the query to every row, or to the first `rows`"""
+        return self.score_batch(query[None, :], rows)[0]
+
+    def score_batch(self, queries: np.ndarray, rows: int = None) -> np.ndarray:
+        """(queries, rows) approximate similarities, widening one block of codes at a time
+
+        Safe to call while add() runs: growth replaces the arrays after copying the
+        existing rows and bumps the count last, so rows counted before the arrays are read are stable.
+        """
+        rows = self.count if rows is None else min(rows, self.count)
+        codes, scales = self._codes, self._scales
+        scores = np.empty((len(queries), rows), dtype=np.float32)
+        for start in range(0, rows, self.block_rows):
+            end = min(rows, start + self.block_rows)
+            scores[:, start:end] = queries @ codes[start:end].astype(np.float32).T
+        if self.mode == 'int8':
+            scores *= scales[:rows]
+        return scores
@@ -1,12 +1,23 @@
 # src/rag_system.py
 import os
+import time
+import bisect
+import hashlib
 import logging
-from typing import List, Dict, Any
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Iterator, Optional
 from .pdf_processor import PDFProcessor
 # src/rag_system.py - Use simple vector store to avoid ChromaDB + Streamlit issues
 from .simple_vector_store import SimpleVectorStore as VectorStore
 from .retriever import SmartRetriever
 from .llm_handler import LLMHandler
+from .document_registry import DocumentRegistry
+from .segment_store import lock_writer
+from .answer_cache import AnswerCache
+from .ingestion_profile import IngestionProfile
+from .metrics import (registry, query_span, ingest_span, INGEST_STAGE_SECONDS, QUERIES, QUERY_ERRORS, ANSWER_CACHE_LOOKUPS, DOCUMENTS_INGESTED, CHUNKS_INGESTED)
 
 
 class RAGSystem:
@@ -14,93 +25,449 @@ class RAGSystem:
         self.config = config
         self.logger = self._setup_logging()
 
-        # Initialize components
-        self.pdf_processor = PDFProcessor(config)
-        self.vector_store = VectorStore(config)
-        self.retriever = SmartRetriever(self.vector_store, config)
-        self.llm_handler = LLMHandler(config)
+        # The PDF processor, vector store, retriever and LLM handler are built on first use
+        # (see _component), so constructing the system is cheap and a process that only
+        # answers questions never loads the PDF and OCR libraries
+        self._components: Dict[str, Any] = {}
+        self._components_lock = threading.RLock()
+        self._writer_lock = None
+        self.read_only = self._claim_index()
+        self.document_registry = DocumentRegistry(
+            config.VECTOR_STORE_PATH if config.PERSIST_VECTOR_STORE else None)
+        self.answer_cache = AnswerCache(config.ANSWER_CACHE_MAX_ENTRIES, config.ANSWER_CACHE_MAX_BYTES,
+                                        config.ANSWER_CACHE_TTL_SECONDS)
+
+        # Current sizes for /metrics; stage latencies and counters are recorded as requests run.
+        # A scrape must not build the vector store, so it reads 0 until something else has
+        registry.gauge('rag_indexed_chunks', 'Live chunks in the vector store',
+                       lambda: self._built_store_value(lambda store: store.segment_store.snapshot.live_count))
+        registry.gauge('rag_vector_store_version', 'Changes published by the vector store',
+                       lambda: self._built_store_value(lambda store: store.version))
+        registry.gauge('rag_answer_cache_entries', 'Answers in the answer cache',
+                       lambda: self.answer_cache.get_stats()['entries'])
+        registry.gauge('rag_answer_cache_bytes', 'Approximate size of the answer cache',
+                       lambda: self.answer_cache.get_stats()['bytes'])
 
         self.logger.info("RAG System initialized successfully")
 
-    def add_document(self, pdf_path: str) -> Dict[str, Any]:
-        """Add a PDF document to the knowledge base"""
+    def _claim_index(self) -> bool:
+        """Whether this process only reads the index, which INDEX_ROLE "shared" leaves to the writer lock holder"""
+        role = self.config.INDEX_ROLE
+        if role == 'standalone':
+            return False
+        if role != 'shared':
+            raise ValueError(f"Unknown INDEX_ROLE: {role}")
+        if not self.config.PERSIST_VECTOR_STORE:
+            raise ValueError("INDEX_ROLE 'shared' needs PERSIST_VECTOR_STORE")
+        # Kept open for the life of the process; the lock is released when it exits
+        self._writer_lock = lock_writer(self.config.VECTOR_STORE_PATH)
+        read_only = self._writer_lock is None
+        self.logger.info(f"Serving {self.config.VECTOR_STORE_PATH} as the "
+                         f"{'read-only' if read_only else 'writing'} process (pid {os.getpid()})")
+        return read_only
+
+    def _component(self, name: str, build: Callable[[], Any]) -> Any:
+        """The named component, built by build() the first time any thread asks for it"""
+        component = self._components.get(name)
+        if component is None:
+            # Reentrant: building the retriever asks for the vector store
+            with self._components_lock:
+                component = self._components.get(name)
+                if component is None:
+                    start = time.perf_counter()
+                    component = self._components[name] = build()
+                    self.logger.info(f"Initialized {name} in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return component
+
+    def _built_store_value(self, read: Callable[[VectorStore], float]) -> float:
+        store = self._components.get('vector_store')
+        return read(store) if store is not None else 0
+
+    def warm_up(self):
+        """Build everything a question needs (not the PDF processor) and bring the indexes up to date"""
         try:
-            # Extract document name
-            doc_name = os.path.basename(pdf_path).replace('.pdf', '')
+            start = time.perf_counter()
+            self.retriever
+            self.llm_handler
+            self.vector_store.warm_up()
+            self.logger.info(f"Warm-up finished in {(time.perf_counter() - start) * 1000:.0f} ms")
+        except Exception as e:
+            self.logger.error(f"Warm-up failed: {e}")
+
+    @property
+    def pdf_processor(self) -> PDFProcessor:
+        return self._component('pdf_processor', lambda: PDFProcessor(self.config))
+
+    @property
+    def vector_store(self) -> VectorStore:
+        return self._component('vector_store', lambda: VectorStore(self.config, read_only=self.read_only))
 
+    @property
+    def retriever(self) -> SmartRetriever:
+        return self._component('retriever', lambda: SmartRetriever(self.vector_store, self.config))
+
+    @property
+    def llm_handler(self) -> LLMHandler:
+        return self._component('llm_handler', lambda: LLMHandler(self.config))
+
+    def add_document(self, pdf_path: str, progress: Optional[Callable[..., None]] = None) -> Dict[str, Any]:
+        """Add a PDF document to the knowledge base, re-indexing only pages that changed
+
+        progress, if given, is called as progress(pages_done=, total_pages=, chunks_added=)
+        each time a batch of chunks has been stored. The result includes an ingestion
+        profile (see IngestionProfile), also written to INGEST_PROFILE_DIR when that is set,
+        and under page_errors the pages, phases and images that failed to extract and were skipped.
+        """
+        start = time.perf_counter()
+        # Extract document name
+        doc_name = os.path.basename(pdf_path).replace('.pdf', '')
+        profile = IngestionProfile(doc_name, pdf_path)
+        kept_rows = None
+        try:
             self.logger.info(f"Processing document: {doc_name}")
 
-            # Process PDF
-            chunks = self.pdf_processor.extract_content(pdf_path)
+            # Identical bytes were indexed before: nothing to do
+            with ingest_span('hash_file') as span:
+                file_hash = self._hash_file(pdf_path)
+            profile.add_stage('hash_file', span.seconds)
+            indexed_as = self.document_registry.find_by_file_hash(file_hash)
+            if indexed_as is not None:
+                total_pages = len(self.document_registry.get(indexed_as)['page_hashes'])
+                self.logger.info(f"{doc_name} is unchanged (already indexed as {indexed_as}), skipping")
+                DOCUMENTS_INGESTED.inc(status='unchanged')
+                return {
+                    'success': True,
+                    'document_name': indexed_as,
+                    'statistics': self._statistics({}, total_pages, pages_processed=0,
+                                                   chunks_removed=0, duplicate=True),
+                    'profile': self._finish_profile(profile, start)
+                }
+
+            # Compare page fingerprints with the indexed revision to find the pages to redo
+            with ingest_span('page_hashes') as span:
+                page_hashes = self.pdf_processor.page_hashes(pdf_path)
+            profile.add_stage('page_hashes', span.seconds)
+            previous = self.document_registry.get(doc_name)
+            if previous is None:
+                changed_pages = list(range(len(page_hashes)))
+                stale_pages = []
+            else:
+                old_hashes = previous['page_hashes']
+                changed_pages = [i for i, h in enumerate(page_hashes) if i >= len(old_hashes) or old_hashes[i] != h]
+                # Pages that changed or no longer exist lose their old chunks
+                changed = set(changed_pages)
+                stale_pages = [i + 1 for i in range(len(old_hashes)) if i >= len(page_hashes) or i in changed]
 
-            if not chunks:
-                return {'success': False, 'message': 'No content extracted from PDF'}
+            # The chunks of changed pages are replaced, but stay searchable until the new ones are stored.
+            # A document without a registry entry starts clean; a run that died without rolling back
+            # left the registry untouched, so a retry finds its partial chunks among the stale rows too.
+            kept_rows = self.vector_store.document_rows(doc_name)
+            stale_rows = self.vector_store.document_rows(doc_name, None if previous is None else stale_pages)
 
-            # Add to vector store
-            self.vector_store.add_documents(chunks, doc_name)
+            # Process PDF as a stream, embedding and storing fixed-size batches as pages complete
+            chunk_counts = {}
+            batch = []
+            chunks_added = 0
+            chunks = self.pdf_processor.iter_content(pdf_path, changed_pages, profile) if changed_pages else []
+            stream_start = time.perf_counter()
+            store_seconds = 0.0
+            for chunk in chunks:
+                chunk_counts[chunk.chunk_type] = chunk_counts.get(chunk.chunk_type, 0) + 1
+                profile.add_chunk(chunk)
+                batch.append(chunk)
+                if len(batch) >= self.config.INGEST_BATCH_SIZE:
+                    store_seconds += self._add_batch(batch, doc_name, profile)
+                    chunks_added += len(batch)
+                    batch = []
+                    if progress is not None:
+                        # Chunks arrive in page order, so every changed page before this one is finished
+                        pages_done = bisect.bisect_left(changed_pages, chunk.page_number - 1)
+                        progress(pages_done=pages_done, total_pages=len(changed_pages), chunks_added=chunks_added)
+            if batch:
+                store_seconds += self._add_batch(batch, doc_name, profile)
+                chunks_added += len(batch)
+            if progress is not None:
+                progress(pages_done=len(changed_pages), total_pages=len(changed_pages), chunks_added=chunks_added)
+            # Extraction is interleaved with storing; whatever the loop did not spend storing went to extraction
+            extract_seconds = time.perf_counter() - stream_start - store_seconds
+            INGEST_STAGE_SECONDS.observe(extract_seconds, stage='extract')
+            profile.add_stage('extract', extract_seconds)
+            profile.add_stage('embed_store', store_seconds)
+            for chunk_type, count in chunk_counts.items():
+                CHUNKS_INGESTED.inc(count, chunk_type=chunk_type)
+
+            with ingest_span('remove_stale') as span:
+                chunks_removed = self.vector_store.delete_rows(stale_rows)
+            profile.add_stage('remove_stale', span.seconds)
+            if chunks_removed:
+                self.logger.info(f"Removed {chunks_removed} chunks of the previous revision of {doc_name}")
+            kept_rows = None
+            # Cached answers built from the old revision, or while the new pages streamed in, are stale
+            self.answer_cache.invalidate_document(doc_name)
+
+            if previous is None and not chunk_counts:
+                DOCUMENTS_INGESTED.inc(status='empty')
+                return {'success': False, 'message': 'No content extracted from PDF',
+                        'page_errors': profile.errors(), 'profile': self._finish_profile(profile, start)}
+
+            with ingest_span('registry') as span:
+                self.document_registry.put(doc_name, file_hash, page_hashes)
+            profile.add_stage('registry', span.seconds)
 
             # Get statistics
-            stats = {
-                'total_chunks': len(chunks),
-                'text_chunks': len([c for c in chunks if c.chunk_type == 'text']),
-                'table_chunks': len([c for c in chunks if c.chunk_type == 'table']),
-                'image_chunks': len([c for c in chunks if c.chunk_type == 'image'])
-            }
+            stats = self._statistics(chunk_counts, len(page_hashes), pages_processed=len(changed_pages),
+                                     chunks_removed=chunks_removed, duplicate=False)
 
             self.logger.info(f"Successfully added {doc_name}: {stats}")
+            DOCUMENTS_INGESTED.inc(status='indexed')
+            INGEST_STAGE_SECONDS.observe(time.perf_counter() - start, stage='total')
 
             return {
                 'success': True,
                 'document_name': doc_name,
-                'statistics': stats
+                'statistics': stats,
+                'page_errors': profile.errors(),
+                'profile': self._finish_profile(profile, start)
             }
 
         except Exception as e:
             self.logger.error(f"Error processing document {pdf_path}: {e}")
-            return {'success': False, 'message': str(e)}
+            if kept_rows is not None:
+                self._roll_back(doc_name, kept_rows)
+            DOCUMENTS_INGESTED.inc(status='error')
+            return {'success': False, 'message': str(e), 'page_errors': profile.errors(),
+                    'profile': self._finish_profile(profile, start)}
 
-    def query(self, question: str, conversation_history: List[str] = None) -> Dict[str, Any]:
-        """Query the RAG system"""
+    def _roll_back(self, doc_name: str, kept_rows):
+        """Remove the chunks a failed ingestion added, leaving the previous revision searchable"""
         try:
-            self.logger.info(f"Processing query: {question}")
+            added = np.setdiff1d(self.vector_store.document_rows(doc_name), kept_rows)
+            self.vector_store.delete_rows(added)
+            self.answer_cache.invalidate_document(doc_name)
+            self.logger.info(f"Rolled back {len(added)} chunks added for {doc_name}")
+        except Exception as e:
+            self.logger.error(f"Could not roll back the chunks added for {doc_name}: {e}")
 
-            # Retrieve relevant documents
-            retrieval_results = self.retriever.retrieve(
-                question, conversation_history)
+    def _finish_profile(self, profile: IngestionProfile, start: float) -> Dict[str, Any]:
+        """Close the profile, log its slowest pages, persist it if configured and return it as a dict"""
+        profile.add_stage('total', time.perf_counter() - start)
+        self.logger.info(f"Ingestion profile: {profile.describe()}")
+        if self.config.INGEST_PROFILE_DIR:
+            try:
+                self.logger.info(f"Ingestion profile written to {profile.save(self.config.INGEST_PROFILE_DIR)}")
+            except OSError as e:
+                self.logger.error(f"Could not write ingestion profile: {e}")
+        return profile.to_dict()
 
-            if not retrieval_results['results']:
-                return {
-                    'answer': "I couldn't find relevant information in the documents to answer your question.",
-                    'sources_used': 0,
-                    'query_type': retrieval_results['query_type'],
-                    'confidence': 0.0
-                }
+    def _add_batch(self, chunks: List, doc_name: str, profile: Optional[IngestionProfile] = None) -> float:
+        """Embed and store one batch of chunks; returns the seconds it took"""
+        start = time.perf_counter()
+        result = self.vector_store.add_documents(chunks, doc_name)
+        if not result['success']:
+            raise RuntimeError(f"Failed to store chunks: {result['error']}")
+        seconds = time.perf_counter() - start
+        INGEST_STAGE_SECONDS.observe(seconds, stage='embed_store')
+        if profile is not None:
+            profile.add_batch(len(chunks), result['embed_seconds'], result['store_seconds'])
+        return seconds
 
-            # Generate response
-            response = self.llm_handler.generate_response(
-                question,
-                retrieval_results['results'],
-                conversation_history
-            )
-
-            # Add retrieval info
-            response['query_type'] = retrieval_results['query_type']
-            response['retrieval_stats'] = {
-                'total_found': retrieval_results['total_found'],
-                'used_for_generation': len(retrieval_results['results'])
-            }
+    def _statistics(self, chunk_counts: Dict[str, int], total_pages: int, pages_processed: int,
+                    chunks_removed: int, duplicate: bool) -> Dict[str, Any]:
+        """Chunk counts for an ingestion plus how much work the content hashes saved"""
+        return {
+            'total_chunks': sum(chunk_counts.values()),
+            'text_chunks': chunk_counts.get('text', 0),
+            'table_chunks': chunk_counts.get('table', 0),
+            'image_chunks': chunk_counts.get('image', 0),
+            'total_pages': total_pages,
+            'pages_processed': pages_processed,
+            'pages_skipped': total_pages - pages_processed,
+            'chunks_removed': chunks_removed,
+            'duplicate': duplicate
+        }
+
+    def _hash_file(self, path: str) -> str:
+        """SHA-256 of the file contents"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def query(self, question: str, conversation_history: List[str] = None,
+              filters: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Query the RAG system; filters restrict retrieval (see SmartRetriever.retrieve)"""
+        QUERIES.inc(mode='query')
+        try:
+            with query_span('total'):
+                self.logger.info(f"Processing query: {question}")
+
+                # Retrieve relevant documents
+                with query_span('retrieve'):
+                    retrieval_results = self.retriever.retrieve(
+                        question, conversation_history, filters)
 
-            return response
+                return self._answer(question, conversation_history, retrieval_results)
 
         except Exception as e:
             self.logger.error(f"Error processing query: {e}")
+            QUERY_ERRORS.inc(mode='query')
+            return self._error_response()
+
+    def query_batch(self, questions: List[str], conversation_histories: List[List[str]] = None,
+                    filters: Dict[str, Any] = None, max_workers: int = None) -> List[Dict[str, Any]]:
+        """query() for many questions, returning the responses in input order
+
+        Retrieval embeds all questions together and scores them in batches; the LLM
+        calls then run concurrently, at most max_workers (default LLM_CONCURRENCY) at once.
+        """
+        conversation_histories = conversation_histories or [None] * len(questions)
+        QUERIES.inc(len(questions), mode='batch')
+        try:
+            self.logger.info(f"Processing batch of {len(questions)} queries")
+            with query_span('retrieve_batch'):
+                retrievals = self.retriever.retrieve_batch(questions, conversation_histories, filters)
+        except Exception as e:
+            self.logger.error(f"Error processing query batch: {e}")
+            QUERY_ERRORS.inc(len(questions), mode='batch')
+            return [self._error_response() for _ in questions]
+
+        def answer(args):
+            try:
+                return self._answer(*args)
+            except Exception as e:
+                self.logger.error(f"Error processing query: {e}")
+                QUERY_ERRORS.inc(mode='batch')
+                return self._error_response()
+
+        with ThreadPoolExecutor(max_workers=max_workers or self.config.LLM_CONCURRENCY) as executor:
+            return list(executor.map(answer, zip(questions, conversation_histories, retrievals)))
+
+    def _answer(self, question: str, conversation_history: List[str],
+                retrieval_results: Dict[str, Any]) -> Dict[str, Any]:
+        """Generate (or reuse) the answer for a question from its retrieval results"""
+        if not retrieval_results['results']:
             return {
-                'answer': "I encountered an error while processing your question. Please try again.",
+                'answer': "I couldn't find relevant information in the documents to answer your question.",
                 'sources_used': 0,
-                'query_type': 'error',
+                'query_type': retrieval_results['query_type'],
                 'confidence': 0.0
             }
 
+        # Reuse the answer if the same question was already answered from the same chunks, in the same order
+        with query_span('answer_cache'):
+            cache_key = self._answer_cache_key(question, retrieval_results['results'], conversation_history)
+            response = self.answer_cache.get(cache_key)
+        ANSWER_CACHE_LOOKUPS.inc(result='miss' if response is None else 'hit')
+        if response is None:
+            # Generate response
+            with query_span('generate'):
+                response = self.llm_handler.generate_response(
+                    question,
+                    retrieval_results['results'],
+                    conversation_history
+                )
+            if response.get('error') is False:
+                self.answer_cache.put(cache_key, response, self._source_documents(retrieval_results['results']))
+            response['cached'] = False
+        else:
+            response['cached'] = True
+
+        # Add retrieval info
+        response['query_type'] = retrieval_results['query_type']
+        response['retrieval_stats'] = {
+            'total_found': retrieval_results['total_found'],
+            'used_for_generation': response.get('sources_used', len(retrieval_results['results']))
+        }
+
+        return response
+
+    def _error_response(self) -> Dict[str, Any]:
+        return {
+            'answer': "I encountered an error while processing your question. Please try again.",
+            'sources_used': 0,
+            'query_type': 'error',
+            'confidence': 0.0
+        }
+
+    def query_stream(self, question: str, conversation_history: List[str] = None,
+                     filters: Dict[str, Any] = None) -> Iterator[Dict[str, Any]]:
+        """Query the RAG system, streaming the answer
+
+        Yields a 'metadata' event with the retrieval results (sources used, query type,
+        confidence) before generation starts, then the LLM's 'token' events and a final
+        'done' event with the complete answer.
+        """
+        QUERIES.inc(mode='stream')
+        try:
+            self.logger.info(f"Processing streaming query: {question}")
+
+            with query_span('retrieve'):
+                retrieval_results = self.retriever.retrieve(
+                    question, conversation_history, filters)
+            context_docs = retrieval_results['results']
+            # Packed once, here: the metadata describes the sources the prompt will hold, which can be
+            # fewer than were retrieved, and the same packed context goes into the prompt below
+            with query_span('pack_context'):
+                context = self.llm_handler.prepare_context(context_docs)
+
+            yield {
+                'type': 'metadata',
+                'sources_used': context['sources_used'],
+                'query_type': retrieval_results['query_type'],
+                'confidence': context['confidence'],
+                'context_types': context['context_types'],
+                'retrieval_stats': {
+                    'total_found': retrieval_results['total_found'],
+                    'used_for_generation': context['sources_used']
+                }
+            }
+
+            if not context_docs:
+                answer = "I couldn't find relevant information in the documents to answer your question."
+                yield {'type': 'token', 'content': answer}
+                yield {'type': 'done', 'answer': answer, 'sources_used': 0, 'confidence': 0.0,
+                       'query_type': retrieval_results['query_type'], 'error': False}
+                return
+
+            with query_span('answer_cache'):
+                cache_key = self._answer_cache_key(question, context_docs, conversation_history)
+                cached = self.answer_cache.get(cache_key)
+            ANSWER_CACHE_LOOKUPS.inc(result='miss' if cached is None else 'hit')
+            if cached is not None:
+                yield {'type': 'token', 'content': cached['answer']}
+                yield dict(cached, type='done', query_type=retrieval_results['query_type'], cached=True)
+                return
+
+            for event in self.llm_handler.stream_response(question, context_docs, conversation_history,
+                                                          context=context):
+                if event['type'] == 'done':
+                    if event['error'] is False:
+                        self.answer_cache.put(cache_key, {k: v for k, v in event.items() if k != 'type'},
+                                              self._source_documents(context_docs))
+                    event['query_type'] = retrieval_results['query_type']
+                    event['cached'] = False
+                yield event
+
+        except Exception as e:
+            self.logger.error(f"Error processing streaming query: {e}")
+            QUERY_ERRORS.inc(mode='stream')
+            answer = "I encountered an error while processing your question. Please try again."
+            yield {'type': 'error', 'message': answer}
+            yield {'type': 'done', 'answer': answer, 'sources_used': 0, 'confidence': 0.0,
+                   'query_type': 'error', 'error': True}
+
+    def _answer_cache_key(self, question: str, context_docs: List[Dict[str, Any]],
+                          conversation_history: List[str] = None) -> str:
+        return self.answer_cache.make_key(
+            question,
+            [doc['id'] for doc in context_docs],
+            self.llm_handler._build_conversation_context(conversation_history),
+            dict(self.llm_handler.generation_settings, context_token_budget=self.config.CONTEXT_TOKEN_BUDGET))
+
+    def _source_documents(self, context_docs: List[Dict[str, Any]]) -> List[str]:
+        return [doc['metadata']['document_name'] for doc in context_docs]
+
     def get_system_stats(self) -> Dict[str, Any]:
         """Get system statistics"""
         try:
@@ -110,7 +477,8 @@ class RAGSystem:
                 'models': {
                     'embedding_model': self.config.EMBEDDING_MODEL,
                     'llm_model': self.config.LLM_MODEL
-                }
+                },
+                'answer_cache': self.answer_cache.get_stats()
             }
         except Exception as e:
             self.logger.error(f"Error getting stats: {e}")
@@ -118,7 +486,9 @@ class RAGSystem:
 
     def clear_conversation_history(self):
         """Clear conversation history"""
-        self.llm_handler.clear_history()
+        # Nothing to clear, and no reason to load the LLM client, before the first question
+        if 'llm_handler' in self._components:
+            self.llm_handler.clear_history()
 
     def _setup_logging(self):
         """Setup logging configuration"""
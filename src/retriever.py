@@ -3,40 +3,118 @@ from typing import List, Dict, Any, Tuple
 import re
 import numpy as np
 from collections import defaultdict
+from .metrics import query_span
 
 class SmartRetriever:
     def __init__(self, vector_store, config):
         self.vector_store = vector_store
         self.config = config
         
-    def retrieve(self, query: str, context_history: List[str] = None) -> Dict[str, Any]:
-        """Intelligent retrieval with context awareness"""
+    # Multipliers on the similarity of chunk types that match the kind of question
+    TYPE_BOOSTS = {
+        'table': {'table': 1.2},
+        'image': {'image': 1.2},
+    }
+    
+    def retrieve(self, query: str, context_history: List[str] = None,
+                 filters: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Intelligent retrieval with context awareness
+        
+        filters (chunk_type, document_name, page_range) are passed to the vector store,
+        which applies them together with the query-type boosts before selecting the top k.
+        """
         
         # Enhance query with context if available
-        enhanced_query = self._enhance_query_with_context(query, context_history)
+        with query_span('enhance_query'):
+            enhanced_query = self._enhance_query_with_context(query, context_history)
         
         # Detect query type
         query_type = self._detect_query_type(query)
-        
-        # Perform search
-        search_results = self.vector_store.search(
-            enhanced_query, 
-            n_results=self.config.TOP_K_RESULTS * 2  # Get more for filtering
-        )
-        
-        # Filter and rank results based on query type
-        filtered_results = self._filter_by_query_type(search_results, query_type)
-        
-        # Re-rank results
-        ranked_results = self._rerank_results(filtered_results, query, query_type)
+        boosts = self.TYPE_BOOSTS.get(query_type)
+        
+        # Hybrid mode fuses two lists, which works better with a few more results from each
+        hybrid = self.config.RETRIEVAL_MODE == 'hybrid'
+        depth = self.config.TOP_K_RESULTS * 2 if hybrid else self.config.TOP_K_RESULTS
+        
+        # Perform search; filtering and boosting happen inside the store's scoring
+        with query_span('vector_search'):
+            search_results = self.vector_store.search(
+                enhanced_query, 
+                n_results=depth,
+                filters=filters,
+                boosts=boosts
+            )
+        
+        return self._finish_retrieval(query, query_type, search_results, depth, filters)
+    
+    def retrieve_batch(self, queries: List[str], context_histories: List[List[str]] = None,
+                       filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """retrieve() for many queries, in input order, with one batched vector search per query type"""
+        context_histories = context_histories or [None] * len(queries)
+        enhanced_queries = [self._enhance_query_with_context(q, h) for q, h in zip(queries, context_histories)]
+        query_types = [self._detect_query_type(q) for q in queries]
+        
+        hybrid = self.config.RETRIEVAL_MODE == 'hybrid'
+        depth = self.config.TOP_K_RESULTS * 2 if hybrid else self.config.TOP_K_RESULTS
+        
+        # Queries of one type share their boosts, so each type is a single batch
+        by_type = defaultdict(list)
+        for i, query_type in enumerate(query_types):
+            by_type[query_type].append(i)
+        
+        search_results = [None] * len(queries)
+        for query_type, indices in by_type.items():
+            with query_span('vector_search_batch'):
+                batch = self.vector_store.search_batch(
+                    [enhanced_queries[i] for i in indices],
+                    n_results=depth,
+                    filters=filters,
+                    boosts=self.TYPE_BOOSTS.get(query_type)
+                )
+            for i, results in zip(indices, batch):
+                search_results[i] = results
+        
+        return [self._finish_retrieval(query, query_type, results, depth, filters)
+                for query, query_type, results in zip(queries, query_types, search_results)]
+    
+    def _finish_retrieval(self, query: str, query_type: str, search_results: Dict[str, Any],
+                          depth: int, filters: Dict[str, Any] = None) -> Dict[str, Any]:
+        ranked_results = self._to_results(search_results)
+        
+        # Hybrid mode: fuse with BM25 matches on the question itself, which catch exact
+        # terms like part numbers that the hashed vectors miss
+        if self.config.RETRIEVAL_MODE == 'hybrid':
+            with query_span('keyword_search'):
+                keyword_results = self.vector_store.keyword_search(
+                    query, n_results=depth, filters=filters, boosts=self.TYPE_BOOSTS.get(query_type))
+            with query_span('fuse'):
+                ranked_results = self._fuse_results([ranked_results, self._to_results(keyword_results)])
         
         return {
             'query': query,
             'query_type': query_type,
             'results': ranked_results[:self.config.TOP_K_RESULTS],
-            'total_found': len(search_results['documents'])
+            'total_found': len(ranked_results)
         }
     
+    def _to_results(self, search_results: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Result dicts in the store's order; the store's distances already include any boosts"""
+        return [
+            {'id': chunk_id, 'content': doc, 'metadata': meta, 'score': 1 - dist, 'distance': dist}
+            for chunk_id, doc, meta, dist in zip(search_results['ids'], search_results['documents'],
+                                                 search_results['metadatas'], search_results['distances'])
+        ]
+    
+    def _fuse_results(self, ranked_lists: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Reciprocal rank fusion: order results by the sum of 1 / (RRF_K + rank) over the lists"""
+        fused = {}
+        for ranked in ranked_lists:
+            for rank, result in enumerate(ranked, 1):
+                entry = fused.setdefault(result['id'], dict(result, fusion_score=0.0))
+                entry['fusion_score'] += 1.0 / (self.config.RRF_K + rank)
+        
+        return sorted(fused.values(), key=lambda x: x['fusion_score'], reverse=True)
+    
     def _enhance_query_with_context(self, query: str, context_history: List[str]) -> str:
         """Enhance query with conversation context"""
         if not context_history:
@@ -67,70 +145,3 @@ class SmartRetriever:
             return 'conceptual'
         
         return 'general'
-    
-    def _filter_by_query_type(self, search_results: Dict[str, Any], query_type: str) -> Dict[str, Any]:
-        """Filter results based on query type"""
-        if query_type == 'general':
-            return search_results
-        
-        filtered_docs = []
-        filtered_metadata = []
-        filtered_distances = []
-        
-        for doc, meta, dist in zip(search_results['documents'], 
-                                  search_results['metadatas'], 
-                                  search_results['distances']):
-            
-            # Boost relevance for matching content types
-            if query_type == 'table' and meta['chunk_type'] == 'table':
-                filtered_docs.append(doc)
-                filtered_metadata.append(meta)
-                filtered_distances.append(dist * 0.8)  # Boost relevance
-            elif query_type == 'image' and meta['chunk_type'] == 'image':
-                filtered_docs.append(doc)
-                filtered_metadata.append(meta)
-                filtered_distances.append(dist * 0.8)
-            elif query_type in ['factual', 'conceptual'] and meta['chunk_type'] == 'text':
-                filtered_docs.append(doc)
-                filtered_metadata.append(meta)
-                filtered_distances.append(dist)
-            else:
-                # Include all types but with original distance
-                filtered_docs.append(doc)
-                filtered_metadata.append(meta)
-                filtered_distances.append(dist)
-        
-        return {
-            'documents': filtered_docs,
-            'metadatas': filtered_metadata,
-            'distances': filtered_distances
-        }
-    
-    def _rerank_results(self, results: Dict[str, Any], query: str, query_type: str) -> List[Dict[str, Any]]:
-        """Re-rank results based on additional criteria"""
-        ranked_results = []
-        
-        for doc, meta, dist in zip(results['documents'], results['metadatas'], results['distances']):
-            score = 1 - dist  # Convert distance to similarity score
-            
-            # Boost score based on content relevance
-            if query_type == 'table' and meta['chunk_type'] == 'table':
-                score *= 1.2
-            elif query_type == 'image' and meta['chunk_type'] == 'image':
-                score *= 1.2
-            
-            # Boost based on content length for conceptual queries
-            if query_type == 'conceptual' and meta.get('word_count', 0) > 100:
-                score *= 1.1
-            
-            ranked_results.append({
-                'content': doc,
-                'metadata': meta,
-                'score': score,
-                'distance': dist
-            })
-        
-        # Sort by score (descending)
-        ranked_results.sort(key=lambda x: x['score'], reverse=True)
-        
-        return ranked_results
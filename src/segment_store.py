@@ -0,0 +1,584 @@
+# src/segment_store.py
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Callable
+
+import numpy as np
+
+# Per-row columns kept next to the embeddings so rows can be selected without reading their records
+COLUMNS = {
+    'document': np.int32,  # index into SegmentStore.documents
+    'page': np.int32,
+    'type': np.int8,  # index into CHUNK_TYPES
+}
+
+CHUNK_TYPES = ('text', 'table', 'image')
+
+
+def chunk_type_code(chunk_type: str) -> int:
+    """Code stored in the 'type' column; unknown types share the code after the known ones"""
+    return CHUNK_TYPES.index(chunk_type) if chunk_type in CHUNK_TYPES else len(CHUNK_TYPES)
+
+
+# How to rebuild a column from the records of a segment written before the column existed
+COLUMNS_FROM_RECORDS = {
+    'type': lambda record: chunk_type_code(record['metadata'].get('chunk_type', 'text')),
+}
+
+
+# Held by the one process allowed to write a store that several processes serve (see lock_writer)
+WRITER_LOCK_FILE = 'writer.lock'
+
+
+def lock_writer(path: str):
+    """Take the writer lock of the store at path without waiting
+
+    Returns the open lock file, to be kept for as long as the process writes, or None
+    when another process holds the lock. The lock goes away with the file or process,
+    so a restarted worker can take over from one that died. POSIX only (fcntl).
+    """
+    import fcntl
+    os.makedirs(path, exist_ok=True)
+    lock_file = open(os.path.join(path, WRITER_LOCK_FILE), 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+class SegmentView:
+    """The first `count` rows of a segment as they were when the view was taken
+
+    Segments only ever append, and their arrays are replaced rather than resized when
+    they grow, so a view stays valid and unchanged while the segment keeps growing.
+    """
+
+    def __init__(self, count: int, embeddings: Optional[np.ndarray], columns: Dict[str, np.ndarray],
+                 read_record: Callable[[int], Dict[str, Any]]):
+        self.count = count
+        self.embeddings = embeddings  # None when the segment keeps no full-precision embeddings
+        self.columns = columns
+        self.record = read_record
+
+
+class MemorySegment:
+    """Growable in-memory segment backing a store that is not persisted"""
+
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self, dim: int, keep_embeddings: bool = True):
+        self.dim = dim
+        self.count = 0
+        self.keep_embeddings = keep_embeddings
+
+        # Contiguous arrays; only the first `count` rows are in use
+        self._matrix = np.zeros((self.INITIAL_CAPACITY if keep_embeddings else 0, dim), dtype=np.float32)
+        self._columns = {name: np.zeros(self.INITIAL_CAPACITY, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self._records = []
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        if not self.keep_embeddings:
+            raise RuntimeError("This segment does not keep full-precision embeddings")
+        return self._matrix[:self.count]
+
+    def column(self, name: str) -> np.ndarray:
+        return self._columns[name][:self.count]
+
+    def record(self, index: int) -> Dict[str, Any]:
+        return self._records[index]
+
+    def append(self, embeddings: np.ndarray, records: List[Dict[str, Any]], columns: Dict[str, np.ndarray]):
+        """Append rows, growing the arrays geometrically"""
+        needed = self.count + len(records)
+        if needed > len(self._columns['page']):
+            capacity = max(needed, 2 * len(self._columns['page']))
+            if self.keep_embeddings:
+                grown = np.zeros((capacity, self.dim), dtype=np.float32)
+                grown[:self.count] = self._matrix[:self.count]
+                self._matrix = grown
+            for name, values in self._columns.items():
+                grown = np.zeros(capacity, dtype=values.dtype)
+                grown[:self.count] = values[:self.count]
+                self._columns[name] = grown
+
+        if self.keep_embeddings:
+            self._matrix[self.count:needed] = embeddings
+        for name, values in columns.items():
+            self._columns[name][self.count:needed] = values
+        self._records.extend(records)
+        self.count = needed
+
+    def view(self) -> SegmentView:
+        count = self.count
+        return SegmentView(count, self._matrix[:count] if self.keep_embeddings else None,
+                           {name: values[:count] for name, values in self._columns.items()},
+                           self._records.__getitem__)
+
+
+class Segment:
+    """Append-only run of chunks on disk: raw float32 embeddings plus an offset-indexed record file"""
+
+    EMBEDDINGS_FILE = 'embeddings.f32'
+    RECORDS_FILE = 'records.jsonl'
+    OFFSETS_FILE = 'offsets.i64'
+
+    def __init__(self, path: str, dim: int, count: int = 0):
+        self.path = path
+        self.dim = dim
+        self.count = count
+
+        # Memory maps are opened on first access, not at startup
+        self._embeddings = None
+        self._columns = {}
+        self._offsets = None
+        self._records = None
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @staticmethod
+    def _column_file(name: str) -> str:
+        return f"{name}.col"
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """Memory-mapped (count, dim) embedding matrix"""
+        if self._embeddings is None:
+            if self.count == 0:
+                self._embeddings = np.zeros((0, self.dim), dtype=np.float32)
+            else:
+                self._embeddings = np.memmap(self._file(self.EMBEDDINGS_FILE), dtype=np.float32,
+                                             mode='r', shape=(self.count, self.dim))
+        return self._embeddings
+
+    def column(self, name: str) -> np.ndarray:
+        """Memory-mapped per-row column"""
+        if name not in self._columns:
+            if self.count == 0:
+                self._columns[name] = np.zeros(0, dtype=COLUMNS[name])
+            else:
+                self._columns[name] = np.memmap(self._file(self._column_file(name)), dtype=COLUMNS[name],
+                                                mode='r', shape=(self.count,))
+        return self._columns[name]
+
+    def _map_records(self):
+        if self._offsets is None:
+            self._offsets = np.memmap(self._file(self.OFFSETS_FILE), dtype=np.int64,
+                                      mode='r', shape=(self.count + 1,))
+            if self._offsets[-1] > 0:
+                self._records = np.memmap(self._file(self.RECORDS_FILE), dtype=np.uint8,
+                                          mode='r', shape=(int(self._offsets[-1]),))
+
+    def record(self, index: int) -> Dict[str, Any]:
+        """Read one stored record: id, document text and metadata"""
+        self._map_records()
+        start, end = int(self._offsets[index]), int(self._offsets[index + 1])
+        return json.loads(bytes(self._records[start:end]))
+
+    def view(self) -> SegmentView:
+        """View over memory maps of the committed rows; append() maps the files afresh instead of changing these"""
+        self._map_records()
+        offsets, records = self._offsets, self._records
+
+        def read_record(index: int) -> Dict[str, Any]:
+            start, end = int(offsets[index]), int(offsets[index + 1])
+            return json.loads(bytes(records[start:end]))
+
+        return SegmentView(self.count, self.embeddings, {name: self.column(name) for name in COLUMNS}, read_record)
+
+    def create(self):
+        """Create the empty files of a new segment"""
+        os.makedirs(self.path, exist_ok=True)
+        open(self._file(self.EMBEDDINGS_FILE), 'wb').close()
+        open(self._file(self.RECORDS_FILE), 'wb').close()
+        for name in COLUMNS:
+            open(self._file(self._column_file(name)), 'wb').close()
+        np.zeros(1, dtype=np.int64).tofile(self._file(self.OFFSETS_FILE))
+
+    def backfill_columns(self):
+        """Write column files missing from a segment created by an older version"""
+        for name, derive in COLUMNS_FROM_RECORDS.items():
+            if not os.path.exists(self._file(self._column_file(name))):
+                values = np.array([derive(self.record(i)) for i in range(self.count)], dtype=COLUMNS[name])
+                # Written aside and renamed so an interrupted backfill is simply redone
+                tmp_name = self._column_file(name) + '.tmp'
+                open(self._file(tmp_name), 'wb').close()
+                self._write(tmp_name, values.tobytes())
+                os.replace(self._file(tmp_name), self._file(self._column_file(name)))
+
+    def repair(self):
+        """Drop bytes written after the last committed row, e.g. by an interrupted append"""
+        offsets = np.fromfile(self._file(self.OFFSETS_FILE), dtype=np.int64, count=self.count + 1)
+        sizes = {
+            self.EMBEDDINGS_FILE: self.count * self.dim * 4,
+            self.OFFSETS_FILE: (self.count + 1) * 8,
+            self.RECORDS_FILE: int(offsets[-1]),
+        }
+        for name, dtype in COLUMNS.items():
+            sizes[self._column_file(name)] = self.count * np.dtype(dtype).itemsize
+        for name, size in sizes.items():
+            if os.path.getsize(self._file(name)) > size:
+                os.truncate(self._file(name), size)
+
+    def _write(self, name: str, data: bytes):
+        with open(self._file(name), 'ab') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def append(self, embeddings: np.ndarray, records: List[Dict[str, Any]], columns: Dict[str, np.ndarray]):
+        """Append rows to the segment files; the caller commits them through the manifest"""
+        encoded = [json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n' for record in records]
+        end = os.path.getsize(self._file(self.RECORDS_FILE))
+        offsets = end + np.cumsum([len(line) for line in encoded], dtype=np.int64)
+
+        self._write(self.EMBEDDINGS_FILE, np.ascontiguousarray(embeddings, dtype=np.float32).tobytes())
+        for name, dtype in COLUMNS.items():
+            self._write(self._column_file(name), np.asarray(columns[name], dtype=dtype).tobytes())
+        self._write(self.RECORDS_FILE, b''.join(encoded))
+        self._write(self.OFFSETS_FILE, offsets.tobytes())
+
+        self.count += len(records)
+        self._embeddings = None
+        self._columns = {}
+        self._offsets = None
+        self._records = None
+
+
+class StoreSnapshot:
+    """Read-only state of a SegmentStore at one version
+
+    Readers take the published snapshot once and use nothing else, so an append or delete
+    that publishes the next snapshot meanwhile never changes what an in-flight search sees.
+    """
+
+    def __init__(self, version: int, dim: int, views: List[SegmentView], deleted: np.ndarray, deleted_count: int):
+        self.version = version
+        self.dim = dim
+        self.views = views
+        self.deleted = deleted
+        self.starts = []
+        total = 0
+        for view in views:
+            self.starts.append(total)
+            total += view.count
+        self.total = total
+        self.live_count = total - deleted_count
+        self._columns = {}
+
+    @property
+    def keeps_embeddings(self) -> bool:
+        return all(view.embeddings is not None for view in self.views)
+
+    def record(self, index: int) -> Dict[str, Any]:
+        seg = bisect.bisect_right(self.starts, index) - 1
+        return self.views[seg].record(index - self.starts[seg])
+
+    def embeddings_at(self, indices: np.ndarray) -> np.ndarray:
+        """Embeddings of the given global rows"""
+        indices = np.asarray(indices, dtype=np.int64)
+        starts = np.array(self.starts, dtype=np.int64)
+        owners = np.searchsorted(starts, indices, side='right') - 1
+        result = np.empty((len(indices), self.dim), dtype=np.float32)
+        for seg in np.unique(owners):
+            mask = owners == seg
+            result[mask] = self.views[seg].embeddings[indices[mask] - starts[seg]]
+        return result
+
+    def column(self, name: str) -> np.ndarray:
+        """A per-row column over all segments, in global row order; built once per snapshot"""
+        if name not in self._columns:
+            self._columns[name] = np.concatenate([view.columns[name] for view in self.views]
+                                                 + [np.zeros(0, COLUMNS[name])])
+        return self._columns[name]
+
+
+class SegmentStore:
+    """Vector index made of append-only segments, memory-mapped from disk or held in memory
+
+    Rows are addressed by a global index that never changes; deleted rows are only
+    marked in a tombstone mask and skipped by readers. Every change publishes a new
+    StoreSnapshot; callers serialize changes themselves, reads need no lock.
+
+    A read_only store maps the files another process writes: taking the snapshot
+    re-reads the manifest and the new tombstones, at most every refresh_seconds, and
+    publishes what that process has committed since.
+    """
+
+    MANIFEST_FILE = 'manifest.json'
+    TOMBSTONES_FILE = 'tombstones.i64'
+
+    def __init__(self, path: Optional[str], dim: int, max_segment_chunks: int = 100_000,
+                 keep_embeddings: bool = True, read_only: bool = False, refresh_seconds: float = 1.0):
+        self.path = path
+        self.dim = dim
+        self.max_segment_chunks = max_segment_chunks
+        self.read_only = read_only
+        self.refresh_seconds = refresh_seconds
+        self.logger = logging.getLogger(__name__)
+        self.segments = []
+        self.documents: List[str] = []
+        self._document_codes: Dict[str, int] = {}
+        self._deleted = np.zeros(0, dtype=bool)
+        self._deleted_count = 0
+
+        # What a read-only store has read of the writer's files so far
+        self._manifest_key = None
+        self._tombstones_read = 0
+        self._pending_deletes = np.zeros(0, dtype=np.int64)
+        self._next_refresh = 0.0
+        self._refresh_lock = threading.Lock()
+
+        # Bumped by every append or delete so readers can tell when cached results are stale
+        self.version = 0
+
+        if path is None:
+            if read_only:
+                raise ValueError("A read-only vector store needs a path to read from")
+            # An in-memory store may drop full-precision embeddings when a compact copy is kept elsewhere
+            self.segments = [MemorySegment(dim, keep_embeddings)]
+            self.publish()
+            return
+
+        os.makedirs(path, exist_ok=True)
+        self._read_manifest()
+        if not read_only:
+            # The writer's files are only ever fixed up by the writer
+            for segment in self.segments:
+                segment.backfill_columns()
+            if self.segments:
+                self.segments[-1].repair()
+        self._read_tombstones()
+        self.publish()
+        self._next_refresh = time.monotonic() + refresh_seconds
+
+        self.logger.info(f"Opened vector store at {path}{' read-only' if read_only else ''}: "
+                         f"{len(self.segments)} segments, {self.total} chunks")
+
+    @property
+    def snapshot(self) -> StoreSnapshot:
+        """The latest published state; replaced, never modified, by appends and deletes"""
+        if self.read_only and time.monotonic() >= self._next_refresh:
+            self.refresh()
+        return self._snapshot
+
+    def refresh(self) -> bool:
+        """Publish the rows and deletions the writing process committed since the last refresh
+
+        Returns whether anything changed. Threads that find a refresh in progress do not
+        wait for it and keep using the current snapshot.
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            self._next_refresh = time.monotonic() + self.refresh_seconds
+            # Manifest first: every tombstone refers to rows of an already written manifest
+            changed = self._read_manifest()
+            changed = self._read_tombstones() or changed
+            if changed:
+                self.version += 1
+                self.publish()
+            return changed
+        finally:
+            self._refresh_lock.release()
+
+    def _read_manifest(self) -> bool:
+        """Load the committed segments and documents, unless the manifest is unchanged since the last read"""
+        try:
+            with open(os.path.join(self.path, self.MANIFEST_FILE)) as f:
+                stat = os.fstat(f.fileno())
+                # The manifest is replaced, never rewritten in place, so a new inode means new content
+                key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+                if key == self._manifest_key:
+                    return False
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return False
+        if manifest['dim'] != self.dim:
+            raise ValueError(f"Vector store at {self.path} has dimension {manifest['dim']}, expected {self.dim}")
+
+        # A new list of new Segment objects for the segments that grew, so threads still
+        # reading the old ones are not affected
+        segments = []
+        for i, entry in enumerate(manifest['segments']):
+            if i < len(self.segments) and self.segments[i].count == entry['count']:
+                segments.append(self.segments[i])
+            else:
+                segments.append(Segment(os.path.join(self.path, entry['name']), self.dim, entry['count']))
+        self.segments = segments
+        self._document_codes = {name: code for code, name in enumerate(manifest['documents'])}
+        self.documents = manifest['documents']
+        self._manifest_key = key
+        return True
+
+    def _read_tombstones(self) -> bool:
+        """Mark the rows tombstoned since the last read; False if there were none"""
+        try:
+            with open(os.path.join(self.path, self.TOMBSTONES_FILE), 'rb') as f:
+                f.seek(self._tombstones_read)
+                data = f.read()
+        except FileNotFoundError:
+            return False
+        data = data[:len(data) - len(data) % 8]  # an id still being written
+        if not data:
+            return False
+        self._tombstones_read += len(data)
+        # A read-only store may see deletions of rows whose manifest it has not read yet
+        indices = np.concatenate([self._pending_deletes, np.frombuffer(data, dtype=np.int64)])
+        if self.read_only:
+            self._pending_deletes = indices[indices >= self.total]
+        self._mark_deleted(indices)
+        return True
+
+    def publish(self):
+        """Make every change so far visible to readers in one step"""
+        self._snapshot = StoreSnapshot(self.version, self.dim, [segment.view() for segment in self.segments],
+                                       self.deleted, self._deleted_count)
+
+    @property
+    def persistent(self) -> bool:
+        return self.path is not None
+
+    @property
+    def keeps_embeddings(self) -> bool:
+        """Whether full-precision embeddings can be read back (always true on disk)"""
+        return self.persistent or self.segments[0].keep_embeddings
+
+    @property
+    def total(self) -> int:
+        """Number of rows ever stored, including deleted ones"""
+        return sum(segment.count for segment in self.segments)
+
+    @property
+    def deleted(self) -> np.ndarray:
+        """Boolean tombstone mask over all rows"""
+        total = self.total
+        if len(self._deleted) < total:
+            # Over-allocate so appends do not reallocate the mask on every call
+            grown = np.zeros(max(total, 2 * len(self._deleted)), dtype=bool)
+            grown[:len(self._deleted)] = self._deleted
+            self._deleted = grown
+        return self._deleted[:total]
+
+    @property
+    def live_count(self) -> int:
+        return self.total - self._deleted_count
+
+    def _starts(self) -> List[int]:
+        starts, total = [], 0
+        for segment in self.segments:
+            starts.append(total)
+            total += segment.count
+        return starts
+
+    def record(self, index: int) -> Dict[str, Any]:
+        """Read the record at a global row index"""
+        starts = self._starts()
+        seg = bisect.bisect_right(starts, index) - 1
+        return self.segments[seg].record(index - starts[seg])
+
+    def embeddings_at(self, indices: np.ndarray) -> np.ndarray:
+        """Embeddings of the given global rows"""
+        indices = np.asarray(indices, dtype=np.int64)
+        starts = np.array(self._starts(), dtype=np.int64)
+        owners = np.searchsorted(starts, indices, side='right') - 1
+        result = np.empty((len(indices), self.dim), dtype=np.float32)
+        for seg in np.unique(owners):
+            mask = owners == seg
+            result[mask] = self.segments[seg].embeddings[indices[mask] - starts[seg]]
+        return result
+
+    def column(self, name: str) -> np.ndarray:
+        """A per-row column over all segments, in global row order"""
+        return np.concatenate([segment.column(name) for segment in self.segments] + [np.zeros(0, COLUMNS[name])])
+
+    def document_code(self, name: str, create: bool = False) -> Optional[int]:
+        """Integer code stored in the 'document' column for a document name"""
+        code = self._document_codes.get(name)
+        if code is None and create:
+            code = len(self.documents)
+            self.documents.append(name)
+            self._document_codes[name] = code
+        return code
+
+    def append(self, embeddings: np.ndarray, records: List[Dict[str, Any]], columns: Dict[str, np.ndarray],
+               publish: bool = True):
+        """Append rows, opening new segments as old ones fill up, then commit the manifest
+
+        With publish=False the rows stay invisible to readers until publish() is called,
+        e.g. once indexes derived from them are updated too.
+        """
+        self._check_writable()
+        if not self.persistent:
+            self.segments[0].append(embeddings, records, columns)
+            self.version += 1
+            if publish:
+                self.publish()
+            return
+
+        start = 0
+        while start < len(records):
+            if not self.segments or self.segments[-1].count >= self.max_segment_chunks:
+                segment = Segment(os.path.join(self.path, f"segment_{len(self.segments):06d}"), self.dim)
+                segment.create()
+                self.segments.append(segment)
+
+            segment = self.segments[-1]
+            end = min(len(records), start + self.max_segment_chunks - segment.count)
+            segment.append(embeddings[start:end], records[start:end],
+                           {name: values[start:end] for name, values in columns.items()})
+            start = end
+
+        self._write_manifest()
+        self.version += 1
+        if publish:
+            self.publish()
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError(f"Vector store at {self.path} is open read-only; another process writes it")
+
+    def _mark_deleted(self, indices: np.ndarray):
+        indices = indices[indices < self.total]  # ids past a trimmed, uncommitted append
+        # Copied, not marked in place: published snapshots share the old mask
+        deleted = self.deleted.copy()
+        deleted[indices] = True
+        self._deleted = deleted
+        self._deleted_count = int(deleted.sum())
+
+    def delete(self, indices: np.ndarray):
+        """Tombstone rows by global index; the tombstone file is append-only"""
+        self._check_writable()
+        indices = np.asarray(indices, dtype=np.int64)
+        if not len(indices):
+            return
+        self._mark_deleted(indices)
+        self.version += 1
+        if self.persistent:
+            with open(os.path.join(self.path, self.TOMBSTONES_FILE), 'ab') as f:
+                f.write(indices.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        self.publish()
+
+    def _write_manifest(self):
+        """Atomically replace the manifest; rows become visible only once it is written"""
+        manifest = {
+            'dim': self.dim,
+            'segments': [{'name': os.path.basename(s.path), 'count': s.count} for s in self.segments],
+            'documents': self.documents
+        }
+        manifest_path = os.path.join(self.path, self.MANIFEST_FILE)
+        tmp_path = manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, manifest_path)
@@ -1,103 +1,646 @@
 # src/simple_vector_store.py
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple, Optional
 import logging
-import pickle
+import json
 import os
+import threading
+import time
+from .hash_embedder import HashEmbedder
+from .segment_store import SegmentStore, StoreSnapshot, CHUNK_TYPES, chunk_type_code
+from .ivf_index import IVFIndex
+from .query_cache import QueryCache
+from .bm25_index import BM25Index, search_all
+from .quantized_index import QuantizedIndex
+
+FILTER_NAMES = ('chunk_type', 'document_name', 'page_range')
+
+def validate_filters(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Check search filters (see SimpleVectorStore._row_filter) and return them; raises ValueError"""
+    if filters is None:
+        return None
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be an object")
+    for name, value in filters.items():
+        if name not in FILTER_NAMES:
+            raise ValueError(f"Unknown filter: {name} (expected one of {', '.join(FILTER_NAMES)})")
+        if name == 'page_range':
+            if (not isinstance(value, (list, tuple)) or len(value) != 2
+                    or any(end is not None and (isinstance(end, bool) or not isinstance(end, int)) for end in value)):
+                raise ValueError("page_range must be [first, last]: page numbers or null")
+            continue
+        values = value if isinstance(value, (list, tuple)) else [value]
+        if not values or not all(isinstance(v, str) for v in values):
+            raise ValueError(f"{name} must be a string or a non-empty list of strings")
+        if name == 'chunk_type' and not set(values) <= set(CHUNK_TYPES):
+            raise ValueError(f"Unknown chunk_type (expected {', '.join(CHUNK_TYPES)})")
+    return filters
 
 class SimpleVectorStore:
-    """Simple in-memory vector store that works reliably with Streamlit"""
+    """Simple vector store kept in memory or persisted as memory-mapped segments
+    
+    Searches run against the snapshot the segment store last published and take no
+    lock. Changes are serialized by a writer lock and published in one step once the
+    segments and every derived index hold the new rows.
+    
+    With read_only the store serves what another process writes to VECTOR_STORE_PATH,
+    picking up its changes as the segment store refreshes (see SegmentStore).
+    """
+    
+    # Directory in each sealed segment holding its saved keyword index
+    BM25_DIR = 'bm25'
     
-    def __init__(self, config):
+    def __init__(self, config, read_only: bool = False):
         self.config = config
         self.logger = logging.getLogger(__name__)
-        self.documents = []
-        self.embeddings = []
-        self.metadatas = []
-        self.ids = []
         self.dim = 384
+        self.embedder = HashEmbedder(self.dim)
+        self._write_lock = threading.RLock()
+        
+        # Compact copy of the embeddings for the first pass of the exact scan; candidates are rescored
+        # at full precision from the segment files, or re-embedded from their text in memory
+        self.codes = None
+        self._code_rows = 0
+        if config.EMBEDDING_STORAGE in QuantizedIndex.MODES:
+            self.codes = QuantizedIndex(self.dim, config.EMBEDDING_STORAGE)
+        elif config.EMBEDDING_STORAGE != 'float32':
+            raise ValueError(f"Unknown EMBEDDING_STORAGE: {config.EMBEDDING_STORAGE}")
+        
+        # Memory-mapped segments on disk, or a single growable in-memory segment
+        path = config.VECTOR_STORE_PATH if config.PERSIST_VECTOR_STORE else None
+        self.segment_store = SegmentStore(path, self.dim, config.SEGMENT_MAX_CHUNKS,
+                                          keep_embeddings=self.codes is None, read_only=read_only,
+                                          refresh_seconds=config.INDEX_REFRESH_SECONDS)
+        
+        # Optional approximate index; rows are fed to it lazily, so a reopened store catches up on first use
+        self.ann_index = None
+        self._ann_rows = 0
+        if config.SEARCH_MODE == 'ivf':
+            self.ann_index = IVFIndex(self.dim, config.IVF_NLIST, config.IVF_NPROBE)
+        elif config.SEARCH_MODE != 'exact':
+            raise ValueError(f"Unknown SEARCH_MODE: {config.SEARCH_MODE}")
+        
+        # Keyword index for hybrid retrieval: on disk, the memory-mapped indexes saved for the sealed
+        # segments, then an in-memory one over the rows after them, which like the ANN index a
+        # reopened store rebuilds on first use
+        self._bm25_indexes: Tuple[BM25Index, ...] = ()
+        self._bm25_rows = 0
+        if config.RETRIEVAL_MODE == 'hybrid':
+            self._bm25_indexes = (BM25Index(config.BM25_K1, config.BM25_B),)
+            self._load_bm25_segments()
+        elif config.RETRIEVAL_MODE != 'vector':
+            raise ValueError(f"Unknown RETRIEVAL_MODE: {config.RETRIEVAL_MODE}")
+        
+        if read_only and (self.codes is not None or self.ann_index is not None):
+            self.logger.warning("Every read-only process builds its own compact embedding copy and IVF lists; "
+                                "only exact float32 search shares all of its memory between processes")
+        
+        # Query embeddings never go stale; result sets are tagged with the store version they were computed at
+        self.embedding_cache = QueryCache(config.QUERY_CACHE_SIZE)
+        self.result_cache = QueryCache(config.QUERY_CACHE_SIZE)
+        # Row masks and weights for filter/boost combinations, rebuilt after each change to the store
+        self.mask_cache = QueryCache(64)
         
         self.logger.info("✅ Simple vector store initialized")
     
-    def _generate_embedding(self, text: str) -> List[float]:
+    @property
+    def version(self) -> int:
+        """Increases with every published change to the stored chunks"""
+        return self.segment_store.snapshot.version
+    
+    @property
+    def bm25_index(self) -> Optional[BM25Index]:
+        """The in-memory keyword index over the rows after the saved ones; None without hybrid retrieval"""
+        return self._bm25_indexes[-1] if self._bm25_indexes else None
+    
+    @property
+    def count(self) -> int:
+        """Number of stored rows, including deleted and not yet published ones"""
+        return self.segment_store.total
+    
+    def _generate_embedding(self, text: str) -> np.ndarray:
         """Generate simple hash-based embedding"""
-        vec = [0.01] * self.dim
-        if isinstance(text, str):
-            words = text.lower().split()[:100]
-            for i, word in enumerate(words):
-                hash_val = abs(hash(word))
-                idx = hash_val % self.dim
-                vec[idx] += 1.0 / (i + 1)
-            # Normalize
-            norm = sum(v**2 for v in vec) ** 0.5
-            if norm > 0:
-                vec = [v / norm for v in vec]
-        return vec
+        embedding = self.embedding_cache.get(text)
+        if embedding is None:
+            embedding = self.embedder.embed(text)
+            embedding.flags.writeable = False  # shared by every later lookup
+            self.embedding_cache.put(text, embedding)
+        return embedding
+    
+    def _generate_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Embeddings for several texts, embedding the ones not cached in a single batch"""
+        embeddings = [self.embedding_cache.get(text) for text in texts]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            for i, embedding in zip(missing, self.embedder.embed_batch([texts[i] for i in missing])):
+                embedding.flags.writeable = False
+                self.embedding_cache.put(texts[i], embedding)
+                embeddings[i] = embedding
+        return np.stack(embeddings) if embeddings else np.zeros((0, self.dim), dtype=np.float32)
     
     def add_documents(self, chunks: List, document_name: str):
         """Add document chunks to vector store"""
         try:
             self.logger.info(f"Processing {len(chunks)} chunks for {document_name}")
             
-            for i, chunk in enumerate(chunks):
-                doc_id = f"{document_name}_{i}"
-                
-                # Generate embedding
-                embedding = self._generate_embedding(chunk.content)
+            # Generate all embeddings for the document in one batch
+            start = time.perf_counter()
+            embeddings = self.embedder.embed_batch([chunk.content for chunk in chunks])
+            embedded = time.perf_counter()
+            
+            with self._write_lock:
+                records = []
+                first_row = self.count
+                for i, chunk in enumerate(chunks):
+                    records.append({
+                        'id': f"{document_name}_{first_row + i}",
+                        'document': chunk.content,
+                        'metadata': {
+                            'document_name': document_name,
+                            'chunk_type': getattr(chunk, 'chunk_type', 'text'),
+                            'page_number': getattr(chunk, 'page_number', 1)
+                        }
+                    })
                 
                 # Store
-                self.documents.append(chunk.content)
-                self.embeddings.append(embedding)
-                self.metadatas.append({
-                    'document_name': document_name,
-                    'chunk_type': getattr(chunk, 'chunk_type', 'text'),
-                    'page_number': getattr(chunk, 'page_number', 1)
-                })
-                self.ids.append(doc_id)
+                columns = {
+                    'document': np.full(len(records), self.segment_store.document_code(document_name, create=True)),
+                    'page': np.array([record['metadata']['page_number'] for record in records]),
+                    'type': np.array([chunk_type_code(record['metadata']['chunk_type']) for record in records])
+                }
+                self.segment_store.append(embeddings, records, columns, publish=False)
+                
+                if self.codes is not None and self._code_rows == first_row:
+                    self.codes.add(embeddings)
+                    self._code_rows = first_row + len(chunks)
+                if self.ann_index is not None:
+                    self._sync_ann_index()
+                if self.bm25_index is not None and self._bm25_rows == first_row:
+                    self._add_to_bm25([chunk.content for chunk in chunks], first_row)
+                
+                # Searches see the new rows from here on, in the segments and every index at once
+                self.segment_store.publish()
             
             self.logger.info(f"✅ Added {len(chunks)} chunks from {document_name}")
-            return {'success': True, 'count': len(chunks)}
-            
+            # Store time includes waiting for the write lock
+            return {'success': True, 'count': len(chunks), 'embed_seconds': embedded - start,
+                    'store_seconds': time.perf_counter() - embedded}
+        
         except Exception as e:
             self.logger.error(f"Failed to add documents: {e}")
             return {'success': False, 'error': str(e)}
     
-    def search(self, query: str, n_results: int = 5) -> Dict[str, Any]:
-        """Search for relevant documents using cosine similarity"""
+    def _top_k(self, scores: np.ndarray, k: int) -> np.ndarray:
+        """Indices of the k highest scores, best first"""
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        if k < len(scores):
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        return candidates[np.argsort(-scores[candidates], kind='stable')]
+    
+    def _score(self, query_embedding: np.ndarray, snapshot: StoreSnapshot) -> np.ndarray:
+        """Similarity of the query to every stored chunk, in global row order (approximate with compact storage)"""
+        if self.codes is not None:
+            return self.codes.score(query_embedding, snapshot.total)
+        parts = [view.embeddings @ query_embedding for view in snapshot.views]
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+    
+    def _score_batch(self, query_embeddings: np.ndarray, snapshot: StoreSnapshot) -> np.ndarray:
+        """(queries, rows) similarities, one matrix-matrix product per segment"""
+        if self.codes is not None:
+            return self.codes.score_batch(query_embeddings, snapshot.total)
+        parts = [query_embeddings @ view.embeddings.T for view in snapshot.views]
+        return np.concatenate(parts, axis=1) if parts else np.zeros((len(query_embeddings), 0), dtype=np.float32)
+    
+    def _top_k_batch(self, scores: np.ndarray, k: int) -> np.ndarray:
+        """Per row of scores, the column indices of the k highest, best first"""
+        k = min(k, scores.shape[1])
+        if k <= 0:
+            return np.empty((len(scores), 0), dtype=np.int64)
+        if k < scores.shape[1]:
+            candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+        order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind='stable')
+        return np.take_along_axis(candidates, order, axis=1)
+    
+    def _rows(self, start: int, end: int) -> np.ndarray:
+        """Embeddings for the global row range [start, end)"""
+        if not self.segment_store.keeps_embeddings:
+            return self.codes.dequantize(start, end)
+        parts, offset = [], 0
+        for matrix in [segment.embeddings for segment in self.segment_store.segments]:
+            lo, hi = max(start - offset, 0), min(end - offset, len(matrix))
+            if lo < hi:
+                parts.append(matrix[lo:hi])
+            offset += len(matrix)
+        return np.concatenate(parts) if parts else np.zeros((0, self.dim), dtype=np.float32)
+    
+    # The derived indexes are fed as rows are added, before they are published; a reopened store
+    # catches up on first use. Searches pass their snapshot's row count and only take the writer
+    # lock when an index is behind it.
+    
+    def warm_up(self):
+        """Bring every derived index up to date now instead of on the first search"""
+        if self.codes is not None:
+            self._sync_codes()
+        if self.ann_index is not None:
+            self._sync_ann_index()
+        if self.bm25_index is not None:
+            self._sync_bm25_index()
+    
+    def _sync_ann_index(self, rows: int = None, batch_size: int = 65_536):
+        """Feed rows the ANN index has not seen yet"""
+        if rows is not None and self._ann_rows >= rows:
+            return
+        with self._write_lock:
+            total = self.count
+            while self._ann_rows < total:
+                end = min(total, self._ann_rows + batch_size)
+                self.ann_index.add(self._rows(self._ann_rows, end), np.arange(self._ann_rows, end))
+                self._ann_rows = end
+    
+    def _sync_codes(self, rows: int = None, batch_size: int = 65_536):
+        """Quantize rows the compact copy has not seen yet"""
+        if rows is not None and self._code_rows >= rows:
+            return
+        with self._write_lock:
+            total = self.count
+            while self._code_rows < total:
+                end = min(total, self._code_rows + batch_size)
+                self.codes.add(self._rows(self._code_rows, end))
+                self._code_rows = end
+    
+    def _sync_bm25_index(self, rows: int = None, batch_size: int = 10_000):
+        """Index the text of rows the keyword index has not seen yet"""
+        if rows is not None and self._bm25_rows >= rows:
+            return
+        with self._write_lock:
+            self._load_bm25_segments()
+            total = self.count
+            while self._bm25_rows < total:
+                end = min(total, self._bm25_rows + batch_size)
+                texts = [self.segment_store.record(i)['document'] for i in range(self._bm25_rows, end)]
+                self._add_to_bm25(texts, self._bm25_rows)
+    
+    def _add_to_bm25(self, texts: List[str], first_row: int):
+        """Index rows from first_row, the first unindexed one, saving the in-memory index of each segment they fill"""
+        while True:
+            end = self._bm25_segment_end()
+            if end is not None and self._bm25_rows >= end:
+                self._save_bm25_segment()
+                continue
+            if not texts:
+                return
+            batch = texts if end is None else texts[:end - first_row]
+            self.bm25_index.add(batch, np.arange(first_row, first_row + len(batch)))
+            first_row += len(batch)
+            texts = texts[len(batch):]
+            self._bm25_rows = first_row
+    
+    def _bm25_segment_end(self) -> Optional[int]:
+        """End row of the segment the in-memory keyword index is filling, once that segment takes no more rows
+        
+        None while it can still grow, and always for stores that do not save keyword indexes:
+        in-memory and read-only ones.
+        """
+        if not self.segment_store.persistent or self.segment_store.read_only:
+            return None
+        segments = self.segment_store.segments
+        i = len(self._bm25_indexes) - 1
+        if i >= len(segments) or (i == len(segments) - 1
+                                  and segments[i].count < self.segment_store.max_segment_chunks):
+            return None
+        return self.bm25_index.first_row + segments[i].count
+    
+    def _save_bm25_segment(self):
+        """Save the in-memory keyword index next to the sealed segment it covers and map it from there"""
+        segment = self.segment_store.segments[len(self._bm25_indexes) - 1]
+        path = os.path.join(segment.path, self.BM25_DIR)
+        self.bm25_index.save(path)
+        # One assignment, so a concurrent search sees either the old or the new set of indexes
+        self._bm25_indexes = self._bm25_indexes[:-1] + (
+            BM25Index.load(path, self.config.BM25_K1, self.config.BM25_B),
+            BM25Index(self.config.BM25_K1, self.config.BM25_B, first_row=self._bm25_rows))
+        self.logger.info(f"Saved keyword index of {segment.path} ({segment.count} chunks)")
+    
+    def _load_bm25_segments(self):
+        """Map the saved keyword indexes of segments the in-memory index still covers; it restarts after them"""
+        if not self.segment_store.persistent:
+            return
+        segments = self.segment_store.segments
+        saved = list(self._bm25_indexes[:-1])
+        first_row = self.bm25_index.first_row
+        while len(saved) < len(segments):
+            path = os.path.join(segments[len(saved)].path, self.BM25_DIR)
+            if not os.path.isdir(path):
+                break
+            saved.append(BM25Index.load(path, self.config.BM25_K1, self.config.BM25_B))
+            first_row += segments[len(saved) - 1].count
+        if len(saved) > len(self._bm25_indexes) - 1:
+            self._bm25_indexes = (*saved, BM25Index(self.config.BM25_K1, self.config.BM25_B, first_row=first_row))
+            self._bm25_rows = first_row
+    
+    def _rescore(self, candidates: np.ndarray, query_embedding: np.ndarray, n_results: int,
+                 snapshot: StoreSnapshot, weights: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """The n candidates with the highest full-precision (weighted) similarity, best first"""
+        similarities = self._exact_scores(candidates, query_embedding, snapshot)
+        if weights is not None:
+            similarities *= weights[candidates]
+        top = self._top_k(similarities, n_results)
+        return candidates[top], similarities[top]
+    
+    def _exact_scores(self, indices: np.ndarray, query_embedding: np.ndarray, snapshot: StoreSnapshot) -> np.ndarray:
+        """Full-precision similarities of a few rows to the query"""
+        if snapshot.keeps_embeddings:
+            return snapshot.embeddings_at(indices) @ query_embedding
+        texts = [snapshot.record(int(i))['document'] for i in indices]
+        return self.embedder.embed_batch(texts) @ query_embedding
+    
+    def _row_filter(self, filters: Optional[Dict[str, Any]], boosts: Optional[Dict[str, float]],
+                    snapshot: StoreSnapshot) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """Mask of searchable rows (not deleted, passing the filters) and per-row score multipliers
+        
+        filters may hold 'chunk_type' and 'document_name' (a value or a list of values) and
+        'page_range' (first, last), inclusive, either end None; boosts maps chunk types to
+        multipliers. Either result is None when it would select or weigh every row alike.
+        """
+        key = (json.dumps(filters, sort_keys=True) if filters else None,
+               json.dumps(boosts, sort_keys=True) if boosts else None)
+        cached = self.mask_cache.get(key, snapshot.version)
+        if cached is not None:
+            return cached
+        
+        allowed = None
+        if filters or snapshot.live_count < snapshot.total:
+            allowed = ~snapshot.deleted
+            for name, value in (filters or {}).items():
+                values = value if isinstance(value, (list, tuple, set)) else [value]
+                if name == 'chunk_type':
+                    allowed &= np.isin(snapshot.column('type'), [chunk_type_code(t) for t in values])
+                elif name == 'document_name':
+                    codes = [self.segment_store.document_code(document) for document in values]
+                    allowed &= np.isin(snapshot.column('document'), [c for c in codes if c is not None])
+                elif name == 'page_range':
+                    first, last = value
+                    pages = snapshot.column('page')
+                    if first is not None:
+                        allowed &= pages >= first
+                    if last is not None:
+                        allowed &= pages <= last
+                else:
+                    raise ValueError(f"Unknown filter: {name}")
+        
+        weights = None
+        if boosts:
+            # Lookup table from type code to multiplier, gathered over the 'type' column
+            table = np.ones(len(CHUNK_TYPES) + 1, dtype=np.float32)
+            for chunk_type, factor in boosts.items():
+                table[chunk_type_code(chunk_type)] = factor
+            weights = table[snapshot.column('type')]
+        
+        self.mask_cache.put(key, (allowed, weights), snapshot.version)
+        return allowed, weights
+    
+    def _search_indices(self, query_embedding: np.ndarray, n_results: int, snapshot: StoreSnapshot,
+                        allowed: np.ndarray = None, weights: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top row indices and their (weighted) similarities among allowed rows, approximate when an ANN index is ready"""
+        if self.ann_index is not None:
+            self._sync_ann_index(snapshot.total)
+            probed = self.ann_index.probe(query_embedding)
+            if probed is not None:
+                candidates, similarities = probed
+                # The lists may already hold rows of a change published after this snapshot
+                visible = candidates < snapshot.total
+                candidates, similarities = candidates[visible], similarities[visible]
+                if weights is not None:
+                    similarities = similarities * weights[candidates]
+                if allowed is not None:
+                    keep = allowed[candidates]
+                    candidates, similarities = candidates[keep], similarities[keep]
+                # A selective filter can leave the probed lists short; the exact scan below cannot miss
+                if len(candidates) >= n_results:
+                    if self.codes is not None:
+                        top = self._top_k(similarities, n_results * self.config.RESCORE_FACTOR)
+                        return self._rescore(candidates[top], query_embedding, n_results, snapshot, weights)
+                    top = self._top_k(similarities, n_results)
+                    return candidates[top], similarities[top]
+        
+        # Exact scan: cosine similarity (embeddings are unit length), one matrix-vector product per segment,
+        # or over the compact copy for a wider candidate set that is then rescored
+        depth = n_results
+        if self.codes is not None:
+            self._sync_codes(snapshot.total)
+            depth = n_results * self.config.RESCORE_FACTOR
+        similarities = self._score(query_embedding, snapshot)
+        if weights is not None:
+            similarities *= weights
+        if allowed is not None:
+            similarities[~allowed] = -np.inf
+        top = self._top_k(similarities, depth)
+        top = top[np.isfinite(similarities[top])]
+        if self.codes is not None:
+            return self._rescore(top, query_embedding, n_results, snapshot, weights)
+        return top, similarities[top]
+    
+    def _get_record(self, index: int, snapshot: StoreSnapshot) -> Tuple[str, Dict[str, Any]]:
+        """Document text and metadata for a global row index"""
+        record = snapshot.record(int(index))
+        return record['document'], record['metadata']
+    
+    def document_rows(self, document_name: str, page_numbers: Optional[List[int]] = None) -> np.ndarray:
+        """Live rows of a document, or of the given pages of it"""
+        code = self.segment_store.document_code(document_name)
+        if code is None:
+            return np.zeros(0, dtype=np.int64)
+        with self._write_lock:
+            mask = (self.segment_store.column('document') == code) & ~self.segment_store.deleted
+            if page_numbers is not None:
+                mask &= np.isin(self.segment_store.column('page'), page_numbers)
+            return np.flatnonzero(mask)
+    
+    def delete_rows(self, rows: np.ndarray) -> int:
+        """Remove the given rows, e.g. from document_rows(); returns how many were given"""
+        with self._write_lock:
+            self.segment_store.delete(rows)
+        return len(rows)
+    
+    def delete_pages(self, document_name: str, page_numbers: List[int]) -> int:
+        """Remove the chunks of the given pages of a document; returns how many were removed"""
+        removed = self.delete_rows(self.document_rows(document_name, page_numbers))
+        self.logger.info(f"Removed {removed} chunks of {document_name} (pages {sorted(page_numbers)})")
+        return removed
+    
+    def delete_document(self, document_name: str) -> int:
+        """Remove every chunk of a document; returns how many were removed"""
+        removed = self.delete_rows(self.document_rows(document_name))
+        self.logger.info(f"Removed {removed} chunks of {document_name}")
+        return removed
+    
+    def search(self, query: str, n_results: int = 5, filters: Dict[str, Any] = None,
+               boosts: Dict[str, float] = None) -> Dict[str, Any]:
+        """Search for relevant documents using cosine similarity
+        
+        filters restrict the search to matching rows and boosts scale the similarity of
+        chunk types (see _row_filter); both apply before the top-k selection. Invalid filters
+        raise ValueError rather than returning no results.
+        """
+        validate_filters(filters)
         try:
-            if not self.documents:
-                return {'documents': [], 'metadatas': [], 'distances': []}
+            # Everything below reads this one snapshot, whatever is published meanwhile
+            snapshot = self.segment_store.snapshot
+            version = snapshot.version
+            cache_key = (query, n_results, json.dumps([filters, boosts], sort_keys=True))
+            cached = self.result_cache.get(cache_key, version)
+            if cached is not None:
+                return {key: list(values) for key, values in cached.items()}
+            
+            if snapshot.live_count == 0:
+                return {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
             
             # Generate query embedding
             query_embedding = self._generate_embedding(query)
             
-            # Calculate cosine similarities
-            similarities = []
-            for emb in self.embeddings:
-                # Cosine similarity
-                dot_product = sum(a * b for a, b in zip(query_embedding, emb))
-                similarities.append(dot_product)
-            
             # Get top k results
-            top_indices = sorted(range(len(similarities)), 
-                               key=lambda i: similarities[i], 
-                               reverse=True)[:n_results]
+            allowed, weights = self._row_filter(filters, boosts, snapshot)
+            top_indices, similarities = self._search_indices(query_embedding, n_results, snapshot, allowed, weights)
+            
+            results = self._format_results(top_indices, similarities, snapshot)
+            self.result_cache.put(cache_key, results, version)
+            return {key: list(values) for key, values in results.items()}
+        
+        except Exception as e:
+            self.logger.error(f"Search failed: {e}")
+            return {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+    
+    def search_batch(self, queries: List[str], n_results: int = 5, filters: Dict[str, Any] = None,
+                     boosts: Dict[str, float] = None, block_bytes: int = 64 * 1024 * 1024) -> List[Dict[str, Any]]:
+        """search() for many queries at once, in input order
+        
+        The queries are embedded together and scored with one matrix-matrix product per
+        segment; blocks of queries are sized so their score matrix stays under block_bytes.
+        """
+        validate_filters(filters)
+        try:
+            snapshot = self.segment_store.snapshot
+            version = snapshot.version
+            filter_key = json.dumps([filters, boosts], sort_keys=True)
+            results = [None] * len(queries)
+            missing = []
+            for i, query in enumerate(queries):
+                cached = self.result_cache.get((query, n_results, filter_key), version)
+                if cached is not None:
+                    results[i] = {key: list(values) for key, values in cached.items()}
+                else:
+                    missing.append(i)
+            
+            if missing and snapshot.live_count > 0:
+                query_embeddings = self._generate_embeddings([queries[i] for i in missing])
+                allowed, weights = self._row_filter(filters, boosts, snapshot)
+                
+                found = []
+                if self.ann_index is not None:
+                    # Probing is per query; only the embedding is batched
+                    found = [self._search_indices(q, n_results, snapshot, allowed, weights) for q in query_embeddings]
+                else:
+                    depth = n_results
+                    if self.codes is not None:
+                        self._sync_codes(snapshot.total)
+                        depth = n_results * self.config.RESCORE_FACTOR
+                    block = max(1, block_bytes // (4 * max(snapshot.total, 1)))
+                    for start in range(0, len(query_embeddings), block):
+                        block_embeddings = query_embeddings[start:start + block]
+                        similarities = self._score_batch(block_embeddings, snapshot)
+                        if weights is not None:
+                            similarities *= weights
+                        if allowed is not None:
+                            similarities[:, ~allowed] = -np.inf
+                        top = self._top_k_batch(similarities, depth)
+                        scores = np.take_along_axis(similarities, top, axis=1)
+                        for q, row_top, row_scores in zip(block_embeddings, top, scores):
+                            finite = np.isfinite(row_scores)
+                            if self.codes is not None:
+                                found.append(self._rescore(row_top[finite], q, n_results, snapshot, weights))
+                            else:
+                                found.append((row_top[finite], row_scores[finite]))
+                
+                for i, (top_indices, similarities) in zip(missing, found):
+                    result = self._format_results(top_indices, similarities, snapshot)
+                    self.result_cache.put((queries[i], n_results, filter_key), result, version)
+                    results[i] = {key: list(values) for key, values in result.items()}
             
+            return [result or {'ids': [], 'documents': [], 'metadatas': [], 'distances': []} for result in results]
+        
+        except Exception as e:
+            self.logger.error(f"Batch search failed: {e}")
+            return [{'ids': [], 'documents': [], 'metadatas': [], 'distances': []} for _ in queries]
+    
+    def _format_results(self, top_indices: np.ndarray, similarities: np.ndarray,
+                        snapshot: StoreSnapshot) -> Dict[str, Any]:
+        records = [self._get_record(i, snapshot) for i in top_indices]
+        return {
+            'ids': [int(i) for i in top_indices],  # stable global row ids
+            'documents': [document for document, _ in records],
+            'metadatas': [metadata for _, metadata in records],
+            'distances': [1.0 - float(similarity) for similarity in similarities]  # Convert similarity to distance
+        }
+    
+    def keyword_search(self, query: str, n_results: int = 5, filters: Dict[str, Any] = None,
+                       boosts: Dict[str, float] = None) -> Dict[str, Any]:
+        """BM25 keyword search; results are in BM25 order, with distances from the query embedding like search()"""
+        validate_filters(filters)
+        try:
+            if self.bm25_index is None:
+                raise RuntimeError("Keyword search needs RETRIEVAL_MODE = 'hybrid'")
+            
+            snapshot = self.segment_store.snapshot
+            version = snapshot.version
+            cache_key = ('keyword', query, n_results, json.dumps([filters, boosts], sort_keys=True))
+            cached = self.result_cache.get(cache_key, version)
+            if cached is not None:
+                return {key: list(values) for key, values in cached.items()}
+            
+            self._sync_bm25_index(snapshot.total)
+            allowed, weights = self._row_filter(filters, boosts, snapshot)
+            top_indices, bm25_scores = search_all(self._bm25_indexes, query, n_results,
+                                                  None if allowed is None else ~allowed, snapshot.total)
+            
+            similarities = self._exact_scores(top_indices, self._generate_embedding(query), snapshot)
+            if weights is not None:
+                similarities *= weights[top_indices]
+            records = [self._get_record(i, snapshot) for i in top_indices]
             results = {
-                'documents': [self.documents[i] for i in top_indices],
-                'metadatas': [self.metadatas[i] for i in top_indices],
-                'distances': [1.0 - similarities[i] for i in top_indices]  # Convert similarity to distance
+                'ids': [int(i) for i in top_indices],
+                'documents': [document for document, _ in records],
+                'metadatas': [metadata for _, metadata in records],
+                'distances': [1.0 - float(similarity) for similarity in similarities],
+                'bm25_scores': [float(score) for score in bm25_scores]
             }
             
-            return results
-            
+            self.result_cache.put(cache_key, results, version)
+            return {key: list(values) for key, values in results.items()}
+        
         except Exception as e:
-            self.logger.error(f"Search failed: {e}")
-            return {'documents': [], 'metadatas': [], 'distances': []}
+            self.logger.error(f"Keyword search failed: {e}")
+            return {'ids': [], 'documents': [], 'metadatas': [], 'distances': [], 'bm25_scores': []}
     
     def get_collection_stats(self) -> Dict[str, Any]:
         """Get collection statistics"""
+        snapshot = self.segment_store.snapshot
         return {
-            'total_documents': len(self.documents),
-            'embedding_model': 'Simple Hash Embedder'
+            'total_documents': snapshot.live_count,
+            'embedding_model': 'Simple Hash Embedder',
+            'persistent': self.segment_store.persistent,
+            'read_only': self.segment_store.read_only,
+            'segments': len(snapshot.views),
+            'search_mode': self.config.SEARCH_MODE,
+            'retrieval_mode': self.config.RETRIEVAL_MODE,
+            'version': snapshot.version,
+            'embedding_storage': self.config.EMBEDDING_STORAGE,
+            'compact_embedding_bytes': self.codes.nbytes if self.codes is not None else 0,
+            'embedding_cache': self.embedding_cache.get_stats(),
+            'result_cache': self.result_cache.get_stats()
         }